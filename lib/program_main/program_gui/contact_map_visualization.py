@@ -16,6 +16,7 @@ import warnings
 import sys
 from io import StringIO
 from .center_of_mass import *
+from lib.program_main.program_scripts.pcn.pcn_miner import pcn_miner
 
 # dict for 20 standard amino acids: 3 -> 1
 code_standard = {
@@ -142,8 +143,8 @@ class Contactmap():
 
         if os.path.isfile(adj_path):
 
-            with open(adj_path, 'r') as f:
-                data_array = [[float(num) for num in line.split()] for line in f]
+            #binary (.npz) or text (.txt) adjacency matrix
+            data_array = pcn_miner.load_adj_file(adj_path)
 
             # Reference residues and selectors lists. Used to interact with the 3D structures loaded in
             # PyMOL.
@@ -155,7 +156,7 @@ class Contactmap():
             if threshold:
                 self.dist_threshold = threshold
             else:
-                self.dist_threshold = float(adj_matrix_file.split("_")[4].replace(".txt", ""))
+                self.dist_threshold = float(os.path.splitext(adj_matrix_file)[0].split("_")[4])
             self.interaction_center = adj_mat_type
 
             self.residues_list = []
@@ -274,7 +275,7 @@ class Contactmap():
             atm_types = ("CA", )
         elif interaction_center == "CB":
             atm_types = ("CB", )
-        elif interaction_center == "centroid":
+        elif interaction_center in ("centroid", "heavy"):
             atm_types = ("CA", )
         else:
             raise KeyError("Invalid 'interaction_center': %s" % interaction_center)
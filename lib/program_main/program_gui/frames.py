@@ -12,13 +12,9 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtCore import QProcess
 
 import json
-import ast
 import re
-try:
-    import pandas as pd
-except:
-    pass
 
+from lib.program_main.program_scripts.pcn.pcn_miner import pcn_miner
 from lib.program_main.program_gui.contact_map_visualization import *
 from lib.program_main.program_gui.plots import *
 
@@ -230,7 +226,9 @@ class Frame(QtWidgets.QFrame):
 
         for alg in self.main_window.part_coeff_results_dict:
             if alg in self.main_window.dict_of_algorithms[self.alg_type]:
-                tmp = [a for a in self.main_window.part_coeff_results_dict[alg]["results"] if a.endswith('.txt') and not re.search("z_intraconn", a)]
+                results = self.main_window.part_coeff_results_dict[alg]["results"]
+                #columnar results (.npz) or text results of the previous versions, once for each result
+                tmp = [a for a in results if (a.endswith('.npz') or (a.endswith('.txt') and a[:-4] + '.npz' not in results)) and not re.search("z_intraconn", a)]
                 list_of_coeff.extend(tmp)
 
         self.single_mode_cb.addItems(list_of_coeff)
@@ -260,42 +258,53 @@ class Frame(QtWidgets.QFrame):
         algo = self.algorithms_cb.currentText()
         # Get current selection
         current_selection = self.results_cb.currentText()
-        # Get protein name
-        protein_name = current_selection.split("_")[0]
-        # Get location of the results
-        location = self.main_window.algorithms_results_dict_clusters[algo]['location']
-
-        # Modify session file name to clusters file name
-        tmp = current_selection.replace("part_coefs", "Clusters")
-        file_name = re.sub(r'_session.*?\.pse', '.txt', tmp)
-        #file_name = tmp.replace("_session.pse", ".txt")
-        #file_name = tmp.replace("_session.pse", ".txt")
-
-        # Make path
-        path_to_cluster_file = os.path.join(location, file_name)
-
-        # Make dataframe
-        file = open(path_to_cluster_file, "r")
-        test_string = file.read()
-        file.close()
-
-        dictio = ast.literal_eval(test_string)
-
-        df = pd.DataFrame.from_dict(dictio.items())
-        df.columns = ['Residue', 'Cluster']
-        x_data = df['Residue'].to_list()
-        y_data = df['Cluster'].to_list()
-
-        if os.path.isfile(path_to_cluster_file):
-            plot_centrality.add_plot("", "", "", type = "scatter_plot",
-                                     scatter_plot_data = [x_data, y_data],
-                                     original_data = [],
-                                     algorithm = algo,
-                                     pdb_name = protein_name)
+        # Catalog entry of the session, None for the outputs of the previous versions
+        entry = self.main_window.results_catalog.get(os.path.join(self.main_window.algorithms_results_dict[algo]['location'], current_selection))
+        # Clusters of the same protein, k, adj type and parameters of the session
+        clusters_entries = [] if entry is None else self.catalog_matches(entry, "labels")
+
+        if clusters_entries:
+            protein_name = entry["protein"]
+            path_to_cluster_file = clusters_entries[0]["path"]
+        else:
+            # Get protein name
+            protein_name = current_selection.split("_")[0]
+            # Get location of the results
+            location = self.main_window.algorithms_results_dict_clusters[algo]['location']
+
+            # Modify session file name to clusters file name
+            tmp = current_selection.replace("part_coefs", "Clusters")
+            file_name = re.sub(r'_session.*?\.pse', '.npz', tmp)
+            #file_name = tmp.replace("_session.pse", ".txt")
+            #file_name = tmp.replace("_session.pse", ".txt")
+
+            # Make path
+            path_to_cluster_file = os.path.join(location, file_name)
+
+        # Read the residues and their clusters (columnar results file, or text file of the previous versions)
+        residue_table, clusters = pcn_miner.load_residue_results(path_to_cluster_file)
+        x_data = residue_table.labels().tolist()
+        y_data = clusters.tolist()
+
+        plot_centrality.add_plot("", "", "", type = "scatter_plot",
+                                 scatter_plot_data = [x_data, y_data],
+                                 original_data = [],
+                                 algorithm = algo,
+                                 pdb_name = protein_name)
 
         plot_centrality.show_plot()
 
 
+    def catalog_matches(self, entry, kind):
+        ## Catalog entries of kind 'kind' with the same protein, algorithm, k, adj type and parameters of 'entry' (e.g. the clusters of a session), .npz files first
+
+        rows = pcn_miner.query_results_catalog(os.path.join(self.main_window.working_dir_path, "output"), kind = kind,
+                                               protein = entry["protein"], algorithm = entry["algorithm"], k = entry["k"], adj_mat_type = entry["adj_mat_type"],
+                                               params = json.loads(entry["params"]) if entry["params"] else None)
+
+        return sorted(rows, key = lambda row: not row["file"].endswith(".npz"))
+
+
     def plot_p(self):
 
         plot_centrality = PlotCentrality(self, self.main_window)
@@ -362,10 +371,12 @@ class Frame(QtWidgets.QFrame):
     def read_part_coeff_data(self, part_coeff_name):
 
         for alg in self.main_window.dict_of_algorithms[self.alg_type]:
-            if re.search('_' + alg, part_coeff_name):
+            entry = self.main_window.results_catalog.get(os.path.join(self.main_window.part_coeff_results_dict[alg]["location"], part_coeff_name))
+            # the algorithm of the results is read from the catalog, or from the file name for the outputs of the previous versions
+            if (entry["algorithm"] == alg) if entry is not None else re.search('_' + alg, part_coeff_name):
                 algo = alg
                 file_path = os.path.join(self.main_window.part_coeff_results_dict[alg]["location"], part_coeff_name)
-                part_coeff_session_name = part_coeff_name.replace(".txt", "_session.pse")
+                part_coeff_session_name = os.path.splitext(part_coeff_name)[0] + "_session.pse"
                 pse_file_path = os.path.join(self.main_window.part_coeff_results_dict[alg]["location"], part_coeff_session_name)
 
         cmd.load(pse_file_path, partial=1)
@@ -377,11 +388,8 @@ class Frame(QtWidgets.QFrame):
 
         cmd.zoom(pdb)
 
-        file = open(file_path, "r")
-        test_string = file.read()
-        file.close()
-
-        dictio = ast.literal_eval(test_string)
+        residue_table, part_coefs = pcn_miner.load_residue_results(file_path)
+        dictio = residue_table.toDict(part_coefs)
 
         return dictio, algo, pdb
 
@@ -389,15 +397,17 @@ class Frame(QtWidgets.QFrame):
     def read_z_data(self, part_coeff_name):
 
         for alg in self.main_window.dict_of_algorithms[self.alg_type]:
-            if re.search('_' + alg, part_coeff_name):
+            entry = self.main_window.results_catalog.get(os.path.join(self.main_window.part_coeff_results_dict[alg]["location"], part_coeff_name))
+            if (entry["algorithm"] == alg) if entry is not None else re.search('_' + alg, part_coeff_name):
                 algo = alg
-                file_path = os.path.join(self.main_window.part_coeff_results_dict[alg]["location"], part_coeff_name.replace("part_coefs", "z_intraconn"))
-
-        file = open(file_path, "r")
-        test_string = file.read()
-        file.close()
+                z_entries = [] if entry is None else self.catalog_matches(entry, "z_intraconn")
+                if z_entries:
+                    file_path = z_entries[0]["path"]
+                else:
+                    file_path = os.path.join(self.main_window.part_coeff_results_dict[alg]["location"], part_coeff_name.replace("part_coefs", "z_intraconn"))
 
-        dictio = ast.literal_eval(test_string)
+        residue_table, z = pcn_miner.load_residue_results(file_path)
+        dictio = residue_table.toDict(z)
 
         return dictio, algo
 
@@ -406,25 +416,33 @@ class Frame(QtWidgets.QFrame):
         # Get Parameters
         alg = self.algorithms_cb.currentText()
         result = self.results_cb.currentText()
-        pdb_id = result.split("_")[0]
-        adj_mat_type = (result.split("_")[2].replace("session", "")).replace(".pse", "")
         path = self.main_window.algorithms_results_dict[alg]["location"]
         path_to_selected = os.path.join(path, result)
+        # Catalog entry of the session, None for the outputs of the previous versions
+        entry = self.main_window.results_catalog.get(path_to_selected)
+        if entry is not None:
+            pdb_id = entry["protein"]
+            adj_mat_type = entry["adj_mat_type"]
+        else:
+            pdb_id = result.split("_")[0]
+            adj_mat_type = (result.split("_")[2].replace("session", "")).replace(".pse", "")
 
         # Load in PyMOL
         if os.path.isfile(path_to_selected):
             cmd.reinitialize()
             cmd.load(path_to_selected)
 
-        file_name = pdb_id + "_" + alg + adj_mat_type + ".txt"
-
-        path_to_file = os.path.join(self.main_window.algorithms_results_dict_txt[alg]["location"], file_name)
+        centralities_entries = [] if entry is None else self.catalog_matches(entry, "centralities")
+        if centralities_entries:
+            path_to_file = centralities_entries[0]["path"]
+        else:
+            file_name = pdb_id + "_" + alg + adj_mat_type + ".npz"
 
-        # Read data from file to dict
-        with open(path_to_file) as f:
-            data = f.read()
+            path_to_file = os.path.join(self.main_window.algorithms_results_dict_txt[alg]["location"], file_name)
 
-        data_dict = ast.literal_eval(data)
+        # Read the centralities (columnar results file, or text file of the previous versions)
+        residue_table, centralities = pcn_miner.load_residue_results(path_to_file)
+        data_dict = residue_table.toDict(centralities)
 
         plot_centrality = PlotCentrality(self, self.main_window)
         plot_centrality.plot_window()
@@ -482,8 +500,15 @@ class Frame(QtWidgets.QFrame):
         if self.adj_file_cb.currentText():
 
             adj_file_name = self.adj_file_cb.currentText()
-            pdb_name = self.adj_file_cb.currentText().split("_")[0]
-            adj_mat_type = self.adj_file_cb.currentText().split("_")[2]
+            entry = self.main_window.results_catalog.get(os.path.normpath(os.path.abspath(os.path.join(self.main_window.working_dir_path, "outputAdj", adj_file_name))))
+            if entry is not None:
+                pdb_name = entry["protein"]
+                adj_mat_type = entry["adj_mat_type"]
+                threshold = float(json.loads(entry["params"])["max"])
+            else:
+                pdb_name = self.adj_file_cb.currentText().split("_")[0]
+                adj_mat_type = self.adj_file_cb.currentText().split("_")[2]
+                threshold = ""
 
             self.contact_map_vis = Contactmap(self, self.main_window)
-            self.contact_map_vis.create_contact_map(adj_file_name, pdb_name, adj_mat_type)
+            self.contact_map_vis.create_contact_map(adj_file_name, pdb_name, adj_mat_type, threshold)
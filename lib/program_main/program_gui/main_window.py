@@ -412,6 +412,9 @@ class Main_Window_Widget(QtWidgets.QWidget):
                 self.algorithms_results_dict_summary[alg]["results"] = []
                 self.algorithms_results_dict_summary[alg]["location"] = ""
 
+        # Catalog entries (protein, algorithm, k, adj type, parameters) of the listed results, by file path
+        self.results_catalog = {}
+
         # Separators
         if sys.platform == "win32":
             self.path_sep = "\\"
@@ -17,6 +17,7 @@ from pymol import cmd
 from pymol.Qt import QtWidgets, QtCore, QtGui
 
 import lib.program_main.program_scripts.pcn.pcn_main as pcn_module
+from lib.program_main.program_scripts.pcn.pcn_miner import pcn_miner
 from lib.program_main.program_scripts.threads import Protocol_exec_dialog
 from lib.program_main.program_gui.frames import Frame
 from lib.program_main.program_gui.cgo_arrow import *
@@ -200,6 +201,7 @@ class INPUTStab_widgets(QtWidgets.QWidget):
         self.pdb_line_edit = QtWidgets.QLineEdit()
         self.pdb_line_edit.setPlaceholderText("e.g. 1bj4")
         self.input_parameters_box_layout.addWidget(self.pdb_line_edit, 2, 1)
+        self.load_structure_manifest()
 
         # Create and add the covalent bonds label to the parameters box
         self.non_covalent_label = QtWidgets.QLabel("Min threshold: ")
@@ -228,7 +230,7 @@ class INPUTStab_widgets(QtWidgets.QWidget):
         self.input_parameters_box_layout.addWidget(self.adj_mat_type_cb_label, 5, 0)
 
         self.adj_mat_type_cb = QtWidgets.QComboBox()
-        self.adj_mat_type_cb.addItems(["alpha-Carbons", "beta-Carbons", "Centroids"])
+        self.adj_mat_type_cb.addItems(["alpha-Carbons", "beta-Carbons", "Centroids", "Heavy Atoms"])
         self.input_parameters_box_layout.addWidget(self.adj_mat_type_cb, 5, 1)
 
         self.USE_THREADS = QtWidgets.QCheckBox("Use Threads")
@@ -240,6 +242,65 @@ class INPUTStab_widgets(QtWidgets.QWidget):
 
         self.USE_THREADS.setToolTip('Able/Disable the use of threads.')
 
+        self.sparse_pcn_cb = QtWidgets.QCheckBox("Sparse PCN (large structures)")
+        self.input_parameters_box_layout.addWidget(self.sparse_pcn_cb, 7, 0)
+        self.sparse_pcn_cb.setChecked(False)
+        self.sparse_pcn_cb.setToolTip('Store the PCN as a sparse matrix, without the dense adjacency matrix. Recommended for structures with many residues.')
+
+        self.edge_weights_cb_label = QtWidgets.QLabel("Edge Weights: ")
+        self.input_parameters_box_layout.addWidget(self.edge_weights_cb_label, 8, 0)
+
+        self.edge_weights_cb = QtWidgets.QComboBox()
+        self.edge_weights_cb.addItems(["None", "Distance", "Inverse Distance", "Contact Count", "pLDDT"])
+        self.input_parameters_box_layout.addWidget(self.edge_weights_cb, 8, 1)
+        self.edge_weights_cb.setToolTip('Weight the edges of the PCN (saved in the Weighted folder) for centrality and community analysis.')
+
+        self.processes_label = QtWidgets.QLabel("Processes: ")
+        self.input_parameters_box_layout.addWidget(self.processes_label, 9, 0)
+
+        self.processes_box = QtWidgets.QSpinBox()
+        self.processes_box.setRange(1, os.cpu_count() or 1)
+        self.processes_box.setSingleStep(1)
+        if sys.platform == "darwin":
+            self.processes_box.setValue(1)
+        else:
+            self.processes_box.setValue(os.cpu_count() or 1)
+        self.input_parameters_box_layout.addWidget(self.processes_box, 9, 1)
+        self.processes_box.setToolTip('Number of processes used to build the PCNs when all the proteins are analyzed.')
+
+        self.ensemble_cb = QtWidgets.QCheckBox("Multi-model ensemble")
+        self.input_parameters_box_layout.addWidget(self.ensemble_cb, 10, 0)
+        self.ensemble_cb.setChecked(False)
+        self.ensemble_cb.setToolTip('Read the MODEL records separately and save the contact frequency matrix. The analysis is done on the first model.')
+
+        self.save_frames_cb = QtWidgets.QCheckBox("Save the PCN of each model")
+        self.input_parameters_box_layout.addWidget(self.save_frames_cb, 10, 1)
+        self.save_frames_cb.setChecked(False)
+        self.save_frames_cb.setToolTip('Multi-model ensembles: save the PCN of every model in the Adj folder, not only the PCN of the first model.')
+
+        self.plddt_label = QtWidgets.QLabel("pLDDT cutoff: ")
+        self.input_parameters_box_layout.addWidget(self.plddt_label, 11, 0)
+
+        self.plddt_box = QtWidgets.QDoubleSpinBox()
+        self.plddt_box.setRange(0, 100)
+        self.plddt_box.setSingleStep(5)
+        self.plddt_box.setValue(0)
+        self.input_parameters_box_layout.addWidget(self.plddt_box, 11, 1)
+        self.plddt_box.setToolTip('AlphaFold models: drop the residues whose pLDDT (B-factor column) is below the cutoff before building the PCN. 0 keeps all the residues.')
+
+        self.export_txt_cb = QtWidgets.QCheckBox("Export text files (.txt)")
+        self.input_parameters_box_layout.addWidget(self.export_txt_cb, 12, 0)
+        self.export_txt_cb.setChecked(False)
+        self.export_txt_cb.setToolTip('The PCNs and the per-residue results are saved in the binary .npz format. Check to also export them as text files (.txt), the format of the previous versions.')
+
+        self.threshold_sweep_label = QtWidgets.QLabel("Threshold sweep: ")
+        self.input_parameters_box_layout.addWidget(self.threshold_sweep_label, 13, 0)
+
+        self.threshold_sweep_line_edit = QtWidgets.QLineEdit()
+        self.threshold_sweep_line_edit.setPlaceholderText("e.g. 4-8, 4-10, 5-12")
+        self.input_parameters_box_layout.addWidget(self.threshold_sweep_line_edit, 13, 1)
+        self.threshold_sweep_line_edit.setToolTip('Also build the PCNs of these min-max thresholds, all with one neighbor search per protein. The analysis is done on the PCN of the min and max thresholds.')
+
         # Create and add the coef plot label to the parameters box
         self.coef_plot_label = QtWidgets.QLabel("Compute the participation coefficient plot:")
         #self.input_parameters_box_layout.addWidget(self.coef_plot_label, 4, 0)
@@ -302,9 +363,30 @@ class INPUTStab_widgets(QtWidgets.QWidget):
                     else:
                         line_edit.setText("Not Found")
 
+    def load_structure_manifest(self):
+
+        ## Complete the PDB-ID with the proteins of the structures manifest of the input directory, if it was indexed (the manifest is in the output directory)
+        if not self.main_window.working_dir_path:
+            return
+
+        manifest = pcn_module.pcn_miner.readStructureManifest(os.path.join(self.main_window.working_dir_path, "input"), os.path.join(self.main_window.working_dir_path, "output"))
+        if manifest is None:
+            return
+
+        completer = QtWidgets.QCompleter(sorted(manifest["proteins"]), self.pdb_line_edit)
+        completer.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.pdb_line_edit.setCompleter(completer)
+        tooltip = "{} indexed proteins in the input directory, insert 'all' to analyze all of them.".format(len(manifest["proteins"]))
+        if len(manifest["failures"]) > 0:
+            #the files that could not be parsed are skipped by 'all' until they change
+            tooltip += "\n{} structure files could not be read and are skipped: {}".format(len(manifest["failures"]), ", ".join(sorted(manifest["failures"])[:10]))
+            if len(manifest["failures"]) > 10:
+                tooltip += ", ..."
+        self.pdb_line_edit.setToolTip(tooltip)
+
     def open_adj_file_func(self, line_edit):
 
-        self.file_path = QtWidgets.QFileDialog.getOpenFileName(self, "Open Text File", "","text files (*.txt)")
+        self.file_path = QtWidgets.QFileDialog.getOpenFileName(self, "Open Adjacency Matrix File", "","adjacency matrix or edge list files (*.npz *.npy *.txt)")
         if self.file_path:
             line_edit.setText(self.file_path[0])
             QtWidgets.QMessageBox.warning(self.main_window, "Attention!", "Please select the Min and Max thresholds according to those used to compute the selected adjacent matrix.")
@@ -478,12 +560,17 @@ class CENTRALITYtab_widgets(QtWidgets.QWidget):
                     adj_mat_type = "CB"
                 elif adj_mat_type_selection == "Centroids":
                     adj_mat_type = "centroid"
+                elif adj_mat_type_selection == "Heavy Atoms":
+                    adj_mat_type = "heavy"
 
-                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_adj_{}_{}_{}.txt".format(adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value())
+                #keep the format of the imported PCN, adjacency matrix or edge list, binary (.npz, .npy) or text (.txt)
+                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_{}_{}_{}_{}{}".format("edgelist" if "edgelist" in adj_file_name.casefold() else "adj", adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value(), os.path.splitext(adj_file_name)[1])
                 new_adj_file_path = os.path.join(self.main_window.working_dir_path, "adj", new_adj_file_name)
 
-                if os.path.isfile(new_adj_file_path):
-                    os.remove(new_adj_file_path)
+                #remove the PCN previously imported in any format, so that the new one is read (see read_adj_mat)
+                for old_adj_file_path in pcn_miner.adj_file_paths(os.path.join(self.main_window.working_dir_path, "adj", ""), new_adj_file_name.replace("_edgelist_", "_adj_", 1)):
+                    if os.path.isfile(old_adj_file_path):
+                        os.remove(old_adj_file_path)
 
                 if os.path.isfile(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name)):
                     os.remove(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name))
@@ -493,6 +580,9 @@ class CENTRALITYtab_widgets(QtWidgets.QWidget):
 
                 if not os.path.isfile(os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)):
                     shutil.copy(new_adj_file_path, os.path.join(self.main_window.working_dir_path, "outputAdj"))
+                    pcn_miner.catalog_results(os.path.join(self.main_window.working_dir_path, "output"), [os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)], "adj",
+                                              self.main_window.INPUTS_widgets.pdb_line_edit.text(), adj_mat_type = adj_mat_type,
+                                              params = {"min": self.main_window.INPUTS_widgets.non_covalent_box.value(), "max": self.main_window.INPUTS_widgets.only_significant_box.value()})
 
             if self.main_window.INPUTS_widgets.use_pymol_protein_cb.isChecked():
                 cmd.save(os.path.join(self.main_window.working_dir_path, "input", self.main_window.INPUTS_widgets.pdb_line_edit.text() + ".pdb"), self.main_window.INPUTS_widgets.pdb_line_edit.text())
@@ -531,6 +621,14 @@ class CENTRALITYtab_widgets(QtWidgets.QWidget):
         covalent_bonds_threshold = self.main_window.INPUTS_widgets.non_covalent_box,
         significant_bonds_threshold = self.main_window.INPUTS_widgets.only_significant_box,
         adj_mat_type = self.main_window.INPUTS_widgets.adj_mat_type_cb.currentText(),
+        sparse_pcn = self.main_window.INPUTS_widgets.sparse_pcn_cb.isChecked(),
+        edge_weights = self.main_window.INPUTS_widgets.edge_weights_cb.currentText(),
+        processes = self.main_window.INPUTS_widgets.processes_box.value(),
+        ensemble = self.main_window.INPUTS_widgets.ensemble_cb.isChecked(),
+        plddt_cutoff = self.main_window.INPUTS_widgets.plddt_box.value(),
+        export_txt = self.main_window.INPUTS_widgets.export_txt_cb.isChecked(),
+        threshold_sweep = self.main_window.INPUTS_widgets.threshold_sweep_line_edit.text(),
+        save_frames = self.main_window.INPUTS_widgets.save_frames_cb.isChecked(),
         type_of_analysis = "centrality",
         algorithms_to_use = self.algorithms_to_use,
         initial_choice = choice,
@@ -659,12 +757,17 @@ class SPECTRALtab_widgets(QtWidgets.QWidget):
                     adj_mat_type = "CB"
                 elif adj_mat_type_selection == "Centroids":
                     adj_mat_type = "centroid"
+                elif adj_mat_type_selection == "Heavy Atoms":
+                    adj_mat_type = "heavy"
 
-                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_adj_{}_{}_{}.txt".format(adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value())
+                #keep the format of the imported PCN, adjacency matrix or edge list, binary (.npz, .npy) or text (.txt)
+                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_{}_{}_{}_{}{}".format("edgelist" if "edgelist" in adj_file_name.casefold() else "adj", adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value(), os.path.splitext(adj_file_name)[1])
                 new_adj_file_path = os.path.join(self.main_window.working_dir_path, "adj", new_adj_file_name)
 
-                if os.path.isfile(new_adj_file_path):
-                    os.remove(new_adj_file_path)
+                #remove the PCN previously imported in any format, so that the new one is read (see read_adj_mat)
+                for old_adj_file_path in pcn_miner.adj_file_paths(os.path.join(self.main_window.working_dir_path, "adj", ""), new_adj_file_name.replace("_edgelist_", "_adj_", 1)):
+                    if os.path.isfile(old_adj_file_path):
+                        os.remove(old_adj_file_path)
 
                 if os.path.isfile(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name)):
                     os.remove(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name))
@@ -674,6 +777,9 @@ class SPECTRALtab_widgets(QtWidgets.QWidget):
 
                 if not os.path.isfile(os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)):
                     shutil.copy(new_adj_file_path, os.path.join(self.main_window.working_dir_path, "outputAdj"))
+                    pcn_miner.catalog_results(os.path.join(self.main_window.working_dir_path, "output"), [os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)], "adj",
+                                              self.main_window.INPUTS_widgets.pdb_line_edit.text(), adj_mat_type = adj_mat_type,
+                                              params = {"min": self.main_window.INPUTS_widgets.non_covalent_box.value(), "max": self.main_window.INPUTS_widgets.only_significant_box.value()})
 
             if self.main_window.INPUTS_widgets.use_pymol_protein_cb.isChecked():
                 cmd.save(os.path.join(self.main_window.working_dir_path, "input", self.main_window.INPUTS_widgets.pdb_line_edit.text() + ".pdb"), self.main_window.INPUTS_widgets.pdb_line_edit.text(), format = "pdb")
@@ -715,6 +821,14 @@ class SPECTRALtab_widgets(QtWidgets.QWidget):
         covalent_bonds_threshold = self.main_window.INPUTS_widgets.non_covalent_box,
         significant_bonds_threshold = self.main_window.INPUTS_widgets.only_significant_box,
         adj_mat_type = self.main_window.INPUTS_widgets.adj_mat_type_cb.currentText(),
+        sparse_pcn = self.main_window.INPUTS_widgets.sparse_pcn_cb.isChecked(),
+        edge_weights = self.main_window.INPUTS_widgets.edge_weights_cb.currentText(),
+        processes = self.main_window.INPUTS_widgets.processes_box.value(),
+        ensemble = self.main_window.INPUTS_widgets.ensemble_cb.isChecked(),
+        plddt_cutoff = self.main_window.INPUTS_widgets.plddt_box.value(),
+        export_txt = self.main_window.INPUTS_widgets.export_txt_cb.isChecked(),
+        threshold_sweep = self.main_window.INPUTS_widgets.threshold_sweep_line_edit.text(),
+        save_frames = self.main_window.INPUTS_widgets.save_frames_cb.isChecked(),
         type_of_analysis = "spectral",
         initial_choice = choice,
         algorithms_to_use = self.algorithms_to_use,
@@ -1000,12 +1114,17 @@ class EMBEDDINGStab_widgets(QtWidgets.QWidget):
                     adj_mat_type = "CB"
                 elif adj_mat_type_selection == "Centroids":
                     adj_mat_type = "centroid"
+                elif adj_mat_type_selection == "Heavy Atoms":
+                    adj_mat_type = "heavy"
 
-                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_adj_{}_{}_{}.txt".format(adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value())
+                #keep the format of the imported PCN, adjacency matrix or edge list, binary (.npz, .npy) or text (.txt)
+                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_{}_{}_{}_{}{}".format("edgelist" if "edgelist" in adj_file_name.casefold() else "adj", adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value(), os.path.splitext(adj_file_name)[1])
                 new_adj_file_path = os.path.join(self.main_window.working_dir_path, "adj", new_adj_file_name)
 
-                if os.path.isfile(new_adj_file_path):
-                    os.remove(new_adj_file_path)
+                #remove the PCN previously imported in any format, so that the new one is read (see read_adj_mat)
+                for old_adj_file_path in pcn_miner.adj_file_paths(os.path.join(self.main_window.working_dir_path, "adj", ""), new_adj_file_name.replace("_edgelist_", "_adj_", 1)):
+                    if os.path.isfile(old_adj_file_path):
+                        os.remove(old_adj_file_path)
 
                 if os.path.isfile(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name)):
                     os.remove(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name))
@@ -1015,6 +1134,9 @@ class EMBEDDINGStab_widgets(QtWidgets.QWidget):
 
                 if not os.path.isfile(os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)):
                     shutil.copy(new_adj_file_path, os.path.join(self.main_window.working_dir_path, "outputAdj"))
+                    pcn_miner.catalog_results(os.path.join(self.main_window.working_dir_path, "output"), [os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)], "adj",
+                                              self.main_window.INPUTS_widgets.pdb_line_edit.text(), adj_mat_type = adj_mat_type,
+                                              params = {"min": self.main_window.INPUTS_widgets.non_covalent_box.value(), "max": self.main_window.INPUTS_widgets.only_significant_box.value()})
 
             if self.main_window.INPUTS_widgets.use_pymol_protein_cb.isChecked():
                 cmd.save(os.path.join(self.main_window.working_dir_path, "input", self.main_window.INPUTS_widgets.pdb_line_edit.text() + ".pdb"), self.main_window.INPUTS_widgets.pdb_line_edit.text())
@@ -1059,6 +1181,14 @@ class EMBEDDINGStab_widgets(QtWidgets.QWidget):
         covalent_bonds_threshold = self.main_window.INPUTS_widgets.non_covalent_box,
         significant_bonds_threshold = self.main_window.INPUTS_widgets.only_significant_box,
         adj_mat_type = self.main_window.INPUTS_widgets.adj_mat_type_cb.currentText(),
+        sparse_pcn = self.main_window.INPUTS_widgets.sparse_pcn_cb.isChecked(),
+        edge_weights = self.main_window.INPUTS_widgets.edge_weights_cb.currentText(),
+        processes = self.main_window.INPUTS_widgets.processes_box.value(),
+        ensemble = self.main_window.INPUTS_widgets.ensemble_cb.isChecked(),
+        plddt_cutoff = self.main_window.INPUTS_widgets.plddt_box.value(),
+        export_txt = self.main_window.INPUTS_widgets.export_txt_cb.isChecked(),
+        threshold_sweep = self.main_window.INPUTS_widgets.threshold_sweep_line_edit.text(),
+        save_frames = self.main_window.INPUTS_widgets.save_frames_cb.isChecked(),
         type_of_analysis = "embeddings",
         algorithms_to_use = self.algorithms_to_use,
         initial_choice = choice,
@@ -1260,12 +1390,17 @@ class COMMUNITYtab_widgets(QtWidgets.QWidget):
                     adj_mat_type = "CB"
                 elif adj_mat_type_selection == "Centroids":
                     adj_mat_type = "centroid"
+                elif adj_mat_type_selection == "Heavy Atoms":
+                    adj_mat_type = "heavy"
 
-                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_adj_{}_{}_{}.txt".format(adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value())
+                #keep the format of the imported PCN, adjacency matrix or edge list, binary (.npz, .npy) or text (.txt)
+                new_adj_file_name = self.main_window.INPUTS_widgets.pdb_line_edit.text() + "_{}_{}_{}_{}{}".format("edgelist" if "edgelist" in adj_file_name.casefold() else "adj", adj_mat_type, self.main_window.INPUTS_widgets.non_covalent_box.value(), self.main_window.INPUTS_widgets.only_significant_box.value(), os.path.splitext(adj_file_name)[1])
                 new_adj_file_path = os.path.join(self.main_window.working_dir_path, "adj", new_adj_file_name)
 
-                if os.path.isfile(new_adj_file_path):
-                    os.remove(new_adj_file_path)
+                #remove the PCN previously imported in any format, so that the new one is read (see read_adj_mat)
+                for old_adj_file_path in pcn_miner.adj_file_paths(os.path.join(self.main_window.working_dir_path, "adj", ""), new_adj_file_name.replace("_edgelist_", "_adj_", 1)):
+                    if os.path.isfile(old_adj_file_path):
+                        os.remove(old_adj_file_path)
 
                 if os.path.isfile(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name)):
                     os.remove(os.path.join(self.main_window.working_dir_path, "adj", adj_file_name))
@@ -1275,6 +1410,9 @@ class COMMUNITYtab_widgets(QtWidgets.QWidget):
 
                 if not os.path.isfile(os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)):
                     shutil.copy(new_adj_file_path, os.path.join(self.main_window.working_dir_path, "outputAdj"))
+                    pcn_miner.catalog_results(os.path.join(self.main_window.working_dir_path, "output"), [os.path.join(self.main_window.working_dir_path, "outputAdj", new_adj_file_name)], "adj",
+                                              self.main_window.INPUTS_widgets.pdb_line_edit.text(), adj_mat_type = adj_mat_type,
+                                              params = {"min": self.main_window.INPUTS_widgets.non_covalent_box.value(), "max": self.main_window.INPUTS_widgets.only_significant_box.value()})
 
             if self.main_window.INPUTS_widgets.use_pymol_protein_cb.isChecked():
                 cmd.save(os.path.join(self.main_window.working_dir_path, "input", self.main_window.INPUTS_widgets.pdb_line_edit.text() + ".pdb"), self.main_window.INPUTS_widgets.pdb_line_edit.text())
@@ -1316,6 +1454,14 @@ class COMMUNITYtab_widgets(QtWidgets.QWidget):
         covalent_bonds_threshold = self.main_window.INPUTS_widgets.non_covalent_box,
         significant_bonds_threshold = self.main_window.INPUTS_widgets.only_significant_box,
         adj_mat_type = self.main_window.INPUTS_widgets.adj_mat_type_cb.currentText(),
+        sparse_pcn = self.main_window.INPUTS_widgets.sparse_pcn_cb.isChecked(),
+        edge_weights = self.main_window.INPUTS_widgets.edge_weights_cb.currentText(),
+        processes = self.main_window.INPUTS_widgets.processes_box.value(),
+        ensemble = self.main_window.INPUTS_widgets.ensemble_cb.isChecked(),
+        plddt_cutoff = self.main_window.INPUTS_widgets.plddt_box.value(),
+        export_txt = self.main_window.INPUTS_widgets.export_txt_cb.isChecked(),
+        threshold_sweep = self.main_window.INPUTS_widgets.threshold_sweep_line_edit.text(),
+        save_frames = self.main_window.INPUTS_widgets.save_frames_cb.isChecked(),
         type_of_analysis = "community",
         algorithms_to_use = self.algorithms_to_use,
         initial_choice = choice,
@@ -1509,9 +1655,9 @@ class RESULTStab_widgets(QtWidgets.QWidget):
             for alg in self.main_window.dict_of_algorithms[analysis]:
                 # If the algorithm-specific sub-directory exists
                 tmp_path = os.path.join(path, alg, "Part_coefs_Sessions")
-                if os.path.isdir(tmp_path):
-                    self.main_window.part_coeff_results_dict[alg]["results"] = os.listdir(tmp_path)
-                    self.main_window.part_coeff_results_dict[alg]["location"] = tmp_path
+                listing = self.results_listing(["part_coefs_session", "part_coefs_plot", "z_intraconn"], alg, tmp_path)
+                if listing is not None:
+                    self.main_window.part_coeff_results_dict[alg]["results"], self.main_window.part_coeff_results_dict[alg]["location"] = listing
 
         if self.main_window.part_coeff_results_dict:
             frame.update_frame(analysis)
@@ -1525,19 +1671,19 @@ class RESULTStab_widgets(QtWidgets.QWidget):
             if os.path.isdir(path):
                 # If the algorithm-specific sub-directory exists
                 tmp_path = os.path.join(path, "Sessions")
-                if os.path.isdir(tmp_path):
-                    self.main_window.algorithms_results_dict[alg]["results"] = os.listdir(tmp_path)
-                    self.main_window.algorithms_results_dict[alg]["location"] = tmp_path
+                listing = self.results_listing(["session"], alg, tmp_path)
+                if listing is not None:
+                    self.main_window.algorithms_results_dict[alg]["results"], self.main_window.algorithms_results_dict[alg]["location"] = listing
 
                 tmp_path = os.path.join(path, "Clusters")
-                if os.path.isdir(tmp_path):
-                    self.main_window.algorithms_results_dict_clusters[alg]["results"] = os.listdir(tmp_path)
-                    self.main_window.algorithms_results_dict_clusters[alg]["location"] = tmp_path
+                listing = self.results_listing(["labels"], alg, tmp_path)
+                if listing is not None:
+                    self.main_window.algorithms_results_dict_clusters[alg]["results"], self.main_window.algorithms_results_dict_clusters[alg]["location"] = listing
 
                 tmp_path = os.path.join(path, "Summary")
-                if os.path.isdir(tmp_path):
-                    self.main_window.algorithms_results_dict_summary[alg]["results"] = os.listdir(tmp_path)
-                    self.main_window.algorithms_results_dict_summary[alg]["location"] = tmp_path
+                listing = self.results_listing(["summary"], alg, tmp_path)
+                if listing is not None:
+                    self.main_window.algorithms_results_dict_summary[alg]["results"], self.main_window.algorithms_results_dict_summary[alg]["location"] = listing
 
         if self.main_window.algorithms_results_dict and self.main_window.algorithms_results_dict_clusters and self.main_window.algorithms_results_dict_summary:
             frame.update_frame(analysis)
@@ -1552,13 +1698,13 @@ class RESULTStab_widgets(QtWidgets.QWidget):
             for alg in self.main_window.dict_of_algorithms["centrality"]:
                 # If the algorithm-specific sub-directory exists
                 tmp_path = os.path.join(path, alg, "Sessions")
-                if os.path.isdir(tmp_path):
-                    self.main_window.algorithms_results_dict[alg]["results"] = os.listdir(tmp_path)
-                    self.main_window.algorithms_results_dict[alg]["location"] = tmp_path
+                listing = self.results_listing(["centralities_session"], alg, tmp_path)
+                if listing is not None:
+                    self.main_window.algorithms_results_dict[alg]["results"], self.main_window.algorithms_results_dict[alg]["location"] = listing
                 tmp_path = os.path.join(path, alg, "Txt")
-                if os.path.isdir(tmp_path):
-                    self.main_window.algorithms_results_dict_txt[alg]["results"] = os.listdir(tmp_path)
-                    self.main_window.algorithms_results_dict_txt[alg]["location"] = tmp_path
+                listing = self.results_listing(["centralities"], alg, tmp_path)
+                if listing is not None:
+                    self.main_window.algorithms_results_dict_txt[alg]["results"], self.main_window.algorithms_results_dict_txt[alg]["location"] = listing
 
         if self.main_window.algorithms_results_dict and self.main_window.algorithms_results_dict_txt:
             self.centrality_frame.update_frame("centrality")
@@ -1570,13 +1716,34 @@ class RESULTStab_widgets(QtWidgets.QWidget):
         # os.path.basename(os.path.normpath(self.main_window.working_dir_path))
         outputAdj_path = os.path.join(self.main_window.working_dir_path, "outputAdj")
 
-        if os.path.isdir(outputAdj_path):
-            outputAdj_list = [file for file in os.listdir(outputAdj_path) if file != "adj_matrix_dict.json"]
+        listing = self.results_listing(["adj"], None, outputAdj_path)
+        if listing is not None:
+            outputAdj_list = [file for file in listing[0] if file != "adj_matrix_dict.json"]
         else:
             outputAdj_list = []
 
         return outputAdj_list
 
+    def results_listing(self, kinds, algorithm, folder):
+        ## Results files of an algorithm saved in a folder and the folder itself, None if the folder has no results.
+        ## They are queried from the results catalog of the output directory (see pcn_miner.catalog_results), the files of the
+        ## previous versions, saved without catalog, are listed from the folder. The catalogued files deleted from the folder are skipped.
+
+        output_path = os.path.join(self.main_window.working_dir_path, "output")
+        folder = os.path.normpath(os.path.abspath(folder)) #the paths of the catalog are absolute and normalized
+
+        if not os.path.isdir(folder):
+            return None
+
+        present = set(os.listdir(folder))
+        rows = [row for row in pcn_miner.query_results_catalog(output_path, kind = kinds, algorithm = algorithm, folder = folder) if row["file"] in present]
+        for row in rows:
+            self.main_window.results_catalog[row["path"]] = row
+        files = [row["file"] for row in rows]
+        files = files + sorted(present.difference(files))
+
+        return (files, folder) if files else None
+
 
     # def add_adj_matrices_frames(self, outputAdj_list):
     #
@@ -24,14 +24,10 @@ from sys import platform
 import sys
 import os
 import json
+import itertools
 
 from .pcn_miner import pcn_miner, pcn_pymol_scripts
 
-try:
-    from networkx import from_numpy_matrix
-except:
-    pass
-
 import numpy as np
 try:
     from scipy.linalg import eigh
@@ -63,7 +59,15 @@ class PCN_MAIN():
     d_value = "",
     beta = 0.01,
     walk_len = 100,
-    num_walks = 100):
+    num_walks = 100,
+    sparse_pcn = False,
+    edge_weights = "None",
+    processes = None,
+    ensemble = False,
+    plddt_cutoff = None,
+    export_txt = False,
+    threshold_sweep = None,
+    save_frames = False):
 
         self.parent_window = parent
 
@@ -79,6 +83,14 @@ class PCN_MAIN():
         self.walk_len = walk_len
         self.num_walks = num_walks
         self.initial_choice = initial_choice
+        self.sparse_pcn = sparse_pcn
+        self.processes = processes
+        self.ensemble = ensemble
+        self.save_frames = save_frames #ensembles: save the PCN of each model, not only the analyzed one
+        self.plddt_cutoff = plddt_cutoff if plddt_cutoff else None #0 disables the pLDDT filter
+        self.export_txt = export_txt
+        #list of (min, max) pairs or "min-max, min-max, ..." string, the PCNs of the other thresholds to build (see pcn_miner.parseThresholds)
+        self.threshold_sweep = pcn_miner.parseThresholds(threshold_sweep) if threshold_sweep else []
 
         if adj_mat_type == "alpha-Carbons":
             self.adj_mat_type = "CA"
@@ -86,6 +98,19 @@ class PCN_MAIN():
             self.adj_mat_type = "CB"
         elif adj_mat_type == "Centroids":
             self.adj_mat_type = "centroid"
+        elif adj_mat_type == "Heavy Atoms":
+            self.adj_mat_type = "heavy"
+
+        if edge_weights == "Distance":
+            self.weight_type = "distance"
+        elif edge_weights == "Inverse Distance":
+            self.weight_type = "inverse_distance"
+        elif edge_weights == "Contact Count":
+            self.weight_type = "contact_count"
+        elif edge_weights == "pLDDT":
+            self.weight_type = "plddt"
+        else:
+            self.weight_type = None
 
         scripts_path = (os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
 
@@ -97,18 +122,6 @@ class PCN_MAIN():
 
         self.main()
 
-    def check_pdb_chain(self, path_to_pdb):
-        with open(path_to_pdb) as pdbfile:
-            for line in pdbfile:
-                if line[:4] == 'ATOM':
-                    if line[21].strip():
-                        has_chain = True
-                        break
-                    else:
-                        has_chain = False
-
-        return has_chain
-
 
     def prepare_inputs(self):
 
@@ -234,10 +247,7 @@ class PCN_MAIN():
             #if the given pdb file path exists
             if is_dir_prot:
 
-                #create a list of all the .pdb files inside the pdb file path
                 if (not proteins_path.endswith(add_slash_to_path)):
-                    protein_list_dir = [file[:(len(file)-4)] for file in os.listdir(proteins_path) if file.endswith('.pdb')]
-                    #print("List of proteins in {}: {}".format(proteins_path, protein_list_dir))
 
                     #choose the pdb files
                     # print('Please Insert Protein PDB Identifiers, separated by comma, without .pdb, e.g. 7nxc for 7nxc.pdb ')
@@ -246,14 +256,23 @@ class PCN_MAIN():
 
                     #if the user choose the option "all", he wants to study all the proteins in the pdb file path
                     if protein_choice.casefold() == 'all':
-                        proteins_list = protein_list_dir
+                        #index the structure files (.pdb, .pdb.gz, .cif, .cif.gz) inside the pdb file path in parallel, only the new or changed files are parsed
+                        manifest = pcn_miner.index_structures_parallel(proteins_path, output_path, self.processes, "{}Cache{}".format(output_path, add_slash_to_path))
+                        proteins_list = list(manifest["proteins"])
+                        #print("List of proteins in {}: {}".format(proteins_path, proteins_list))
                     else:
-                        proteins_list = [protein.casefold() for protein in protein_choice.replace(" ","").split(",")] #strip space
+                        #a protein can be a selection "code:chains:ranges:shell" (e.g. 6vxx:A+B:1-150:8), the chains are case sensitive
+                        #the typed pdb codes are casefolded, the names of the files found in "all" mode keep their case
+                        proteins_list = [pcn_miner.selectionName(*pcn_miner.parseSelection(protein, casefold_code = True)) for protein in protein_choice.replace(" ","").split(",")] #strip space
+
+                    #AlphaFold models: the residues below the pLDDT cutoff are dropped at parse time (e.g. 6vxx is analyzed as 6vxx~~~~70)
+                    if self.plddt_cutoff is not None:
+                        proteins_list = [pcn_miner.confidenceSelectionName(protein, self.plddt_cutoff) for protein in proteins_list]
 
                     proteins_path = proteins_path+add_slash_to_path
-                    pdb_list = proteins_list.copy()
+                    pdb_list = list(dict.fromkeys(pcn_miner.parseSelection(protein)[0] for protein in proteins_list))
                     for i, protein in enumerate(pdb_list):
-                        if (not protein.endswith('.pdb')):
+                        if (pcn_miner.structureName(protein) is None):
                             pdb_list[i] = protein+'.pdb'
                     #check if the user given pdb codes are in the pdb file path, if they are not here the software will download them
                     pcn_miner.checkIfFilesExists(pdb_list, "pdb", proteins_path)
@@ -263,6 +282,8 @@ class PCN_MAIN():
 
             min_ = self.covalent_bonds_threshold.value()
             max_ = self.significant_bonds_threshold.value()
+            #thresholds of the sweep, the PCN of the min and max thresholds is the analyzed one
+            sweep_thresholds = list(dict.fromkeys(self.threshold_sweep + [(min_, max_)])) if self.threshold_sweep else []
 
             #if the user want to analyze an existing PCN
             if(initial_choice == 'adj'):
@@ -285,7 +306,7 @@ class PCN_MAIN():
                 #if the adj file path and the protein file path exists
 
                 if (is_dir_adj and is_dir_prot):
-                    adj_list = [protein.casefold()+"_adj_{}_{}_{}.txt".format(self.adj_mat_type, min_, max_) for protein in proteins_list]
+                    adj_list = [pcn_miner.selectionName(*pcn_miner.parseSelection(protein))+"_adj_{}_{}_{}.npz".format(self.adj_mat_type, min_, max_) for protein in proteins_list]
                     self.logfile.write(str(adj_list))
                     pcn_miner.checkIfFilesExists(adj_list, "adj", proteins_path, adj_filespath, adj_mat_type = self.adj_mat_type) #check if really exist the PCN for the given pdb file
                 else:
@@ -471,257 +492,323 @@ class PCN_MAIN():
 
     ######################## MODIFIED - end ##########################
 
-            #for each protein in the selected proteins list
-            for protein in proteins_list:
-
-                p_name = protein
-                protein_path = proteins_path+p_name+".pdb"
-                ## Modify to get the list of residues computed in the matrix ('res_list' variable)
-                atoms, res_list = pcn_miner.readPDBFile(protein_path) #read
-
-                residues = pcn_miner.getResidueCoordinates(atoms, self.adj_mat_type)
-                dict_residue_name = pcn_miner.associateResidueName(residues)
-                residue_names = np.array(list(dict_residue_name.items()))
-
-                #if the user starts with a pdb file, we have to compute the PCN
-                if(initial_choice == 'pdb'):
-
-                    print("computing adjacency matrix for protein {}... (This may take time)".format(p_name))
-                    #parallel computation, TODO: TEST PARALLEL COMPUTATION ON MAC AND THEN UNCOMMENT THIS
-                    #A = pcn_miner.adjacent_matrix(output_path, residues, p_name, min_, max_)
-                    #non parallel computation
-                    # Modified to get the name of the adj matrix
-                    A, matrix_file_name = pcn_miner.adjacent_matrix_nonparallel(output_path, residues, p_name, min_, max_, adj_mat_type = self.adj_mat_type)
-                    print(res_list)
-                    self.adj_matrix_dict[matrix_file_name] = str(res_list)
-
-                #if the user starts with a precomputed PCN, read the adj file that represent the PCN
-                else:     #'adj'
-                    print("reading adjacency matrix for protein {}...".format(p_name))
-                    A = pcn_miner.read_adj_mat(adj_filespath, p_name, min_, max_, adj_mat_type = self.adj_mat_type)
-
-                #if the user wants to do a centrality measure
-                #if (centrality_initial_choice  == 0):
-
-                # if centrality_initial_choice:
-                #
-                #     print(("protein {}: CENTRALITY MEASURES COMPUTING NOW").format(p_name))
-                #
-                #     #create the PCN from the adj file
-                #     G = from_numpy_matrix(A)
-                #     #extract the residue names: example ALA1
-                #     residue_names_1 = np.array(residue_names[:, 1], dtype = str)
-                #
-                #     #for each centrality measure in the selected centrality measures
-                #     for centrality_choice in centralities_choice:
-                #         print(centrality_choice)
-                #
-                #         if(centrality_choice in supported_centralities_measures):
-                #             #compute the nodes centrality for the graph F
-                #             print("Computing {} centrality measure on {} PCN".format(centrality_choice, p_name))
-                #             method_to_call = getattr(pcn_miner, centrality_choice)
-                #             centrality_measures = method_to_call(G, residue_names_1)#call the supported method from the pcn_miner file
-                #             pcn_miner.save_centralities(output_path, centrality_measures, p_name, centrality_choice) #save a txt file
-                #             pcn_pymol_scripts.pymol_plot_centralities(output_path, centrality_measures, protein_path, centrality_choice) #plot and save centralities with pymol
-                #
-                #         else:
-                #             print("Centrality method {} not supported".format(centrality_choice))
-
-                #if the number of selected algorithm for structural analysis (spectral clusterin, community detection, etc) is greater than 0
-                if (len(algorithms_choice)>0):
-
-                    #compute the PCN from the Adj matrix
-                    G = from_numpy_matrix(A)
-                    #for each algorithm in the selected structural algorithms list
-                    for algorithm_choice in algorithms_choice:
-
-                        if type_choice == 'centrality':
-
-                            residue_names_1 = np.array(residue_names[:, 1], dtype = str)
-
-                            if(algorithm_choice in supported_centralities_measures):
-                                #compute the nodes centrality for the graph F
-                                print("Computing {} centrality measure on {} PCN".format(algorithm_choice, p_name))
-                                method_to_call = getattr(pcn_miner, algorithm_choice)
-                                centrality_measures = method_to_call(G, residue_names_1)#call the supported method from the pcn_miner file
-                                pcn_miner.save_centralities(output_path, centrality_measures, p_name, method = algorithm_choice, adj_mat_type = self.adj_mat_type) #save a txt file
-                                has_chain = self.check_pdb_chain(protein_path)
-                                if has_chain:
-                                    pcn_pymol_scripts.pymol_plot_centralities(output_path, centrality_measures, protein_path, algorithm_choice, self.adj_mat_type) #plot and save centralities with pymol
-                                else:
-                                    assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
-
+            #if the user wants to analyze all the proteins, build all the PCNs in parallel before the analysis
+            prebuilt_pcns = dict()
+            failed_pcns = dict()
+            if ((initial_choice == 'pdb') and (self.pdb_input.text().casefold() == 'all') and (self.processes != 1) and (len(proteins_list) > 1) and (not self.ensemble)):
+                prebuilt_pcns, failed_pcns = pcn_miner.build_pcns_parallel(proteins_list, proteins_path, output_path, min_, max_, self.adj_mat_type, self.processes, self.sparse_pcn, self.weight_type, self.export_txt)
+
+            #the results files are written in background while the next results are computed (see pcn_miner.ResultsWriter),
+            #the queued files are written and the failed saves reported at the end of the run
+            with pcn_miner.ResultsWriter() as writer:
+
+                #for each protein in the selected proteins list
+                for protein in proteins_list:
+
+                    p_name = protein
+                    p_code, selection = pcn_miner.parseSelection(p_name)
+                    protein_path = pcn_miner.resolveStructurePath(proteins_path, p_code)
+
+                    if p_name in failed_pcns:
+                        print("skipping protein {}: {}".format(p_name, failed_pcns[p_name]))
+                        continue
+
+                    prebuilt_pcn = prebuilt_pcns.pop(p_name, None)
+                    if prebuilt_pcn is not None:
+                        res_list = prebuilt_pcn["res_list"]
+                        residues = prebuilt_pcn["residues"]
+                        residue_labels = prebuilt_pcn["residue_labels"]
+                        has_chain = prebuilt_pcn["has_chain"]
+                        confidence = prebuilt_pcn["confidence"]
+                    elif self.ensemble:
+                        if selection is not None:
+                            raise Exception("chain and residue selections ('{}') are not supported with ensembles.".format(p_name))
+                        #stream the models one at a time (constant memory), the analysis is done on the first model
+                        frames = pcn_miner.iterPDBFrames(protein_path, self.adj_mat_type)
+                        first_frame = next(frames)
+                        second_frame = next(frames, None)
+                        _, residues, residue_labels, res_list = first_frame
+                        has_chain = bool(np.any(np.char.partition(np.asarray(residue_labels, dtype = str), " ")[:, 2] != ''))
+                        confidence = None
+                    else:
+                        ## Modify to get the list of residues computed in the matrix ('res_list' variable)
+                        #the file is read once (atoms, residues list, chains and sequence) and cached in the Cache folder, keyed by the file content
+                        #the selection (chains, residue ranges and shell) is applied right after the parsing
+                        structure = pcn_miner.ProteinStructure(protein_path, "{}Cache{}".format(output_path, add_slash_to_path), selection) #read
+                        #columnar parser and vectorized reduction: residues is an (n, 3) float array, parallel to residue_labels
+                        residues, residue_labels = structure.residueCoordinates(self.adj_mat_type)
+                        res_list = structure.res_list
+                        has_chain = structure.has_chain
+                        confidence = structure.residueConfidence(self.adj_mat_type) if self.weight_type == "plddt" else None
+                    #interned residue table: the per-residue results are vectors aligned to it
+                    residue_table = pcn_miner.residueTable(residue_labels)
+
+                    #threshold sweep: the PCNs of all the thresholds pairs are built with one neighbor search (see pcn_miner.adjacent_matrix_sweep),
+                    #the PCN of the min and max thresholds is built here too, unless it is prebuilt or weighted
+                    sweep_file_names = dict()
+                    sweep_pcns = dict()
+                    if ((initial_choice == 'pdb') and sweep_thresholds):
+                        if self.ensemble:
+                            print("skipping the threshold sweep of protein {}: not supported with ensembles.".format(p_name))
+                        elif any((pair != (min_, max_)) for pair in sweep_thresholds):
+                            thresholds = [pair for pair in sweep_thresholds if (pair != (min_, max_)) or ((prebuilt_pcn is None) and (self.weight_type is None))]
+                            sweep_file_names, sweep_pcns = pcn_miner.adjacent_matrix_sweep(output_path, residues, p_name, thresholds, adj_mat_type = self.adj_mat_type, sparse_pcn = self.sparse_pcn, export_txt = self.export_txt, writer = writer, return_pcns = True)
+                            for sweep_file_name in sweep_file_names.values():
+                                self.adj_matrix_dict[sweep_file_name] = str(res_list)
+
+                    #if the PCN was already built by the parallel pre-stage
+                    if prebuilt_pcn is not None:
+                        A = prebuilt_pcn["A"]
+                        if not self.sparse_pcn:
+                            A = A.toarray()
+                        matrix_file_name = prebuilt_pcn["matrix_file_name"]
+                        self.adj_matrix_dict[matrix_file_name] = str(res_list)
+
+                    #if the user starts with a pdb file, we have to compute the PCN
+                    elif(initial_choice == 'pdb'):
+
+                        print("computing adjacency matrix for protein {}... (This may take time)".format(p_name))
+                        #parallel computation, TODO: TEST PARALLEL COMPUTATION ON MAC AND THEN UNCOMMENT THIS
+                        #A = pcn_miner.adjacent_matrix(output_path, residues, p_name, min_, max_)
+                        #vectorized computation
+                        # Modified to get the name of the adj matrix
+                        if (self.ensemble and second_frame is not None):
+                            #one pass on the stream of models: PCN of each model and contact frequency matrix
+                            frames = itertools.chain([first_frame, second_frame], frames)
+                            A, freq, matrix_file_names = pcn_miner.contact_frequency_stream(output_path, frames, p_name, min_, max_, adj_mat_type = self.adj_mat_type, save_frames = self.save_frames, export_txt = self.export_txt, writer = writer)
+                            if self.save_frames:
+                                matrix_file_name = matrix_file_names[0]
                             else:
-                                print("Centrality method {} not supported".format(algorithm_choice))
+                                #only the PCN of the analyzed first model is saved
+                                matrix_file_name = pcn_miner.save_adj_mat(output_path, p_name, pcn_miner.adj_mat_edges(A), A.shape[0], min_, max_, self.adj_mat_type, self.export_txt, writer = writer)
+                            if not self.sparse_pcn:
+                                A = A.toarray()
+                        elif (min_, max_) in sweep_pcns:
+                            #already built by the threshold sweep
+                            A = sweep_pcns[(min_, max_)]
+                            if not self.sparse_pcn:
+                                A = A.toarray()
+                            matrix_file_name = sweep_file_names[(min_, max_)]
+                        elif self.sparse_pcn:
+                            #sparse computation, the PCN is saved as edge list
+                            A, matrix_file_name = pcn_miner.adjacent_matrix_sparse(output_path, residues, p_name, min_, max_, adj_mat_type = self.adj_mat_type, weight_type = self.weight_type, confidence = confidence, export_txt = self.export_txt, writer = writer)
+                        else:
+                            A, matrix_file_name = pcn_miner.adjacent_matrix_vectorized(output_path, residues, p_name, min_, max_, adj_mat_type = self.adj_mat_type, weight_type = self.weight_type, confidence = confidence, export_txt = self.export_txt, writer = writer)
+                        print(res_list)
+                        self.adj_matrix_dict[matrix_file_name] = str(res_list)
+
+                    #if the user starts with a precomputed PCN, read the adj file that represent the PCN
+                    else:     #'adj'
+                        print("reading adjacency matrix for protein {}...".format(p_name))
+                        #adjacency matrix or edge list, the edge lists are loaded as sparse matrices with the residues of the structure
+                        A = pcn_miner.read_adj_mat(adj_filespath, p_name, min_, max_, adj_mat_type = self.adj_mat_type, sparse_pcn = self.sparse_pcn, n = len(residue_labels))
+
+                    #if the user wants to do a centrality measure
+                    #if (centrality_initial_choice  == 0):
+
+                    # if centrality_initial_choice:
+                    #
+                    #     print(("protein {}: CENTRALITY MEASURES COMPUTING NOW").format(p_name))
+                    #
+                    #     #create the PCN from the adj file
+                    #     G = from_numpy_matrix(A)
+                    #     #extract the residue names: example ALA1
+                    #     residue_names_1 = np.array(residue_names[:, 1], dtype = str)
+                    #
+                    #     #for each centrality measure in the selected centrality measures
+                    #     for centrality_choice in centralities_choice:
+                    #         print(centrality_choice)
+                    #
+                    #         if(centrality_choice in supported_centralities_measures):
+                    #             #compute the nodes centrality for the graph F
+                    #             print("Computing {} centrality measure on {} PCN".format(centrality_choice, p_name))
+                    #             method_to_call = getattr(pcn_miner, centrality_choice)
+                    #             centrality_measures = method_to_call(G, residue_names_1)#call the supported method from the pcn_miner file
+                    #             pcn_miner.save_centralities(output_path, centrality_measures, p_name, centrality_choice) #save a txt file
+                    #             pcn_pymol_scripts.pymol_plot_centralities(output_path, centrality_measures, protein_path, centrality_choice) #plot and save centralities with pymol
+                    #
+                    #         else:
+                    #             print("Centrality method {} not supported".format(centrality_choice))
+
+                    #if the number of selected algorithm for structural analysis (spectral clusterin, community detection, etc) is greater than 0
+                    if (len(algorithms_choice)>0):
+
+                        #compute the PCN from the Adj matrix
+                        if self.weight_type is not None:
+                            #weighted PCN: the edge weights are saved in the same pass of the adjacency matrix, or computed now if missing
+                            W = pcn_miner.weighted_adjacent_matrix(output_path, residues, p_name, min_, max_, adj_mat_type = self.adj_mat_type, weight_type = self.weight_type, confidence = confidence, writer = writer)
+                            G = pcn_miner.pcn_graph(W)
+                            weight = "weight"
+                        else:
+                            G = pcn_miner.pcn_graph(A)
+                            weight = None
+                        #for each algorithm in the selected structural algorithms list
+                        for algorithm_choice in algorithms_choice:
 
+                            if type_choice == 'centrality':
 
-                        print(("protein {} with algorithm {}: COMPUTING NOW").format(p_name, algorithm_choice))
+                                if(algorithm_choice in supported_centralities_measures):
+                                    #compute the nodes centrality for the graph F
+                                    print("Computing {} centrality measure on {} PCN".format(algorithm_choice, p_name))
+                                    method_to_call = getattr(pcn_miner, algorithm_choice)
+                                    if algorithm_choice == "degree_c":
+                                        centrality_measures = method_to_call(G, residue_table)#call the supported method from the pcn_miner file
+                                    else:
+                                        centrality_measures = method_to_call(G, residue_table, weight=weight)
+                                    writer.submit(pcn_miner.save_centralities, output_path, centrality_measures, residue_table, p_name, method = algorithm_choice, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt) #save the centralities
+                                    if has_chain:
+                                        pcn_pymol_scripts.pymol_plot_centralities(output_path, centrality_measures, residue_table, protein_path, algorithm_choice, self.adj_mat_type, protein_name = p_name) #plot and save centralities with pymol
+                                    else:
+                                        assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
 
-                        #if "clustering" (spectral or embeddings)
-                        if ((type_choice == 'spectral') or (type_choice == 'embeddings')):
-                            #if the user didn't want to use the same value of k for all the proteins
-                            if (k_initial_choice != 0):
-                                #ask the number of clusters to use
-                                if (type_choice == 'spectral'):
-                                    k_choice = self.k_value    #### !!!!!!!! ####
-                                    #k_choice = str(input("Entering k for spectral clustering {} algorithm: Enter an int, a list of ints (split with ',') or type 'best_k': ".format(algorithm_choice)))
-                                    if (k_choice == self.k_value):
-                                        n_of_best_ks     #### !!!!!!!! ####
-                                        #n_of_best_ks = int(input("Enter the number of best_ks to try: "))
                                 else:
-                                    k_choice = self.k_value #### !!!!!!!! ####
-                                    #k_choice = str(input("Entering k for embedding+clustering: Enter an int, a list of ints (split with ','): "))
+                                    print("Centrality method {} not supported".format(algorithm_choice))
 
-                                if (k_choice == self.k_value):
-                                    pass
-                                elif(k_choice.split(',')):
-                                    ks =  [int(item) for item in k_choice.replace(" ","").split(",")]
 
-                                else:
-                                    raise Exception("'k_choice' input must be an int, a list of ints or 'best_k' but '{}' given.".format(k_choice))
+                            print(("protein {} with algorithm {}: COMPUTING NOW").format(p_name, algorithm_choice))
 
-                            #if the user wants to use the best number of clusters for a spectral clustering, use the max eigengap method
-                            if (k_choice == 'best_k'):
-                                if('shimalik' in algorithm_choice): #if the algorithm follows the Shi Malik approach
-                                    L = pcn_miner.compute_laplacian_matrix(A)       #unnormalized laplacian matrix
-                                    D = pcn_miner.degree_matrix(A)                  #degree matrix
-                                    eigenvalues = eigh(L, D, eigvals_only=True)     #Shi Malik approach: generalized eigenvalue problem
+                            #if "clustering" (spectral or embeddings)
+                            if ((type_choice == 'spectral') or (type_choice == 'embeddings')):
+                                #if the user didn't want to use the same value of k for all the proteins
+                                if (k_initial_choice != 0):
+                                    #ask the number of clusters to use
+                                    if (type_choice == 'spectral'):
+                                        k_choice = self.k_value    #### !!!!!!!! ####
+                                        #k_choice = str(input("Entering k for spectral clustering {} algorithm: Enter an int, a list of ints (split with ',') or type 'best_k': ".format(algorithm_choice)))
+                                        if (k_choice == self.k_value):
+                                            n_of_best_ks     #### !!!!!!!! ####
+                                            #n_of_best_ks = int(input("Enter the number of best_ks to try: "))
+                                    else:
+                                        k_choice = self.k_value #### !!!!!!!! ####
+                                        #k_choice = str(input("Entering k for embedding+clustering: Enter an int, a list of ints (split with ','): "))
 
-                                elif('norm' in algorithm_choice):  #if the algorithm selected follows a normalized approach
-                                    L = pcn_miner.compute_normalized_laplacian(A)   #normalized laplacian matrix
-                                    eigenvalues, eigenvectors  = np.linalg.eig(L)   #compute eigenvectors and eigenvalues of norm L
+                                    if (k_choice == self.k_value):
+                                        pass
+                                    elif(k_choice.split(',')):
+                                        ks =  [int(item) for item in k_choice.replace(" ","").split(",")]
 
-                                else: #if the algorithm selected follows an unormalized approach
-                                    L = pcn_miner.compute_laplacian_matrix(A)       #unnormalized laplacian matrix
-                                    eigenvalues, eigenvectors = np.linalg.eig(L)    #compute eigenvectors and eigenvalues of unnorm L
+                                    else:
+                                        raise Exception("'k_choice' input must be an int, a list of ints or 'best_k' but '{}' given.".format(k_choice))
+
+                                #if the user wants to use the best number of clusters for a spectral clustering, use the max eigengap method
+                                if (k_choice == 'best_k'):
+                                    if('shimalik' in algorithm_choice): #if the algorithm follows the Shi Malik approach
+                                        L = pcn_miner.compute_laplacian_matrix(A)       #unnormalized laplacian matrix
+                                        D = pcn_miner.degree_matrix(A)                  #degree matrix
+                                        if self.sparse_pcn:
+                                            eigenvalues = pcn_miner.computeLargestEigenvalues(L, D)   #only the eigenvalues used by the max eigengap method
+                                        else:
+                                            eigenvalues = eigh(L, D, eigvals_only=True)     #Shi Malik approach: generalized eigenvalue problem
+
+                                    elif('norm' in algorithm_choice):  #if the algorithm selected follows a normalized approach
+                                        L = pcn_miner.compute_normalized_laplacian(A)   #normalized laplacian matrix
+                                        eigenvalues, eigenvectors  = np.linalg.eig(L)   #compute eigenvectors and eigenvalues of norm L
+
+                                    else: #if the algorithm selected follows an unormalized approach
+                                        L = pcn_miner.compute_laplacian_matrix(A)       #unnormalized laplacian matrix
+                                        if self.sparse_pcn:
+                                            eigenvalues = pcn_miner.computeLargestEigenvalues(L)   #only the eigenvalues used by the max eigengap method
+                                        else:
+                                            eigenvalues, eigenvectors = np.linalg.eig(L)    #compute eigenvectors and eigenvalues of unnorm L
+
+                                    #call max eigengap method
+                                    ks = pcn_miner.computeBestK(eigenvalues, n_k=n_of_best_ks)
+
+                                print("Selected ks: {}".format(str(ks)))
 
-                                #call max eigengap method
-                                ks = pcn_miner.computeBestK(eigenvalues, n_k=n_of_best_ks)
+                                for k in ks:
 
-                            print("Selected ks: {}".format(str(ks)))
+                                    #call the selected method, with the selected parameter, from the pcn_miner file
+                                    method_to_call = getattr(pcn_miner, algorithm_choice)
+                                    if type_choice == 'embeddings':
+                                        print("{} with {} with k = {}, d = {}, beta = {}, walk_len = {}, num_walks = {}".format(p_name, algorithm_choice, k, d, beta, walk_len, num_walks))
+                                        labels = method_to_call(A, n_clusters=k, d=d, beta=beta, walk_len=walk_len, num_walks=num_walks)
+                                    elif type_choice == 'spectral':
+                                        print("{} with {} with k = {}".format(p_name, algorithm_choice, k))
+                                        labels = method_to_call(A, n_clusters=k)
+                                        d=None
+                                        beta=None
+                                        walk_len=None
+                                        num_walks=None
+                                    #save communities/clusters (columnar results file, see save_residue_results)
+                                    writer.submit(pcn_miner.save_labels, output_path, labels, residue_table, p_name, algorithm_choice, d, beta, walk_len, num_walks, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt)
+
+                                    #if the algorithm selected follows a Soft Spectral Clustering approach
+                                    if "ssc" in algorithm_choice:
+                                        #not always the real number of clusters extracted with Fuzzy C-Means is equal with the selected number of cluster k
+                                        print("Given k = {} but soft clustering algoritmh found k {} clusters".format(k, int(max(labels)+1)))
+                                        k = int(max(labels)) + 1
+
+                                    #pymol plots
+                                    if(type_choice == 'embeddings'):
+                                        if has_chain:
+                                            pcn_pymol_scripts.pymol_plot_embeddings(protein_path, output_path, "ClustersEmbeddings", algorithm_choice, k, d, walk_len = walk_len, num_walks = num_walks, beta = beta, adj_mat_type = self.adj_mat_type, protein_name = p_name, labels = labels, residue_table = residue_table)
+                                        else:
+                                            assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
+                                    else:#clustering
+                                        if has_chain:
+                                            pcn_pymol_scripts.pymol_plot(protein_path, output_path, "Clusters", algorithm_choice, k, self.adj_mat_type, protein_name = p_name, labels = labels, residue_table = residue_table)
+                                        else:
+                                            assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
+
+                                    #if the user want to compute the partecipation coefficients
+                                    if (plot_p == 0):
+                                        # G = from_numpy_matrix(A) #maybe delete that
+                                        p = pcn_miner.participation_coefs(G, labels)
+                                        writer.submit(pcn_miner.save_part_coef, output_path, p, residue_table, p_name, algorithm_choice, k, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt)
+                                        output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
+                                        pcn_pymol_scripts.pymol_plot_part_coefs(p, residue_table, protein_path, output_path_p, algorithm_choice, k, self.adj_mat_type, protein_name = p_name, catalog_output_path = output_path)
+                                        z = pcn_miner.z_intraconnectivity(G, labels)
+                                        writer.submit(pcn_miner.save_part_coef_plot_data, output_path, p, z, residue_table, p_name, algorithm_choice, k, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt)
 
-                            for k in ks:
+                            if type_choice == 'community':#type_choice = 'community'
 
-                                #call the selected method, with the selected parameter, from the pcn_miner file
+                                #call the method
                                 method_to_call = getattr(pcn_miner, algorithm_choice)
-                                if type_choice == 'embeddings':
-                                    print("{} with {} with k = {}, d = {}, beta = {}, walk_len = {}, num_walks = {}".format(p_name, algorithm_choice, k, d, beta, walk_len, num_walks))
-                                    labels = method_to_call(A, n_clusters=k, d=d, beta=beta, walk_len=walk_len, num_walks=num_walks)
-                                elif type_choice == 'spectral':
-                                    print("{} with {} with k = {}".format(p_name, algorithm_choice, k))
-                                    labels = method_to_call(A, n_clusters=k)
-                                    d=None
-                                    beta=None
-                                    walk_len=None
-                                    num_walks=None
-                                #save communities/clusters as a txt file
-                                pcn_miner.save_labels(output_path, labels, residue_names, p_name, algorithm_choice, d, beta, walk_len, num_walks, adj_mat_type = self.adj_mat_type)
-
-                                #if the algorithm selected follows a Soft Spectral Clustering approach
-                                if "ssc" in algorithm_choice:
-                                    #not always the real number of clusters extracted with Fuzzy C-Means is equal with the selected number of cluster k
-                                    print("Given k = {} but soft clustering algoritmh found k {} clusters".format(k, int(max(labels)+1)))
-                                    k = int(max(labels)) + 1
-
-                                #pymol plots
-                                if(type_choice == 'embeddings'):
-                                    has_chain = self.check_pdb_chain(protein_path)
-                                    if has_chain:
-                                        pcn_pymol_scripts.pymol_plot_embeddings(protein_path, output_path, "ClustersEmbeddings", algorithm_choice, k, d, walk_len = walk_len, num_walks = num_walks, beta = beta, adj_mat_type = self.adj_mat_type)
-                                    else:
-                                        assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
-                                else:#clustering
-                                    has_chain = self.check_pdb_chain(protein_path)
-                                    if has_chain:
-                                        pcn_pymol_scripts.pymol_plot(protein_path, output_path, "Clusters", algorithm_choice, k, self.adj_mat_type)
-                                    else:
-                                        assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
 
-                                #if the user want to compute the partecipation coefficients
-                                if (plot_p == 0):
-                                    # G = from_numpy_matrix(A) #maybe delete that
-                                    residue_names_1 = np.array(residue_names[:, 1], dtype = str)
-                                    p = pcn_miner.participation_coefs(G, labels, residue_names_1)
-                                    pcn_miner.save_part_coef(output_path, p, p_name, algorithm_choice, k, adj_mat_type = self.adj_mat_type)
-                                    output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
-                                    pcn_pymol_scripts.pymol_plot_part_coefs(p, protein_path, output_path_p, algorithm_choice, k, self.adj_mat_type)
-                                    part_file = open("{}Part_coefs_Sessions{}{}_part_coefs_{}_k{}_{}.txt".format(output_path_p, add_slash_to_path, p_name, algorithm_choice, k, self.adj_mat_type), "w")
-                                    part_file.write(str(p))
-                                    part_file.close()
-
-                                    z = pcn_miner.z_intraconnectivity(G, labels, residue_names_1)
-                                    output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
-                                    part_file = open("{}Part_coefs_Sessions{}{}_z_intraconn_{}_k{}_{}.txt".format(output_path_p, add_slash_to_path, p_name, algorithm_choice, k, self.adj_mat_type), "w")
-                                    part_file.write(str(z))
-                                    part_file.close()
-
-                        if type_choice == 'community':#type_choice = 'community'
-
-                            #call the method
-                            method_to_call = getattr(pcn_miner, algorithm_choice)
-
-                            #if the algorithm is asyn fluidic
-                            if (algorithm_choice == 'asyn_fluidc'):
-                                #if the user didn't want to use the same number of communities
-                                if (k_initial_choice != 0):
-                                    k_choice = self.k_value    #### !!!!!!!! ####
-                                    #k_choice = str(input("Entering k for Asyn FluidC: Enter an int, a list of ints (split with ','): "))
-                                    if(k_choice.split(',')):
-                                        ks =  [int(item) for item in k_choice.replace(" ","").split(",")]
-                                #for each number of communities in the list of numbers of communities to try
-                                for k in ks:
-                                    labels = method_to_call(G, k) #call the method
-                                    pcn_miner.save_labels(output_path, labels, residue_names, p_name,  method=algorithm_choice, adj_mat_type = self.adj_mat_type) #save the communities as txt file
-                                    has_chain = self.check_pdb_chain(protein_path)
+                                #if the algorithm is asyn fluidic
+                                if (algorithm_choice == 'asyn_fluidc'):
+                                    #if the user didn't want to use the same number of communities
+                                    if (k_initial_choice != 0):
+                                        k_choice = self.k_value    #### !!!!!!!! ####
+                                        #k_choice = str(input("Entering k for Asyn FluidC: Enter an int, a list of ints (split with ','): "))
+                                        if(k_choice.split(',')):
+                                            ks =  [int(item) for item in k_choice.replace(" ","").split(",")]
+                                    #for each number of communities in the list of numbers of communities to try
+                                    for k in ks:
+                                        labels = method_to_call(G, k) #call the method
+                                        writer.submit(pcn_miner.save_labels, output_path, labels, residue_table, p_name,  method=algorithm_choice, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt) #save the communities
+                                        if has_chain:
+                                            pcn_pymol_scripts.pymol_plot(protein_path, output_path, "Communities", algorithm_choice, k, self.adj_mat_type, protein_name = p_name, labels = labels, residue_table = residue_table) #plot and save the communities with pymol
+                                        else:
+                                            assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
+
+                                        #if the user wants to compute the partecipation coefficients
+                                        if (plot_p == 0):
+                                            p = pcn_miner.participation_coefs(G, labels)
+                                            writer.submit(pcn_miner.save_part_coef, output_path, p, residue_table, p_name, algorithm_choice, k, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt) #save the part coefs
+                                            output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
+                                            pcn_pymol_scripts.pymol_plot_part_coefs(p, residue_table, protein_path, output_path_p, algorithm_choice, k, self.adj_mat_type, protein_name = p_name, catalog_output_path = output_path) #plot and save part coefs with pymol
+                                            z = pcn_miner.z_intraconnectivity(G, labels)
+                                            writer.submit(pcn_miner.save_part_coef_plot_data, output_path, p, z, residue_table, p_name, algorithm_choice, k, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt)
+
+                                else:#if the community detection algorithm is not Asyn Fluidc, no need to specify the number of communities
+                                    labels = method_to_call(G) #call the method
+                                    n_coms = int( max(labels) + 1)
+                                    writer.submit(pcn_miner.save_labels, output_path, labels, residue_table, p_name,  method=algorithm_choice, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt) #save communities
                                     if has_chain:
-                                        pcn_pymol_scripts.pymol_plot(protein_path, output_path, "Communities", algorithm_choice, k, self.adj_mat_type) #plot and save the communities with pymol
+                                        pcn_pymol_scripts.pymol_plot(protein_path, output_path, "Communities", algorithm_choice, n_coms, self.adj_mat_type, protein_name = p_name, labels = labels, residue_table = residue_table) #plot and save communities with pymol
                                     else:
                                         assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
 
                                     #if the user wants to compute the partecipation coefficients
                                     if (plot_p == 0):
-                                        residue_names_1 = np.array(residue_names[:, 1], dtype = str)
-                                        p = pcn_miner.participation_coefs(G, labels, residue_names_1)
-                                        pcn_miner.save_part_coef(output_path, p, p_name, algorithm_choice, k, adj_mat_type = self.adj_mat_type) #save the part coefs as txt file
+                                        p = pcn_miner.participation_coefs(G, labels)
+                                        writer.submit(pcn_miner.save_part_coef, output_path, p, residue_table, p_name, algorithm_choice, n_coms, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt)
                                         output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
-                                        pcn_pymol_scripts.pymol_plot_part_coefs(p, protein_path, output_path_p, algorithm_choice, k, self.adj_mat_type) #plot and save part coefs with pymol
-                                        part_file = open("{}Part_coefs_Sessions{}{}_part_coefs_{}_k{}_{}.txt".format(output_path_p, add_slash_to_path, p_name, algorithm_choice, k, self.adj_mat_type), "w")
-                                        part_file.write(str(p))
-                                        part_file.close()
-
-                                        z = pcn_miner.z_intraconnectivity(G, labels, residue_names_1)
-                                        output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
-                                        part_file = open("{}Part_coefs_Sessions{}{}_z_intraconn_{}_k{}_{}.txt".format(output_path_p, add_slash_to_path, p_name, algorithm_choice, k, self.adj_mat_type), "w")
-                                        part_file.write(str(z))
-                                        part_file.close()
-
-                            else:#if the community detection algorithm is not Asyn Fluidc, no need to specify the number of communities
-                                residue_names_1 = np.array(residue_names[:, 1], dtype = str)
-                                labels = method_to_call(G) #call the method
-                                n_coms = int( max(labels) + 1)
-                                pcn_miner.save_labels(output_path, labels, residue_names, p_name,  method=algorithm_choice, adj_mat_type = self.adj_mat_type) #save communities as txt
-                                has_chain = self.check_pdb_chain(protein_path)
-                                if has_chain:
-                                    pcn_pymol_scripts.pymol_plot(protein_path, output_path, "Communities", algorithm_choice, n_coms, self.adj_mat_type) #plot and save communities with pymol
-                                else:
-                                    assert has_chain == True, "PDB file {} does not have any valid chain. Please modify accordingly to proceed with the analysis".format(protein_path)
-
-                                #if the user wants to compute the partecipation coefficients
-                                if (plot_p == 0):
-                                    residue_names_1 = np.array(residue_names[:, 1], dtype = str)
-                                    p = pcn_miner.participation_coefs(G, labels, residue_names_1)
-                                    pcn_miner.save_part_coef(output_path, p, p_name, algorithm_choice, n_coms, adj_mat_type = self.adj_mat_type)
-                                    output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
-                                    pcn_pymol_scripts.pymol_plot_part_coefs(p, protein_path, output_path_p, algorithm_choice, n_coms, self.adj_mat_type)
-                                    part_file = open("{}Part_coefs_Sessions{}{}_part_coefs_{}_k{}_{}.txt".format(output_path_p, add_slash_to_path, p_name, algorithm_choice, n_coms, self.adj_mat_type), "w")
-                                    part_file.write(str(p))
-                                    part_file.close()
-
-                                    z = pcn_miner.z_intraconnectivity(G, labels, residue_names_1)
-                                    output_path_p = "{}{}{}{}".format(output_path, add_slash_to_path, algorithm_choice, add_slash_to_path)
-                                    part_file = open("{}Part_coefs_Sessions{}{}_z_intraconn_{}_k{}_{}.txt".format(output_path_p, add_slash_to_path, p_name, algorithm_choice, n_coms, self.adj_mat_type), "w")
-                                    part_file.write(str(z))
-                                    part_file.close()
+                                        pcn_pymol_scripts.pymol_plot_part_coefs(p, residue_table, protein_path, output_path_p, algorithm_choice, n_coms, self.adj_mat_type, protein_name = p_name, catalog_output_path = output_path)
+                                        z = pcn_miner.z_intraconnectivity(G, labels)
+                                        writer.submit(pcn_miner.save_part_coef_plot_data, output_path, p, z, residue_table, p_name, algorithm_choice, n_coms, adj_mat_type = self.adj_mat_type, export_txt = self.export_txt)
 
     ######################## MODIFIED  ##########################
             #print('Computation Completed.')
@@ -7,6 +7,17 @@ import os
 from sys import platform
 import datetime
 import itertools
+import gzip
+import shlex
+import hashlib
+import re
+import json
+import warnings
+import sqlite3
+import time
+import threading
+import queue
+from ast import literal_eval
 
 try:
     import matplotlib.pyplot as plt
@@ -14,7 +25,16 @@ except:
     pass
 
 try:
-    from networkx import from_numpy_matrix, to_numpy_matrix
+    from networkx import from_numpy_array, to_numpy_array
+    try:
+        from networkx import from_scipy_sparse_array, to_scipy_sparse_array
+    except ImportError:
+        #networkx < 2.7
+        from networkx import from_scipy_sparse_matrix as from_scipy_sparse_array, to_scipy_sparse_matrix as to_scipy_sparse_array
+except ImportError:
+    pass
+
+try:
     from networkx.algorithms.centrality import degree_centrality, eigenvector_centrality, closeness_centrality, betweenness_centrality, betweenness_centrality_subset
     from networkx.algorithms.community.asyn_fluid import asyn_fluidc as asyn_fluidc_
     from networkx.algorithms.community import greedy_modularity_communities
@@ -42,8 +62,11 @@ except:
     pass
 
 try:
-    from scipy.spatial.distance import euclidean
+    from scipy.spatial.distance import euclidean, cdist
+    from scipy.spatial import cKDTree
     from scipy.linalg import eigh, eig
+    from scipy import sparse
+    from scipy.sparse.linalg import eigsh
 except:
     pass
 
@@ -112,12 +135,12 @@ def checkIfFilesExists(files, initial_choice, proteins_path, adj_path = None, co
     for file in files:
 
         if initial_choice=="pdb":
-            p_name = file[:(len(file)-4)]
+            p_name = structureName(file)
         elif initial_choice=="adj":
-            filename_splitted = (file.split(".txt"))[0].split("_") #adj = 6vxx_adj_mat_min_max.txt
-            p_name = filename_splitted[0]
+            filename_splitted = os.path.splitext(file)[0].split("_") #adj = 6vxx_adj_mat_min_max.npz
+            p_name, _ = parseSelection(filename_splitted[0]) #the pdb code of a selection (6vxx~A+B~1-150_adj_mat_min_max.txt)
 
-        pdb_path = "{}{}.pdb".format(proteins_path, p_name)
+        pdb_path = resolveStructurePath(proteins_path, p_name)
         if((not os.path.isfile(pdb_path))):
             all_pdb_files_exists = False
             not_existing_pdb_files.append(file)
@@ -125,12 +148,16 @@ def checkIfFilesExists(files, initial_choice, proteins_path, adj_path = None, co
     if(not all_pdb_files_exists):
         for file in not_existing_pdb_files:
             if initial_choice=="pdb":
-                p_name = file[:(len(file)-4)]
+                p_name = structureName(file)
             elif initial_choice=="adj":
-                filename_splitted = (file.split(".txt"))[0].split("_") #adj = 6vxx_adj_mat_min_max.txt
-                p_name = filename_splitted[0]
+                filename_splitted = os.path.splitext(file)[0].split("_") #adj = 6vxx_adj_mat_min_max.npz
+                p_name, _ = parseSelection(filename_splitted[0])
             print(("protein {} pdb file missing, fetching on PDB database...").format(p_name))
-            urlretrieve("http://files.rcsb.org/download/{}.pdb".format(p_name), "{}{}.pdb".format(proteins_path, p_name))
+            try:
+                urlretrieve("http://files.rcsb.org/download/{}.pdb".format(p_name), "{}{}.pdb".format(proteins_path, p_name))
+            except Exception:
+                #large structures are distributed only in the mmCIF format
+                urlretrieve("http://files.rcsb.org/download/{}.cif.gz".format(p_name), "{}{}.cif.gz".format(proteins_path, p_name))
             print(("protein {} fetched successfully").format(p_name))
         all_pdb_file_exists = True
 
@@ -139,22 +166,28 @@ def checkIfFilesExists(files, initial_choice, proteins_path, adj_path = None, co
         all_adj_files_exists = True
         for file in files:
 
-            file_path = "{}{}".format(adj_path, file)
-            if((not os.path.isfile(file_path))):
+            #a matrix saved in the other format (binary .npz or text .txt) or an edge list is also accepted, see read_adj_mat
+            if(not any(os.path.isfile(adj_file) for adj_file in adj_file_paths(adj_path, file))):
                 all_adj_files_exists = False
                 not_existing_adj_files.append(file)
 
         if (not all_adj_files_exists):
+            #group the missing thresholds by protein, so that each protein is read and searched only once
+            missing_thresholds = dict()
             for filename in not_existing_adj_files:
-                filename_splitted = (filename.split(".txt"))[0].split("_") #adj = 6vxx_adj_mat_min_max.txt
+                filename_splitted = os.path.splitext(filename)[0].split("_") #adj = 6vxx_adj_mat_min_max.npz
                 p_name = filename_splitted[0]
                 min_ = float (filename_splitted[3])
                 max_ = float (filename_splitted[4])
+                missing_thresholds.setdefault(p_name, []).append((min_, max_))
+
+            for p_name, thresholds in missing_thresholds.items():
                 print(("protein {} adj matrix missing...").format(p_name))
-                protein_path = proteins_path+p_name+".pdb"
-                atoms, res_list = readPDBFile(protein_path)
-                coordinates = getResidueCoordinates(atoms, adj_mat_type)
-                dict_residue_name = associateResidueName(coordinates)
+                output_path = os.path.abspath(os.path.join(adj_path, os.pardir))+add_slash_to_path
+                p_code, selection = parseSelection(p_name)
+                protein_path = resolveStructurePath(proteins_path, p_code)
+                coordinates, residue_labels, res_list = readResidueCoordinates(protein_path, adj_mat_type, "{}Cache{}".format(output_path, add_slash_to_path), selection)
+                dict_residue_name = associateResidueName(residue_labels)
                 residue_names = np.array(list (dict_residue_name.items()))
 
                 if comp_adj_fr is not None and window is not None:
@@ -163,13 +196,12 @@ def checkIfFilesExists(files, initial_choice, proteins_path, adj_path = None, co
                     comp_adj_fr.pack()
                     window.update()
 
-                print("computing adjacency matrix with thresholds: min = {} and max = {} ... (This may take time)".format(min_, max_))
-                output_path = os.path.abspath(os.path.join(adj_path, os.pardir))+add_slash_to_path
+                print("computing adjacency matrix with thresholds: {} ... (This may take time)".format(", ".join("min = {} and max = {}".format(min_, max_) for min_, max_ in thresholds)))
 
                 #parallel computation, TODO: TEST PARALLEL COMPUTATION ON MAC AND THEN UNCOMMENT THIS
                 #A =  adjacent_matrix(output_path, coordinates, p_name, min_, max_, comp_adj_fr, window)
-                #non parallel computation
-                A = adjacent_matrix_nonparallel(output_path, coordinates, p_name, min_, max_, comp_adj_fr, window, adj_mat_type = adj_mat_type)
+                #vectorized computation, one neighbor search for all the thresholds
+                adjacent_matrix_sweep(output_path, coordinates, p_name, thresholds, comp_adj_fr, window, adj_mat_type = adj_mat_type)
 
             all_adj_file_exists = True
 
@@ -202,14 +234,1112 @@ def readPDBFile(pdbFilePath):
     print(datetime_object)
     return np.array(atoms), res_list
 
+def groupResidueAtoms(atoms, heavy_only = True):
+    """
+    Group the atoms of the pdb file by amino acid, in a vectorized way.
+    A new amino acid starts every time the chain or the residue number changes. Only the canonical amino acids having an alpha-C are kept.
+    Parameters:
+        atoms: np.array, contains all the informations contained in the 'ATOM' key of the pdb files.
+        heavy_only: boolean, default True. If True, hydrogen and deuterium atoms are discarded.
+    Returns:
+        residue_names: list of strings, the names of the amino acids (e.g. "LYS127 A").
+        atom_cords: np.array of shape (m, 3), the coordinates of the kept atoms.
+        atom_residue: np.array of shape (m,), for each kept atom the index of its amino acid in residue_names.
+    """
+    residues_list = ['ALA', 'CYS', 'ASP', 'GLU', 'PHE', 'GLY', 'HIS', 'ILE', 'LYS',
+                   'LEU', 'MET', 'ASN', 'PRO', 'GLN', 'ARG', 'SER', 'THR', 'VAL',
+                   'TRP', 'TYR']
+
+    atoms = atoms[np.isin(atoms[:, 3], residues_list)]
+    atm_types = np.char.strip(atoms[:, 2].astype(str))
+
+    if heavy_only:
+        elements = np.array([atm_type.lstrip("0123456789")[:1] for atm_type in atm_types])
+        heavy = ~np.isin(elements, ["H", "D"])
+        atoms = atoms[heavy]
+        atm_types = atm_types[heavy]
+
+    if atoms.shape[0] == 0:
+        return [], np.zeros((0, 3)), np.zeros((0), dtype=np.int64)
+
+    residue_nums = atoms[:, 5].astype(int)
+    chains = atoms[:, 4]
+    new_residue = np.ones(atoms.shape[0], dtype=bool)
+    new_residue[1:] = (residue_nums[1:] != residue_nums[:-1]) | (chains[1:] != chains[:-1])
+    atom_residue = np.cumsum(new_residue) - 1
+
+    #only keep the amino acids with an alpha-C, like for the centroids
+    has_ca = np.zeros(atom_residue[-1] + 1, dtype=bool)
+    has_ca[atom_residue[atm_types == "CA"]] = True
+    keep = has_ca[atom_residue]
+    new_index = np.cumsum(has_ca) - 1
+
+    starts = np.nonzero(new_residue)[0][has_ca]
+    residue_names = [atoms[i, 3] + str(residue_nums[i]) + " " + chains[i] for i in starts]
+    atom_cords = atoms[keep][:, 6:9].astype(float)
+    atom_residue = new_index[atom_residue[keep]]
+
+    return residue_names, atom_cords, atom_residue
+
+#supported structure file formats, in order of preference
+structure_extensions = [".pdb", ".pdb.gz", ".cif", ".cif.gz"]
+
+#the standard amino acids
+amino_acids = ['ALA', 'CYS', 'ASP', 'GLU', 'PHE', 'GLY', 'HIS', 'ILE', 'LYS', 'LEU', 'MET', 'ASN', 'PRO', 'GLN', 'ARG', 'SER', 'THR', 'VAL', 'TRP', 'TYR']
+
+#maximum size in bytes of the parsed structure cache (Cache folder), the least recently used entries are evicted
+structure_cache_size = 512*1024*1024
+#version of the parsers in the names of the cache entries, increased when the parsed columns or the residue coordinates change so the old entries are not reused
+structure_cache_version = 3
+
+#name of the structures manifests written in the Manifests folder of the output directory by index_structures_parallel,
+#one for each pdb files folder (see structureManifestPath)
+structure_manifest_name = "structures_manifest_{}.json"
+
+#adjacency matrix file formats, in order of preference: the binary edge array (see save_adj_mat) and the dense text matrix
+adj_file_extensions = [".npz", ".txt"]
+#edge list PCN file formats ({p}_edgelist_{adj_mat_type}_{min_}_{max_}), in order of preference: binary (see read_edge_list) and text
+edge_list_extensions = [".npz", ".npy", ".txt"]
+
+#catalog of the saved PCNs and results, in the output root (see catalog_results)
+results_catalog_name = "Catalog.sqlite"
+#open connections to the results catalogs, one for each thread and catalog (see connect_results_catalog)
+results_catalog_connections = threading.local()
+#results catalogs whose tables and indexes were created by this process
+results_catalog_initialized = set()
+
+def resolveStructurePath(proteins_path, p_name):
+    """
+    Find the structure file of a protein, trying the supported formats in order: .pdb, .pdb.gz, .cif, .cif.gz.
+    Parameters:
+        proteins_path: string, is the path of the structure files.
+        p_name: string, is the protein pdb code.
+    Returns:
+        path: string, the path of the structure file, or the .pdb path if no file exists.
+    """
+    for extension in structure_extensions:
+        path = "{}{}{}".format(proteins_path, p_name, extension)
+        if os.path.isfile(path):
+            return path
+    return "{}{}.pdb".format(proteins_path, p_name)
+
+def structureName(file_name):
+    """
+    Remove the structure format extension (.pdb, .pdb.gz, .cif, .cif.gz) from a file name.
+    Parameters:
+        file_name: string, the structure file name.
+    Returns:
+        p_name: string, the protein pdb code, or None if the file is not a supported structure file.
+    """
+    for extension in structure_extensions:
+        if file_name.endswith(extension):
+            return file_name[:(len(file_name)-len(extension))]
+    return None
+
+def openStructureFile(path, mode = "rb"):
+    """
+    Open a structure file, decompressing it on the fly if it is gzip compressed (.gz), so that it can be streamed line by line.
+    Parameters:
+        path: string, is the complete structure file path.
+        mode: string, default "rb", "rb" to read bytes or "rt" to read text.
+    Returns:
+        file object.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+def hybrid36Value(text, width):
+    """
+    Decode a hybrid-36 number of the pdb format (e.g. "A0000" = 100000 for the 5 characters atom serials, "A000" = 10000 for the 4 characters residue numbers).
+    Parameters:
+        text: string, the stripped field.
+        width: int, the width of the field.
+    Returns:
+        value: int, the decoded number, None if the field is not a hybrid-36 number (e.g. "*****").
+    """
+    if (len(text) != width) or (not text.isalnum()) or (not text.isascii()):
+        return None
+    if text[0].isupper() and not any(char.islower() for char in text):
+        return int(text, 36) - 10 * 36**(width-1) + 10**width
+    if text[0].islower() and not any(char.isupper() for char in text):
+        return int(text, 36) + 16 * 36**(width-1) + 10**width
+    return None
+
+def decodeResidueNumbers(resnum_field):
+    """
+    Convert the residue number fields of the pdb format into ints, decoding the hybrid-36 numbers of the structures with more than 9999 residues.
+    The unreadable fields (e.g. "****") get a number below the range of the field (lower than -10**width), distinct for each run of equal fields,
+    so the residues stay separated.
+    Parameters:
+        resnum_field: np.array of bytes, the residue number fields (columns 23-26).
+    Returns:
+        resnum: np.array of int, the residue numbers.
+    """
+    values = np.char.strip(resnum_field)
+    resnum = np.empty(values.shape[0], dtype=np.int64)
+    decimal = np.char.isdigit(np.char.lstrip(values, b'-')) & (values != b'-')
+    resnum[decimal] = values[decimal].astype(np.int64)
+
+    if not np.all(decimal):
+        unique_values, inverse = np.unique(values[~decimal], return_inverse=True)
+        decoded = [hybrid36Value(value.decode(), resnum_field.dtype.itemsize) for value in unique_values]
+        valid = np.array([value is not None for value in decoded], dtype=bool)
+        decoded = np.array([0 if value is None else value for value in decoded], dtype=np.int64)
+        new_run = np.ones(values.shape[0], dtype=bool)
+        new_run[1:] = resnum_field[1:] != resnum_field[:-1]
+        fallback = -10**resnum_field.dtype.itemsize - np.cumsum(new_run)[~decimal]
+        resnum[~decimal] = np.where(valid[inverse], decoded[inverse], fallback)
+
+    return resnum
+
+def pdbLinesToColumns(lines):
+    """
+    Convert a chunk of 'ATOM' lines of a pdb file into columns.
+    The fixed-width columns are sliced from a (atoms x 80) byte matrix, so no Python string is created for each field.
+    Parameters:
+        lines: list of bytes, the 'ATOM' lines.
+    Returns:
+        columns: dict of np.array, see readPDBColumns. It also contains the raw residue number field "resnum_field".
+    """
+    m = len(lines)
+    records = np.array(lines, dtype='S80').view(np.uint8).reshape(m, 80)
+
+    def column(start, stop):
+        return np.ascontiguousarray(records[:, start:stop]).view('S{}'.format(stop - start)).reshape(m)
+
+    def float_column(start, stop):
+        values = np.char.strip(column(start, stop))
+        values[values == b''] = b'nan'
+        return values.astype(float)
+
+    coords = np.empty((m, 3))
+    coords[:, 0] = column(30, 38).astype(float)
+    coords[:, 1] = column(38, 46).astype(float)
+    coords[:, 2] = column(46, 54).astype(float)
+
+    resnum_field = column(22, 26)
+
+    return {
+        "serial": column(6, 11), #fixed-width: hybrid-36 or "*****" in the structures with more than 99999 atoms
+        "name": np.char.strip(column(12, 16)),
+        "altloc": column(16, 17),
+        "resname": column(17, 20),
+        "chain": column(21, 22),
+        "resnum": decodeResidueNumbers(resnum_field),
+        "icode": column(26, 27),
+        "coords": coords,
+        "occupancy": float_column(54, 60),
+        "bfactor": float_column(60, 66),
+        "element": np.char.strip(column(76, 78)),
+        "resnum_field": resnum_field,
+    }
+
+def concatenateColumns(chunks):
+    """
+    Concatenate the columns of the chunks of a structure file and compute its res_list.
+    Parameters:
+        chunks: list of dict of np.array, the columns of each chunk.
+    Returns:
+        columns: dict of np.array, the columns of the whole structure.
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+    """
+    columns = dict()
+    for key in chunks[0].keys():
+        columns[key] = np.concatenate([chunk[key] for chunk in chunks])
+
+    #a new residue starts every time the residue number field changes, like in readPDBFile
+    resnum_field = columns.pop("resnum_field")
+    new_residue = np.ones(resnum_field.shape[0], dtype=bool)
+    new_residue[1:] = resnum_field[1:] != resnum_field[:-1]
+    res_list = [(columns["resname"][i].decode(), resnum_field[i].decode().rjust(4)) for i in np.nonzero(new_residue)[0]]
+
+    return columns, res_list
+
+def readPDBColumns(pdbFilePath, chunk_size = 100000, return_seqres = False):
+    """
+    Fast columnar reading of the 'ATOM' records of the pdb file (plain or gzip compressed).
+    The file is streamed as bytes and converted in chunks of chunk_size atoms (see pdbLinesToColumns), so the memory used
+    does not depend on the size of the file but only on the number of atoms: coordinates are float arrays, residue numbers
+    int arrays (see decodeResidueNumbers) and the serials and the names compact fixed-width byte arrays.
+    Only the first model of a multi-model file (MODEL/ENDMDL records) is read, the models of an ensemble are streamed by iterPDBFrames.
+    Parameters:
+        pdbFilePath: string, is the complete PDB file path to read (.pdb or .pdb.gz).
+        chunk_size: int, default 100000, number of atoms converted at a time.
+        return_seqres: boolean, default False. If True, the 'SEQRES' records are read in the same pass and returned too.
+    Returns:
+        columns: dict of np.array, one entry for each atom with keys "serial" (S5), "name" (S4), "altloc" (S1), "resname" (S3),
+                 "chain" (S1), "resnum" (int), "icode" (S1), "coords" (float, shape (atoms, 3)), "occupancy" (float),
+                 "bfactor" (float) and "element" (S2). Missing occupancy and bfactor values are nan.
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+        seq_res: np.array, only if return_seqres is True, the sequence of the amino acids, as returned by getResiduesSequence.
+    """
+    chunks = []
+    lines = []
+    seqres_lines = []
+    last_model = False
+    with openStructureFile(pdbFilePath) as pdbfile:
+        for line in pdbfile:
+            if line[:4] == b'ATOM':
+                if last_model:
+                    break
+                lines.append(line.rstrip(b'\r\n'))
+                if len(lines) >= chunk_size:
+                    chunks.append(pdbLinesToColumns(lines))
+                    lines = []
+            elif line[:6] == b'SEQRES':
+                seqres_lines.append(line.decode())
+            elif line[:6] == b'ENDMDL':
+                last_model = True #only the first model is read, the models of an ensemble are read by iterPDBFrames
+    chunks.append(pdbLinesToColumns(lines))
+
+    columns, res_list = concatenateColumns(chunks)
+    if return_seqres:
+        return columns, res_list, parseSEQRES(seqres_lines)
+    return columns, res_list
+
+def cifRowsToColumns(rows):
+    """
+    Convert a chunk of '_atom_site' rows of a mmCIF file into columns.
+    Parameters:
+        rows: list of lists of bytes, for each atom the fields returned by readCIFColumns:
+              id, atom name, alt id, residue name, chain, residue number, insertion code, x, y, z, occupancy, B factor, element
+              and the label residue number, used when the author residue number is missing.
+    Returns:
+        columns: dict of np.array, see readPDBColumns. It also contains the raw residue number field "resnum_field".
+                 The atoms without a residue number (author and label) are dropped.
+    """
+    table = np.array(rows, dtype=bytes).reshape(len(rows), 14)
+    #'?' and '.' are the mmCIF missing values
+    table[(table == b'?') | (table == b'.')] = b''
+    table[:, 5] = np.where(table[:, 5] == b'', table[:, 13], table[:, 5])
+    table = table[table[:, 5] != b'']
+    m = table.shape[0]
+
+    def sized_column(i):
+        #fixed-width bytes as wide as the longest value, e.g. the chains of the large assemblies
+        return table[:, i].astype('S{}'.format(max(1, int(np.char.str_len(table[:, i]).max(initial=0)))))
+
+    def float_column(i):
+        values = table[:, i].copy()
+        values[values == b''] = b'nan'
+        return values.astype(float)
+
+    def flag_column(i, dtype):
+        #blank flags are a space in the pdb format
+        values = table[:, i].astype(dtype)
+        values[values == b''] = b' '
+        return values
+
+    return {
+        "serial": table[:, 0],
+        "name": table[:, 1].astype('S4'),
+        "altloc": flag_column(2, 'S1'),
+        "resname": table[:, 3].astype('S3'),
+        "chain": np.where(table[:, 4] == b'', b' ', sized_column(4)),
+        "resnum": table[:, 5].astype(np.int64),
+        "icode": flag_column(6, 'S1'),
+        "coords": table[:, 7:10].astype(float).reshape(m, 3),
+        "occupancy": float_column(10),
+        "bfactor": float_column(11),
+        "element": table[:, 12].astype('S2'),
+        "resnum_field": sized_column(5),
+    }
+
+def readCIFColumns(cifFilePath, chunk_size = 100000, return_seqres = False):
+    """
+    Streaming columnar reading of the 'ATOM' records of the '_atom_site' loop of a mmCIF file (plain or gzip compressed).
+    The file is read line by line and only the needed fields are kept, converted in chunks of chunk_size atoms,
+    so large assemblies distributed only as mmCIF are read with a memory proportional to the number of atoms.
+    The author fields (auth_*) are used when present, as in the pdb format, the label residue number when the author one is missing ('?' or '.').
+    Only the first model (pdbx_PDB_model_num) is read, as in readPDBColumns.
+    Parameters:
+        cifFilePath: string, is the complete mmCIF file path to read (.cif or .cif.gz).
+        chunk_size: int, default 100000, number of atoms converted at a time.
+        return_seqres: boolean, default False. If True, the sequence of the '_entity_poly_seq' loop (one for each entity,
+                       not for each chain as the pdb 'SEQRES' records) is read in the same pass and returned too.
+    Returns:
+        columns: dict of np.array, same keys of readPDBColumns ("chain" is as wide as the longest chain, mmCIF chains can be longer than one character).
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+        seq_res: np.array, only if return_seqres is True, the sequence of the amino acids.
+    """
+    wanted = [("id",), ("auth_atom_id", "label_atom_id"), ("label_alt_id",), ("auth_comp_id", "label_comp_id"),
+              ("auth_asym_id", "label_asym_id"), ("auth_seq_id", "label_seq_id"), ("pdbx_PDB_ins_code",),
+              ("Cartn_x",), ("Cartn_y",), ("Cartn_z",), ("occupancy",), ("B_iso_or_equiv",), ("type_symbol",), ("label_seq_id",)]
+
+    chunks = []
+    rows = []
+    fields = []
+    seq_fields = []
+    seq_res = []
+    pending = []
+    indices = None
+    in_loop = False
+    first_model = None
+    last_model = False
+
+    with openStructureFile(cifFilePath) as ciffile:
+        for line in ciffile:
+            line = line.strip()
+
+            if indices is None:
+                #header of the _atom_site loop
+                if line.startswith(b'loop_'):
+                    in_loop = True
+                    fields = []
+                    seq_fields = []
+                    continue
+                if in_loop and line.startswith(b'_'):
+                    if line.startswith(b'_atom_site.'):
+                        fields.append(line[len(b'_atom_site.'):].split()[0].decode())
+                    elif line.startswith(b'_entity_poly_seq.'):
+                        seq_fields.append(line[len(b'_entity_poly_seq.'):].split()[0].decode())
+                    continue
+                in_loop = False
+                if line[:1] == b'#':
+                    seq_fields = []
+                if "mon_id" in seq_fields:
+                    tokens = line.split()
+                    if len(tokens) == len(seq_fields):
+                        seq_res.append(tokens[seq_fields.index("mon_id")].decode())
+                    continue
+                if len(fields) == 0:
+                    continue
+                group = fields.index("group_PDB") if "group_PDB" in fields else None
+                model = fields.index("pdbx_PDB_model_num") if "pdbx_PDB_model_num" in fields else None
+                indices = []
+                for names in wanted:
+                    found = [fields.index(name) for name in names if name in fields]
+                    indices.append(found[0] if len(found) > 0 else None)
+
+            if line[:1] in (b'_', b'#') or line.startswith(b'loop_') or line.startswith(b'data_'):
+                break #end of the _atom_site loop
+
+            if (b'"' in line) or (b"'" in line):
+                pending.extend([token.encode() for token in shlex.split(line.decode())])
+            else:
+                pending.extend(line.split())
+
+            while len(pending) >= len(fields):
+                tokens = pending[:len(fields)]
+                pending = pending[len(fields):]
+                if model is not None:
+                    if first_model is None:
+                        first_model = tokens[model]
+                    elif tokens[model] != first_model:
+                        last_model = True #the models are consecutive, the first one is complete
+                        break
+                if (group is None) or (tokens[group] == b'ATOM'):
+                    rows.append([tokens[i] if i is not None else b'' for i in indices])
+                    if len(rows) >= chunk_size:
+                        chunks.append(cifRowsToColumns(rows))
+                        rows = []
+            if last_model:
+                break
+
+    chunks.append(cifRowsToColumns(rows))
+
+    columns, res_list = concatenateColumns(chunks)
+    if return_seqres:
+        return columns, res_list, np.array([residue for residue in seq_res if residue in amino_acids])
+    return columns, res_list
+
+def readStructureColumns(structureFilePath, chunk_size = 100000, return_seqres = False):
+    """
+    Columnar reading of a structure file in any supported format: .pdb, .pdb.gz, .cif, .cif.gz.
+    Parameters:
+        structureFilePath: string, is the complete structure file path to read.
+        chunk_size: int, default 100000, number of atoms converted at a time.
+        return_seqres: boolean, default False. If True, the sequence of the amino acids is returned too.
+    Returns:
+        columns: dict of np.array, see readPDBColumns.
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+        seq_res: np.array, only if return_seqres is True, the sequence of the amino acids (see readPDBColumns and readCIFColumns).
+    """
+    if structureFilePath.endswith(".cif") or structureFilePath.endswith(".cif.gz"):
+        return readCIFColumns(structureFilePath, chunk_size, return_seqres)
+    return readPDBColumns(structureFilePath, chunk_size, return_seqres)
+
+def columnsToAtoms(columns):
+    """
+    Convert the columns returned by readStructureColumns into the atoms array returned by readPDBFile.
+    Parameters:
+        columns: dict of np.array, see readPDBColumns.
+    Returns:
+        atoms: np.array, contains the informations of the 'ATOM' records, in the same format of readPDBFile.
+    """
+    m = columns["serial"].shape[0]
+    atoms = np.empty((m, 11), dtype=object)
+    atoms[:, 0] = "ATOM  "
+    atoms[:, 1] = columns["serial"].astype(str)
+    atoms[:, 2] = columns["name"].astype(str)
+    atoms[:, 3] = columns["resname"].astype(str)
+    atoms[:, 4] = columns["chain"].astype(str)
+    atoms[:, 5] = columns["resnum"].astype(str)
+    atoms[:, 6:9] = columns["coords"].astype(str)
+    atoms[:, 9] = columns["occupancy"].astype(str)
+    atoms[:, 10] = columns["bfactor"].astype(str)
+
+    return atoms.astype(str)
+
+def getResidueCoordinatesColumns(columns, adj_mat_type):
+    """
+    Vectorized computation of the alpha-C, beta-C or centroid coordinates of the amino acids, from the columns returned by readPDBColumns.
+    The residue boundaries are found once, the alpha-C and beta-C atoms are selected with boolean masks and the centroids are computed
+    with a grouped reduction. A new residue starts when the residue number or the chain changes, the residues are the same of getResidueCoordinates.
+    Parameters:
+        columns: dict of np.array, the atoms of the protein as returned by readPDBColumns.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB" or "centroid").
+    Returns:
+        cords: np.array of shape (n, 3), the coordinates of the residues.
+        labels: np.array of strings of shape (n,), the names of the residues (e.g. "LYS127 A"), parallel to cords.
+    """
+    residues_list = [b'ALA', b'CYS', b'ASP', b'GLU', b'PHE', b'GLY', b'HIS', b'ILE', b'LYS',
+                   b'LEU', b'MET', b'ASN', b'PRO', b'GLN', b'ARG', b'SER', b'THR', b'VAL',
+                   b'TRP', b'TYR']
+
+    is_amino_acid = np.isin(columns["resname"], residues_list)
+    resname = columns["resname"][is_amino_acid]
+    chain = columns["chain"][is_amino_acid]
+    resnum = columns["resnum"][is_amino_acid]
+    name = columns["name"][is_amino_acid]
+    coords = columns["coords"][is_amino_acid]
+
+    if adj_mat_type == "centroid":
+        #a residue is a run of atoms with the same residue number and chain
+        new_residue = np.ones(resnum.shape[0], dtype=bool)
+        new_residue[1:] = (resnum[1:] != resnum[:-1]) | (chain[1:] != chain[:-1])
+        starts = np.nonzero(new_residue)[0]
+        group = np.cumsum(new_residue) - 1
+        counts = np.bincount(group)
+        cords = np.add.reduceat(coords, starts, axis=0) / counts[:, None] if starts.size > 0 else np.zeros((0, 3))
+
+        #only keep the residues with an alpha-C (the last residue is always kept)
+        keep = np.zeros(starts.shape[0], dtype=bool)
+        keep[group[name == b'CA']] = True
+        if keep.size > 0:
+            keep[-1] = True
+        starts = starts[keep]
+        cords = cords[keep]
+
+    elif adj_mat_type in ("CA", "CB"):
+        #first atom of the given type of each residue (the first candidate always starts a residue, whatever its number)
+        candidates = np.nonzero(name == adj_mat_type.encode())[0]
+        new_residue = np.ones(candidates.shape[0], dtype=bool)
+        new_residue[1:] = (resnum[candidates][1:] != resnum[candidates][:-1]) | (chain[candidates][1:] != chain[candidates][:-1])
+        starts = candidates[new_residue]
+        cords = coords[starts]
+
+    else:
+        raise Exception("adj_mat_type {} not supported by the vectorized reduction, use getResidueCoordinates.".format(adj_mat_type))
+
+    labels = np.char.add(np.char.add(np.char.add(resname[starts].astype(str), resnum[starts].astype(str)), " "), chain[starts].astype(str))
+
+    return np.asarray(cords, dtype=float), labels
+
+def parseSelection(spec, casefold_code = False):
+    """
+    Parse a protein selection spec "code:chains:ranges:shell:plddt", e.g. "6vxx:A+B:1-150:8": the chains A and B of 6vxx,
+    only the residues from 1 to 150, plus all the residues with an atom within 8 Angstrom of the selected ones.
+    Chains and residue ranges are separated by '+' (e.g. "1-150+300-320"), an empty field (or '*' for the chains)
+    selects everything (e.g. "6vxx::1-150"). The optional plddt field drops the residues whose confidence (the B-factor
+    column of AlphaFold models) is below the cutoff, e.g. "af-p69905-f1::::70".
+    The selection names returned by selectionName ("6vxx~A+B~1-150~8") are parsed too.
+    The chains are case sensitive, the code keeps its case (e.g. the file name "AF-P69905-F1" of an AlphaFold model).
+    Parameters:
+        spec: string, the protein selection spec or a plain pdb code.
+        casefold_code: boolean, default False. If True the code is casefolded, for the pdb codes typed by the user.
+    Returns:
+        p_code: string, the protein pdb code.
+        selection: dict with keys "chains" (list of strings or None), "ranges" (list of (start, end) tuples or None),
+                   "shell" (float or None) and "plddt" (float or None), None if spec is a plain pdb code.
+    """
+    fields = spec.strip().replace("~", ":").split(":")
+    p_code = fields[0].casefold() if casefold_code else fields[0]
+    if len(fields) == 1:
+        return p_code, None
+    if len(fields) > 5:
+        raise Exception("selection '{}' not valid, expected 'code:chains:ranges:shell:plddt'.".format(spec))
+    fields = fields + [""]*(5-len(fields))
+
+    chains = [chain for chain in fields[1].split("+") if chain not in ("", "*")] or None
+
+    ranges = []
+    for residue_range in fields[2].split("+"):
+        if residue_range == "":
+            continue
+        match = re.fullmatch(r"(-?\d+)(?:-(-?\d+))?", residue_range)
+        if match is None:
+            raise Exception("residue range '{}' not valid, expected 'start-end' (e.g. 1-150).".format(residue_range))
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) is not None else start
+        ranges.append((min(start, end), max(start, end)))
+    ranges = ranges or None
+
+    shell = float(fields[3]) if fields[3] != "" else None
+    plddt = float(fields[4]) if fields[4] != "" else None
+
+    if (chains is None) and (ranges is None) and (shell is None) and (plddt is None):
+        return p_code, None
+    return p_code, {"chains": chains, "ranges": ranges, "shell": shell, "plddt": plddt}
+
+def parseThresholds(spec):
+    """
+    Parse a list of PCN thresholds "min-max, min-max, ...", e.g. "4-8, 4-10, 5-12".
+    The integer thresholds are kept as int, so the files names are the ones of the GUI spin boxes (e.g. "_4_8").
+    Parameters:
+        spec: string, the thresholds spec, or a list of (min_, max_) tuples (returned as they are).
+    Returns:
+        thresholds: list of (min_, max_) tuples without duplicates, in the given order.
+    """
+    if not isinstance(spec, str):
+        return list(dict.fromkeys((min_, max_) for min_, max_ in spec))
+
+    thresholds = []
+    for pair in spec.replace(";", ",").split(","):
+        pair = pair.strip()
+        if pair == "":
+            continue
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)", pair)
+        if match is None:
+            raise Exception("thresholds '{}' not valid, expected 'min-max' (e.g. 4-8).".format(pair))
+        min_, max_ = (float(value) if "." in value else int(value) for value in match.groups())
+        if min_ >= max_:
+            raise Exception("thresholds '{}' not valid, min must be lower than max.".format(pair))
+        thresholds.append((min_, max_))
+    return list(dict.fromkeys(thresholds))
+
+def selectionName(p_code, selection):
+    """
+    Name of a protein selection, used in the output files names in place of the pdb code, e.g. "6vxx~A+B~1-150~8".
+    Parameters:
+        p_code: string, the protein pdb code.
+        selection: dict, the selection returned by parseSelection, or None.
+    Returns:
+        p_name: string, the name of the selection, p_code if selection is None.
+    """
+    if selection is None:
+        return p_code
+    chains = "+".join(selection["chains"]) if selection["chains"] is not None else ""
+    ranges = "+".join("{}-{}".format(start, end) for start, end in selection["ranges"]) if selection["ranges"] is not None else ""
+    shell = "{:g}".format(selection["shell"]) if selection["shell"] is not None else ""
+    plddt = "{:g}".format(selection["plddt"]) if selection["plddt"] is not None else ""
+    return "~".join([p_code, chains, ranges, shell, plddt]).rstrip("~")
+
+def confidenceSelectionName(p_name, plddt_cutoff):
+    """
+    Add a pLDDT cutoff to a protein (pdb code or selection name), e.g. "af-p69905-f1" with cutoff 70 is "af-p69905-f1~~~~70".
+    Parameters:
+        p_name: string, the protein pdb code or selection name (see selectionName).
+        plddt_cutoff: float, the residues with a lower confidence are dropped (see selectColumns).
+    Returns:
+        p_name: string, the name of the selection with the pLDDT cutoff.
+    """
+    p_code, selection = parseSelection(p_name)
+    if selection is None:
+        selection = {"chains": None, "ranges": None, "shell": None, "plddt": None}
+    selection["plddt"] = plddt_cutoff
+    return selectionName(p_code, selection)
+
+def residueIds(columns):
+    """
+    Number the residues of the columns of a structure: a residue is a run of atoms with the same chain, residue number and insertion code.
+    Parameters:
+        columns: dict of np.array, the columns of the structure (see readPDBColumns).
+    Returns:
+        residue_id: np.array of int, the residue of each atom (from 0).
+    """
+    resnum = columns["resnum"]
+    new_residue = np.ones(resnum.shape[0], dtype=bool)
+    new_residue[1:] = (resnum[1:] != resnum[:-1]) | (columns["chain"][1:] != columns["chain"][:-1]) | (columns["icode"][1:] != columns["icode"][:-1])
+    return np.cumsum(new_residue) - 1
+
+def residueMeanBFactors(columns, residue_id):
+    """
+    Mean B-factor of the atoms of each residue. For AlphaFold models the B-factor column holds the pLDDT confidence of the residue.
+    Parameters:
+        columns: dict of np.array, the columns of the structure (see readPDBColumns).
+        residue_id: np.array of int, the residue of each atom, as returned by residueIds.
+    Returns:
+        b_factors: np.array of float, the mean B-factor of each residue (nan if missing in the file).
+    """
+    if residue_id.shape[0] == 0:
+        return np.zeros(0)
+    return np.bincount(residue_id, weights = columns["bfactor"]) / np.bincount(residue_id)
+
+def selectColumns(columns, selection):
+    """
+    Keep only the atoms of the selected chains and residue ranges, plus the residues within the neighborhood shell.
+    With a pLDDT cutoff the residues with a lower confidence are dropped, also from the shell.
+    Parameters:
+        columns: dict of np.array, the columns of the structure (see readPDBColumns).
+        selection: dict, the selection returned by parseSelection, or None.
+    Returns:
+        columns: dict of np.array, the columns of the selected atoms.
+    """
+    if selection is None:
+        return columns
+
+    resnum = columns["resnum"]
+    mask = np.ones(resnum.shape[0], dtype=bool)
+    if selection["chains"] is not None:
+        mask &= np.isin(np.char.strip(columns["chain"]).astype(str), selection["chains"])
+    if selection["ranges"] is not None:
+        in_ranges = np.zeros(resnum.shape[0], dtype=bool)
+        for start, end in selection["ranges"]:
+            in_ranges |= (resnum >= start) & (resnum <= end)
+        mask &= in_ranges
+
+    residue_id = residueIds(columns)
+    if selection["plddt"] is not None:
+        #the residues without B-factors are kept
+        confident = ~(residueMeanBFactors(columns, residue_id) < selection["plddt"])[residue_id]
+        mask &= confident
+
+    if (selection["shell"] is not None) and np.any(mask):
+        #whole residues with at least one atom within the shell of the selected atoms
+        distances, _ = cKDTree(columns["coords"][mask]).query(columns["coords"], k=1, distance_upper_bound=selection["shell"])
+        mask = np.isin(residue_id, residue_id[np.isfinite(distances)])
+        if selection["plddt"] is not None:
+            mask &= confident
+
+    return {key: values[mask] for key, values in columns.items()}
+
+def columnsResidueList(columns):
+    """
+    Compute the res_list of the columns of a structure, as returned by readPDBFile.
+    Parameters:
+        columns: dict of np.array, the columns of the structure (see readPDBColumns).
+    Returns:
+        res_list: list of tuples, the (residue name, residue number) of the protein.
+    """
+    resnum = columns["resnum"]
+    new_residue = np.ones(resnum.shape[0], dtype=bool)
+    new_residue[1:] = resnum[1:] != resnum[:-1]
+    return [(columns["resname"][i].decode(), str(resnum[i]).rjust(4)) for i in np.nonzero(new_residue)[0]]
+
+def residueConfidence(columns, residue_labels):
+    """
+    Confidence of the residues of the PCN: the mean B-factor of their atoms, that is the pLDDT for AlphaFold models.
+    Parameters:
+        columns: dict of np.array, the columns of the structure (see readPDBColumns).
+        residue_labels: np.array of strings of shape (n,), the names of the residues of the PCN (e.g. "LYS127 A").
+    Returns:
+        confidence: np.array of shape (n,), the confidence of each residue, parallel to residue_labels.
+    """
+    residue_id = residueIds(columns)
+    b_factors = residueMeanBFactors(columns, residue_id)
+    starts = np.nonzero(np.diff(residue_id, prepend = -1))[0]
+    keys = dict(zip(zip(columns["resnum"][starts].tolist(), np.char.strip(columns["chain"][starts]).astype(str).tolist()), b_factors.tolist()))
+
+    residue_table = residueTable(residue_labels)
+    return np.array([keys.get(key, np.nan) for key in zip(residue_table.resnum.tolist(), np.char.strip(residue_table.chain).tolist())], dtype=float)
+
+def readResidueCoordinates(pdbFilePath, adj_mat_type, cache_path = None, selection = None):
+    """
+    Read the pdb file and compute the residue coordinates used to build the PCN.
+    The columnar parser and the vectorized reduction are used for "CA", "CB" and "centroid", getResidueCoordinates for "heavy".
+    Parameters:
+        pdbFilePath: string, is the complete structure file path to read (.pdb, .pdb.gz, .cif or .cif.gz).
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        cache_path: string, default None, path of the Cache folder. If not None the parsed structure cache is used (see cachedResidueCoordinates).
+        selection: dict, default None, the chains, residue ranges and pLDDT cutoff to keep (see parseSelection).
+    Returns:
+        residues: np.array, the coordinates of the residues: an (n, 3) float array, or the array returned by getResidueCoordinates for "heavy".
+        residue_labels: np.array of strings of shape (n,), the names of the residues.
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+    """
+    if cache_path is not None:
+        return cachedResidueCoordinates(pdbFilePath, adj_mat_type, cache_path, selection = selection)
+
+    if selection is not None:
+        columns, _ = readStructureColumns(pdbFilePath)
+        columns = selectColumns(columns, selection)
+        residues, residue_labels = reduceResidueCoordinates(columns, adj_mat_type)
+        return residues, residue_labels, columnsResidueList(columns)
+
+    if adj_mat_type == "heavy":
+        if pdbFilePath.endswith(".pdb"):
+            atoms, res_list = readPDBFile(pdbFilePath)
+        else:
+            columns, res_list = readStructureColumns(pdbFilePath)
+            atoms = columnsToAtoms(columns)
+        residues = getResidueCoordinates(atoms, adj_mat_type)
+        residue_labels = np.array(residues[:, 0], dtype=str)
+    else:
+        columns, res_list = readStructureColumns(pdbFilePath)
+        residues, residue_labels = getResidueCoordinatesColumns(columns, adj_mat_type)
+
+    return residues, residue_labels, res_list
+
+def reduceResidueCoordinates(columns, adj_mat_type):
+    """
+    Compute the residue coordinates used to build the PCN from the columns of a structure file.
+    Parameters:
+        columns: dict of np.array, see readPDBColumns.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+    Returns:
+        residues: np.array, the coordinates of the residues: an (n, 3) float array, or the array returned by getResidueCoordinates for "heavy".
+        residue_labels: np.array of strings of shape (n,), the names of the residues.
+    """
+    if adj_mat_type == "heavy":
+        residues = getResidueCoordinates(columnsToAtoms(columns), adj_mat_type)
+        residue_labels = np.array(residues[:, 0], dtype=str)
+        return residues, residue_labels
+
+    return getResidueCoordinatesColumns(columns, adj_mat_type)
+
+class ProteinStructure():
+    """
+    Structure of a protein read with a single pass over its file (.pdb, .pdb.gz, .cif or .cif.gz): the atoms columns,
+    the residues list, the chain-presence flag and the sequence are read together and reused by the whole pipeline,
+    so the file is not opened again for each result.
+    Attributes:
+        path: string, the complete structure file path.
+        columns: dict of np.array, the 'ATOM' records (see readPDBColumns), only the selected ones if a selection is given.
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+        has_chain: boolean, True if at least one atom has a chain identifier.
+        seq_res: np.array, the sequence of the amino acids (see readStructureColumns).
+    """
+
+    def __init__(self, structureFilePath, cache_path = None, selection = None):
+        """
+        Parameters:
+            structureFilePath: string, is the complete structure file path to read.
+            cache_path: string, default None, path of the Cache folder. If not None the parsed structure cache is used (see cachedStructureColumns).
+            selection: dict, default None, the chains and residue ranges to keep (see parseSelection). The other atoms
+                       are dropped right after parsing, so the following stages work only on the selected residues.
+        """
+        self.path = structureFilePath
+        self.cache_path = cache_path
+        self.selection = selection
+        self.file_hash = None
+        if cache_path is not None:
+            self.file_hash = structureFileHash(structureFilePath)
+            self.columns, self.res_list, self.seq_res = cachedStructureColumns(structureFilePath, cache_path, self.file_hash, return_seqres = True)
+        else:
+            self.columns, self.res_list, self.seq_res = readStructureColumns(structureFilePath, return_seqres = True)
+        if selection is not None:
+            self.columns = selectColumns(self.columns, selection)
+            self.res_list = columnsResidueList(self.columns)
+        self.has_chain = bool(np.any(np.char.strip(self.columns["chain"]) != b''))
+        self.residue_coordinates = dict()
+
+    def atoms(self):
+        """
+        Returns:
+            atoms: np.array, the 'ATOM' records in the same format of readPDBFile.
+        """
+        return columnsToAtoms(self.columns)
+
+    def residueCoordinates(self, adj_mat_type):
+        """
+        Compute the residue coordinates used to build the PCN, once for each adj_mat_type.
+        Parameters:
+            adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        Returns:
+            residues, residue_labels: see readResidueCoordinates.
+        """
+        if adj_mat_type not in self.residue_coordinates:
+            if self.cache_path is not None:
+                residues, residue_labels, _ = cachedResidueCoordinates(self.path, adj_mat_type, self.cache_path, file_hash = self.file_hash, columns = self.columns, res_list = self.res_list, selection = self.selection)
+            else:
+                residues, residue_labels = reduceResidueCoordinates(self.columns, adj_mat_type)
+            self.residue_coordinates[adj_mat_type] = (residues, residue_labels)
+
+        return self.residue_coordinates[adj_mat_type]
+
+    def residueConfidence(self, adj_mat_type):
+        """
+        Parameters:
+            adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        Returns:
+            confidence: np.array, the pLDDT (B-factor) of each residue of the PCN, see residueConfidence.
+        """
+        _, residue_labels = self.residueCoordinates(adj_mat_type)
+        return residueConfidence(self.columns, residue_labels)
+
+def structureFileHash(structureFilePath, block_size = 1<<20):
+    """
+    Compute the SHA-1 hash of the content of a structure file, reading it in blocks.
+    Parameters:
+        structureFilePath: string, is the complete structure file path.
+        block_size: int, default 1 MB, number of bytes read at a time.
+    Returns:
+        file_hash: string, the hexadecimal SHA-1 digest of the file.
+    """
+    sha1 = hashlib.sha1()
+    with open(structureFilePath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def saveCacheEntry(cache_path, entry_name, arrays, max_size = structure_cache_size):
+    """
+    Save an entry of the parsed structure cache as an uncompressed numpy file, that is loaded in a few milliseconds.
+    The file is written under a temporary name and then renamed, so a concurrent reader never sees a partial entry.
+    After saving, the least recently used entries are evicted (see evictCache).
+    Parameters:
+        cache_path: string, is the path of the Cache folder.
+        entry_name: string, name of the entry, without extension.
+        arrays: dict of np.array, the arrays of the entry (no object arrays).
+        max_size: int, default structure_cache_size, maximum size in bytes of the Cache folder.
+    Returns: None
+    """
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_path, exist_ok = True)
+
+    entry_path = "{}v{}-{}.npz".format(cache_path, structure_cache_version, entry_name)
+    tmp_path = "{}.{}.tmp".format(entry_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, entry_path)
+
+    evictCache(cache_path, max_size)
+
+def loadCacheEntry(cache_path, entry_name):
+    """
+    Load an entry of the parsed structure cache and mark it as recently used.
+    A corrupt entry is removed, so that it is rebuilt by the caller.
+    Parameters:
+        cache_path: string, is the path of the Cache folder.
+        entry_name: string, name of the entry, without extension.
+    Returns:
+        arrays: dict of np.array, the arrays of the entry, None if the entry is missing or corrupt.
+    """
+    entry_path = "{}v{}-{}.npz".format(cache_path, structure_cache_version, entry_name)
+    if not os.path.isfile(entry_path):
+        return None
+
+    try:
+        with np.load(entry_path, allow_pickle = False) as entry:
+            arrays = {key: entry[key] for key in entry.files}
+    except Exception:
+        print("corrupt cache entry {}, rebuilding it".format(entry_name))
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+        return None
+
+    os.utime(entry_path) #the modification time orders the entries for the LRU eviction
+    return arrays
+
+def evictCache(cache_path, max_size = structure_cache_size):
+    """
+    Remove the least recently used entries of the parsed structure cache until its size is lower than max_size.
+    Parameters:
+        cache_path: string, is the path of the Cache folder.
+        max_size: int, default structure_cache_size, maximum size in bytes of the Cache folder.
+    Returns: None
+    """
+    entries = []
+    for file in os.listdir(cache_path):
+        if file.endswith(".npz"):
+            try:
+                stat = os.stat("{}{}".format(cache_path, file))
+                entries.append((stat.st_mtime, stat.st_size, file))
+            except OSError: #removed by another process
+                pass
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, file in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove("{}{}".format(cache_path, file))
+        except OSError:
+            pass
+        total_size -= size
+
+def cachedStructureColumns(structureFilePath, cache_path, file_hash = None, max_size = structure_cache_size, return_seqres = False):
+    """
+    Columnar reading of a structure file (see readStructureColumns) through the parsed structure cache.
+    The entry is keyed by the hash of the file content, so a modified file is parsed again.
+    Parameters:
+        structureFilePath: string, is the complete structure file path to read.
+        cache_path: string, is the path of the Cache folder.
+        file_hash: string, default None, the hash of the file. If None it is computed (see structureFileHash).
+        max_size: int, default structure_cache_size, maximum size in bytes of the Cache folder.
+        return_seqres: boolean, default False. If True, the sequence of the amino acids is returned too.
+    Returns:
+        columns: dict of np.array, see readPDBColumns.
+        res_list: list of tuples, the (residue name, residue number) of the protein, as returned by readPDBFile.
+        seq_res: np.array, only if return_seqres is True, the sequence of the amino acids (see readStructureColumns).
+    """
+    if file_hash is None:
+        file_hash = structureFileHash(structureFilePath)
+
+    entry = loadCacheEntry(cache_path, file_hash)
+    if (entry is not None) and ("seq_res" in entry):
+        res_list = [tuple(residue) for residue in entry.pop("res_list").tolist()]
+        seq_res = entry.pop("seq_res")
+        if return_seqres:
+            return entry, res_list, seq_res
+        return entry, res_list
+
+    columns, res_list, seq_res = readStructureColumns(structureFilePath, return_seqres = True)
+    arrays = dict(columns)
+    arrays["res_list"] = np.array(res_list, dtype=str).reshape(-1, 2)
+    arrays["seq_res"] = np.array(seq_res, dtype=str)
+    saveCacheEntry(cache_path, file_hash, arrays, max_size)
+
+    if return_seqres:
+        return columns, res_list, seq_res
+    return columns, res_list
+
+def cachedResidueCoordinates(pdbFilePath, adj_mat_type, cache_path, max_size = structure_cache_size, file_hash = None, columns = None, res_list = None, selection = None):
+    """
+    Compute the residue coordinates of a structure file (see readResidueCoordinates) through the parsed structure cache.
+    The reduced residue coordinates of each adj_mat_type are an entry {hash}-{adj_mat_type}.npz, the parsed columns are
+    an entry {hash}.npz, so another adj_mat_type of the same file is reduced without parsing the file again.
+    Parameters:
+        pdbFilePath: string, is the complete structure file path to read.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        cache_path: string, is the path of the Cache folder.
+        max_size: int, default structure_cache_size, maximum size in bytes of the Cache folder.
+        file_hash: string, default None, the hash of the file. If None it is computed (see structureFileHash).
+        columns: dict of np.array, default None, the columns of the file already read (see readStructureColumns).
+        res_list: list of tuples, default None, the res_list of the file already read, required if columns is not None.
+        selection: dict, default None, the chains and residue ranges to keep (see parseSelection). If columns is not None, they must be already selected.
+    Returns:
+        residues, residue_labels, res_list: see readResidueCoordinates.
+    """
+    if file_hash is None:
+        file_hash = structureFileHash(pdbFilePath)
+    entry_name = "{}-{}".format(file_hash, adj_mat_type)
+    if selection is not None:
+        entry_name = "{}-{}".format(entry_name, hashlib.sha1(selectionName("", selection).encode()).hexdigest()[:16])
+
+    entry = loadCacheEntry(cache_path, entry_name)
+    if entry is not None:
+        residue_labels = entry["residue_labels"]
+        res_list = [tuple(residue) for residue in entry["res_list"].tolist()]
+        if adj_mat_type == "heavy":
+            residues = np.empty((len(residue_labels), 2), dtype=object)
+            splits = np.split(entry["atom_cords"], np.cumsum(entry["counts"])[:-1])
+            for i, name in enumerate(residue_labels):
+                residues[i, 0] = name
+                residues[i, 1] = splits[i]
+        else:
+            residues = entry["residues"]
+        return residues, residue_labels, res_list
+
+    if columns is None:
+        columns, res_list = cachedStructureColumns(pdbFilePath, cache_path, file_hash, max_size)
+        if selection is not None:
+            columns = selectColumns(columns, selection)
+            res_list = columnsResidueList(columns)
+    residues, residue_labels = reduceResidueCoordinates(columns, adj_mat_type)
+    if adj_mat_type == "heavy":
+        counts = np.array([len(cords) for cords in residues[:, 1]], dtype=int)
+        atom_cords = np.concatenate(list(residues[:, 1])).reshape(-1, 3) if len(counts) > 0 else np.zeros((0, 3))
+        arrays = {"atom_cords": atom_cords, "counts": counts}
+    else:
+        arrays = {"residues": residues}
+    arrays["residue_labels"] = np.array(residue_labels, dtype=str)
+    arrays["res_list"] = np.array(res_list, dtype=str).reshape(-1, 2)
+    saveCacheEntry(cache_path, entry_name, arrays, max_size)
+
+    return residues, residue_labels, res_list
+
+def readPDBModels(pdbFilePath):
+    """
+    Read the pdb file keeping the MODEL records separated (NMR ensembles, multi-model trajectories).
+    A pdb file without MODEL records is read as a single model.
+    Parameters:
+        pdbFilePath: string, is the complete PDB file path to read (.pdb or .pdb.gz).
+    Returns:
+        models: list of np.array, for each model the informations contained in its 'ATOM' key (same format of readPDBFile).
+        res_list: list of tuples, the (residue name, residue number) of the first model.
+    """
+    models = []
+    res_list = []
+    atoms = []
+    num = 0
+    with openStructureFile(pdbFilePath, "rt") as pdbfile:
+        for line in pdbfile:
+            if line[:5] == 'MODEL':
+                atoms = []
+            elif line[:6] == 'ENDMDL':
+                if len(atoms) > 0:
+                    models.append(np.array(atoms))
+                atoms = []
+            elif line[:4] == 'ATOM':
+                if len(models) == 0:
+                    if line[22:26] != num:
+                        res_list.append((str(line[17:20]), line[22:26]))
+                    num = line[22:26]
+                splitted_line = [line[:6], line[6:11], line[12:16], line[17:20], line[21], line[22:26], line[30:38], line[38:46], line[46:54], line[56:61], line[62:66]]
+                atoms.append(splitted_line)
+
+    if len(atoms) > 0:
+        models.append(np.array(atoms))
+
+    return models, res_list
+
+def iterPDBFrames(pdbFilePath, adj_mat_type, stride = 1):
+    """
+    Stream the frames of a multi-model pdb file (MODEL/ENDMDL records, e.g. a trajectory or an NMR ensemble), one frame at a time.
+    Only the 'ATOM' lines of the current frame are kept in memory, so the memory does not grow with the number of frames.
+    A pdb file without MODEL records is read as a single frame.
+    Parameters:
+        pdbFilePath: string, is the complete PDB file path to read (.pdb or .pdb.gz).
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        stride: int, default 1, only every stride-th frame is parsed and reduced, the other frames are skipped.
+    Returns:
+        generator, for each frame yields:
+            frame: int, the index of the frame in the file (from 0).
+            residues, residue_labels, res_list: the reduced residue coordinates of the frame, see readResidueCoordinates.
+    """
+    def reduceFrame(lines):
+        columns, res_list = concatenateColumns([pdbLinesToColumns(lines)])
+        residues, residue_labels = reduceResidueCoordinates(columns, adj_mat_type)
+        return residues, residue_labels, res_list
+
+    frame = 0
+    lines = []
+    has_atoms = False
+    with openStructureFile(pdbFilePath) as pdbfile:
+        for line in pdbfile:
+            if line[:5] == b'MODEL':
+                lines = []
+                has_atoms = False
+            elif line[:6] == b'ENDMDL':
+                if has_atoms:
+                    if frame % stride == 0:
+                        residues, residue_labels, res_list = reduceFrame(lines)
+                        yield frame, residues, residue_labels, res_list
+                    frame += 1
+                lines = []
+                has_atoms = False
+            elif line[:4] == b'ATOM':
+                has_atoms = True
+                if frame % stride == 0:
+                    lines.append(line.rstrip(b'\r\n'))
+
+    if has_atoms and (frame % stride == 0):
+        residues, residue_labels, res_list = reduceFrame(lines)
+        yield frame, residues, residue_labels, res_list
+
 def getResidueCoordinates(atoms, adj_mat_type):
     """
     Compute the distances between the alpa-C, beta-C or centroids of the amino acids.
+    With adj_mat_type "heavy" each amino acid is associated with the coordinates of all its heavy atoms (see groupResidueAtoms).
     Parameters:
         atoms: np.array, contains all the informations contained in the 'ATOM' key of the pdb files.
     Returns:
         coordinates: np.array, contains the euclidean distance between the alpha carbon of the amino acids of the proteins.
     """
+    if adj_mat_type == "heavy":
+        residue_names, atom_cords, atom_residue = groupResidueAtoms(atoms, heavy_only = True)
+        coordinates = np.empty((len(residue_names), 2), dtype=object)
+        splits = np.split(atom_cords, np.nonzero(np.diff(atom_residue))[0] + 1)
+        for i, name in enumerate(residue_names):
+            coordinates[i, 0] = name
+            coordinates[i, 1] = splits[i]
+        return coordinates
+
     coordinates = []
     residues_list = ['ALA', 'CYS', 'ASP', 'GLU', 'PHE', 'GLY', 'HIS', 'ILE', 'LYS',
                    'LEU', 'MET', 'ASN', 'PRO', 'GLN', 'ARG', 'SER', 'THR', 'VAL',
@@ -217,7 +1347,9 @@ def getResidueCoordinates(atoms, adj_mat_type):
 
     dropped = []
 
-    last_residue_num = 0
+    #no residue read yet (0 and the negative numbers are valid residue numbers)
+    last_residue_num = None
+    last_residue_chain = None
 
     if adj_mat_type == "centroid":
         centroid = True
@@ -247,10 +1379,11 @@ def getResidueCoordinates(atoms, adj_mat_type):
                 tmp_list_name.append((residue_name, residue_chain))
                 tmp_list_atm.append(atm_type.strip())
                 last_residue_num = residue_num
+                last_residue_chain = residue_chain
 
             if i > 0 and centroid: # Iterate over the other amino-acids
 
-                if (residue_num == last_residue_num): # if the amino-acid is still the same
+                if (residue_num == last_residue_num) and (residue_chain == last_residue_chain): # if the amino-acid is still the same
 
                     # Get Information
                     float_list = [float(item.strip()) for item in atom[6:9]]
@@ -275,14 +1408,16 @@ def getResidueCoordinates(atoms, adj_mat_type):
                     tmp_list_name.append((residue_name, residue_chain))
                     tmp_list_atm.append(atm_type.strip())
                     last_residue_num = residue_num
+                    last_residue_chain = residue_chain
 
             else:
 
-                if (residue_num != last_residue_num):
+                if (residue_num != last_residue_num) or (residue_chain != last_residue_chain):
                     if (atom[2].replace(" ","")== adj_mat_type):
                         cord_C = atom[6:9]
                         coordinates.append([residue_name + str (residue_num) + " " + residue_chain, cord_C])
                         last_residue_num = residue_num
+                        last_residue_chain = residue_chain
 
                     # ## Add GLY as CA
                     # if atom[3].replace(" ","") == "GLY" and adj_mat_type == "CB":
@@ -305,15 +1440,84 @@ def associateResidueName(coordinates):
     """
     Associate the protein residues names to the networkx node ID.
     Parameters:
-        coordinates, np.array, contains the list of residues names
+        coordinates, np.array, contains the list of residues names (or the labels table returned by getResidueCoordinatesColumns)
     Returns:
         dict_residue_name: dictionary {residue_nxID: residue_name}
     """
     dict_residue_name = dict()
+    if coordinates.ndim == 1:
+        for i in range(coordinates.shape[0]):
+            dict_residue_name[str (i)] = coordinates[i]
+        return dict_residue_name
     for i in range(coordinates.shape[0]):
         dict_residue_name[str (i)] = coordinates[i, 0]
     return dict_residue_name
 
+class ResidueTable():
+    """
+    Interned table of the residues of a PCN: the node i of the PCN is the residue (resname[i], resnum[i], chain[i]).
+    Per-residue results are numpy vectors aligned to the table, the residue names (e.g. "LYS127 A") and the
+    {residue_name: value} dicts are produced only when the results are written (see toDict).
+    Attributes:
+        resname: np.array of strings of shape (n,), the residue names (e.g. "LYS").
+        resnum: np.array of int of shape (n,), the residue numbers.
+        chain: np.array of strings of shape (n,), the chain identifiers.
+    """
+
+    def __init__(self, resname, resnum, chain):
+        self.resname = np.asarray(resname, dtype=str)
+        self.resnum = np.asarray(resnum, dtype=int)
+        self.chain = np.asarray(chain, dtype=str)
+
+    def __len__(self):
+        return self.resnum.shape[0]
+
+    def labels(self):
+        """
+        Returns:
+            labels: np.array of strings of shape (n,), the names of the residues (e.g. "LYS127 A").
+        """
+        return np.char.add(np.char.add(np.char.add(self.resname, self.resnum.astype(str)), " "), self.chain)
+
+    def toDict(self, values):
+        """
+        Convert a per-residue result into the {residue_name: value} dict written in the output files.
+        Parameters:
+            values: np.array of shape (n,), the value of each residue.
+        Returns:
+            dict_residue_value: dict {residue_name: value}, with Python int/float values.
+        """
+        return dict(zip(self.labels().tolist(), np.asarray(values).tolist()))
+
+def residueTable(residue_labels):
+    """
+    Build the interned residue table from the names of the residues.
+    Parameters:
+        residue_labels: np.array of strings of shape (n,), the names of the residues (e.g. "LYS127 A"), as returned by readResidueCoordinates.
+    Returns:
+        residue_table: ResidueTable, the residue table, the node i of the PCN is the residue residue_labels[i].
+    """
+    residue_labels = np.asarray(residue_labels, dtype=str).reshape(-1)
+    resname = np.array([label[:3] for label in residue_labels], dtype='U3')
+    resnum_chain = np.char.partition(np.array([label[3:] for label in residue_labels], dtype=str), " ").reshape(-1, 3)
+
+    return ResidueTable(resname, resnum_chain[:, 0], resnum_chain[:, 2])
+
+def getCoordinatesArray(coordinates):
+    """
+    Convert the residues coordinates returned by getResidueCoordinates into a float array.
+    The (n, 3) float arrays returned by getResidueCoordinatesColumns are returned as they are.
+    Parameters:
+        coordinates: np.array, contains the list of residues names and their coordinates.
+    Returns:
+        cords: np.array of shape (n, 3), the coordinates of the residues as floats.
+    """
+    n = coordinates.shape[0]
+    if coordinates.dtype != object:
+        return np.asarray(coordinates, dtype=float).reshape(n, 3)
+    cords = np.array([np.asarray(cord, dtype=float) for cord in coordinates[:, 1]], dtype=float)
+    return cords.reshape(n, 3)
+
 def getResiduesSequence(pbdFilePath):
     """
     Read the amino acids sequence from the pdb file.
@@ -322,42 +1526,285 @@ def getResiduesSequence(pbdFilePath):
     Returns:
         seq_res: np.array, contains all the informations contained in the 'SEQRES' key of the pdb files (sequence of the amino acids).
     """
-    seq_res = []
-    residues_list = ['ALA', 'CYS', 'ASP', 'GLU', 'PHE', 'GLY', 'HIS', 'ILE', 'LYS', 'LEU', 'MET', 'ASN', 'PRO', 'GLN', 'ARG', 'SER', 'THR', 'VAL', 'TRP', 'TYR']
-
     with open(pbdFilePath) as pdbfile:
-        for line in pdbfile:
-            if line[:6]=='SEQRES':
-                splitted_line = [line[19:22], line[23:26], line[27:30], line[31:34], line[35:38],
-                                line[39:42], line[43:46], line[47:50], line[51:54], line[55:58],
-                                line[59:62], line[63:66], line[67:70]]
-                for residue in splitted_line:
-                    if residue in residues_list:
-                        seq_res.append(residue)
+        seqres_lines = [line for line in pdbfile if line[:6]=='SEQRES']
+
+    return parseSEQRES(seqres_lines)
+
+def parseSEQRES(seqres_lines):
+    """
+    Extract the amino acids sequence from the 'SEQRES' records of a pdb file.
+    Parameters:
+        seqres_lines: list of strings, the 'SEQRES' lines.
+    Returns:
+        seq_res: np.array, the sequence of the amino acids.
+    """
+    seq_res = []
+    for line in seqres_lines:
+        splitted_line = [line[19:22], line[23:26], line[27:30], line[31:34], line[35:38],
+                        line[39:42], line[43:46], line[47:50], line[51:54], line[55:58],
+                        line[59:62], line[63:66], line[67:70]]
+        for residue in splitted_line:
+            if residue in amino_acids:
+                seq_res.append(residue)
 
     return np.array(seq_res)
 
-def read_adj_mat(adj_filepath, p, min_, max_, adj_mat_type):
+def read_adj_mat(adj_filepath, p, min_, max_, adj_mat_type, sparse_pcn = False, n = None):
     """
-    Read the adjacency matrix file.
+    Read the adjacency matrix file: the binary {p}_adj_{adj_mat_type}_{min_}_{max_}.npz (see save_adj_mat) or, if missing, the text .txt matrix
+    or the edge list {p}_edgelist_{adj_mat_type}_{min_}_{max_} (see read_edge_list).
     Parameters:
         adj_filepath: string, is the complete adjacency matrix file path to read.
         p: string with len equals to 4, is the protein pdb code.
         min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
         max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
-    Returns: None
+        sparse_pcn: boolean, default False. If True the matrix is read into a scipy.sparse CSR matrix, without materializing the dense matrix.
+        n: int, default None, number of residues of the protein, used for the edge lists. If None, it is the largest residue index of the edge list plus one.
+    Returns:
+        adj: np.array or scipy.sparse.csr_matrix, the adjacency matrix of the PCN.
     """
-    if (os.path.isfile("{}{}_adj_{}_{}_{}.txt".format(adj_filepath, p, adj_mat_type, min_, max_))):
-        adj = np.loadtxt("{}{}_adj_{}_{}_{}.txt".format(adj_filepath, p, adj_mat_type, min_, max_))
-        return adj
-    else:
-        raise Exception("Adj matrix for protein {} doesn't exists.".format(p))
+    for adj_file in adj_file_paths(adj_filepath, "{}_adj_{}_{}_{}".format(p, adj_mat_type, min_, max_)):
+        if os.path.isfile(adj_file):
+            return load_adj_file(adj_file, sparse_pcn, n)
+    raise Exception("Adj matrix for protein {} doesn't exists.".format(p))
 
+def adj_file_paths(adj_filepath, adj_file_name):
+    """
+    Paths of the files that can store a PCN, in order of preference: the adjacency matrix (binary or text)
+    and the edge list (binary or text) with the same protein, type and thresholds.
+    Parameters:
+        adj_filepath: string, is the adjacency matrix files path.
+        adj_file_name: string, the adjacency matrix file name {p}_adj_{adj_mat_type}_{min_}_{max_}, with or without extension.
+    Returns:
+        adj_files: list of strings, the candidate file paths.
+    """
+    stem = os.path.splitext(adj_file_name)[0]
+    edge_list_stem = stem.replace("_adj_", "_edgelist_", 1)
+    return ["{}{}{}".format(adj_filepath, stem, extension) for extension in adj_file_extensions] + ["{}{}{}".format(adj_filepath, edge_list_stem, extension) for extension in edge_list_extensions]
 
-def printProgressBar (iteration, total):
+def is_edge_list_file(adj_file):
+    """
+    True if the file name is the one of an edge list PCN ({p}_edgelist_{adj_mat_type}_{min_}_{max_}).
+    """
+    return "_edgelist_" in os.path.basename(adj_file)
 
-    length = 100
-    fill = '█'
+def read_edge_list(edge_list_file, n = None):
+    """
+    Read an edge list PCN into a sparse matrix, without materializing the dense matrix.
+    The text format has a contact "i j" or a weighted contact "i j w" on each line (0-based residue indices, as saved by save_edge_list_txt).
+    The binary formats are a .npy array with the same (m, 2) or (m, 3) layout, or a .npz file with the arrays "edges"
+    and, optionally, "weights" and "n" (the format of save_adj_mat).
+    Each contact is kept once, in whatever order and direction it is listed.
+    Parameters:
+        edge_list_file: string, is the complete edge list file path.
+        n: int, default None, number of residues of the protein. If None, it is read from the .npz file or it is the largest residue index plus one.
+    Returns:
+        adj: scipy.sparse.csr_matrix, the adjacency matrix of the PCN.
+    """
+    weights = None
+    if edge_list_file.endswith(".npz"):
+        with np.load(edge_list_file) as data:
+            edges = data["edges"]
+            if "weights" in data.files:
+                weights = data["weights"]
+            if (n is None) and ("n" in data.files):
+                n = int(data["n"])
+    else:
+        if edge_list_file.endswith(".npy"):
+            table = np.load(edge_list_file)
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore") #an empty edge list is a PCN without contacts
+                table = np.loadtxt(edge_list_file, ndmin=2)
+        if table.size == 0:
+            table = np.zeros((0, 2))
+        if table.shape[1] not in (2, 3):
+            raise Exception("Edge list {} must have 2 (i j) or 3 (i j weight) columns, {} given.".format(edge_list_file, table.shape[1]))
+        edges = table[:, :2]
+        if table.shape[1] == 3:
+            weights = table[:, 2]
+
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    if n is None:
+        n = int(edges.max()) + 1 if edges.size > 0 else 0
+    elif (edges.size > 0) and (edges.max() >= n or edges.min() < 0):
+        raise Exception("Edge list {} has residue indices out of the {} residues of the protein.".format(edge_list_file, n))
+
+    #(i, j) and (j, i) are the same contact
+    edges, first = np.unique(edges, axis=0, return_index=True)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[first]
+
+    return edges_to_sparse(edges, n, weights)
+
+def adj_mat_edges(adj):
+    """
+    Edge array of a PCN from its adjacency matrix.
+    Parameters:
+        adj: np.array or scipy.sparse matrix, the adjacency matrix of the PCN.
+    Returns:
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact, with i < j, sorted.
+    """
+    if sparse.issparse(adj):
+        upper = sparse.triu(adj, k=1).tocoo()
+        edges = np.stack((upper.row, upper.col), axis=1)
+        return edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    return np.argwhere(np.triu(np.asarray(adj), k=1) != 0)
+
+def save_adj_mat(output_path, p, edges, n, min_, max_, adj_mat_type = "", export_txt = False, writer = None):
+    """
+    Save the PCN in the binary adjacency format, {p}_adj_{adj_mat_type}_{min_}_{max_}.npz in the Adj folder.
+    The file stores the edge array (int32, i < j) and the number of residues, so its size is proportional to the number of contacts
+    and it is read without parsing text (see load_adj_file).
+    Parameters:
+        output_path: string, is the output file path.
+        p: string with len equals to 4, is the protein pdb code.
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact.
+        n: int, number of residues (nodes) of the PCN.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        export_txt: boolean, default False. If True the dense text matrix {p}_adj_{adj_mat_type}_{min_}_{max_}.txt is exported too (see export_adj_mat_txt).
+        writer: ResultsWriter, default None. If given the file is written in background (see ResultsWriter).
+    Returns:
+        matrix_file_name: string, the name of the saved adjacency matrix file.
+    """
+    matrix_file_name = "{}_adj_{}_{}_{}.npz".format(p, adj_mat_type, min_, max_)
+    if writer is not None:
+        writer.submit(save_adj_mat, output_path, p, edges, n, min_, max_, adj_mat_type, export_txt)
+        return matrix_file_name
+
+    if not os.path.exists("{}Adj".format(output_path)):
+        os.makedirs("{}Adj".format(output_path))
+
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    with open("{}Adj{}{}".format(output_path, add_slash_to_path, matrix_file_name), "wb") as f:
+        np.savez(f, edges = edges.astype(np.int32), n = np.int64(n))
+
+    files = ["{}Adj{}{}".format(output_path, add_slash_to_path, matrix_file_name)]
+    if export_txt:
+        files.append(export_adj_mat_txt(files[0]))
+    catalog_results(output_path, files, "adj", p, adj_mat_type = adj_mat_type, params = {"min": min_, "max": max_})
+
+    return matrix_file_name
+
+def load_adj_file(adj_file, sparse_pcn = False, n = None):
+    """
+    Load an adjacency matrix file, in the binary .npz format of save_adj_mat or in the dense .txt format, or an edge list file (see read_edge_list).
+    Parameters:
+        adj_file: string, is the complete adjacency matrix file path.
+        sparse_pcn: boolean, default False. If True the matrix is returned as scipy.sparse CSR matrix, without materializing the dense matrix.
+        n: int, default None, number of residues of the protein, used only for the edge lists (see read_edge_list).
+    Returns:
+        adj: np.array or scipy.sparse.csr_matrix, the adjacency matrix of the PCN.
+    """
+    if is_edge_list_file(adj_file):
+        adj = read_edge_list(adj_file, n)
+        return adj if sparse_pcn else adj.toarray()
+    if adj_file.endswith(".npz"):
+        with np.load(adj_file) as data:
+            edges = data["edges"].astype(np.int64)
+            n = int(data["n"])
+        if sparse_pcn:
+            return edges_to_sparse(edges, n)
+        adj = np.zeros((n, n))
+        adj[edges[:, 0], edges[:, 1]] = 1
+        adj[edges[:, 1], edges[:, 0]] = 1
+        return adj
+    if sparse_pcn:
+        return read_adj_mat_sparse(adj_file)
+    return np.loadtxt(adj_file)
+
+def export_adj_mat_txt(adj_file, txt_file = None):
+    """
+    Export a binary adjacency matrix file (see save_adj_mat) as dense text matrix, the format of the previous versions.
+    Parameters:
+        adj_file: string, is the complete .npz adjacency matrix file path.
+        txt_file: string, default None, the path of the text file. If None, the .npz extension is replaced by .txt.
+    Returns:
+        txt_file: string, the path of the exported text file.
+    """
+    if txt_file is None:
+        txt_file = os.path.splitext(adj_file)[0] + ".txt"
+    np.savetxt(txt_file, load_adj_file(adj_file), fmt='%.2f')
+    return txt_file
+
+def read_adj_mat_sparse(adj_file):
+    """
+    Read a text adjacency matrix file row by row into a sparse matrix.
+    Only the non-zero entries of each row are kept, so the memory used is proportional to the number of edges.
+    Parameters:
+        adj_file: string, is the complete adjacency matrix file path to read.
+    Returns:
+        adj: scipy.sparse.csr_matrix, the adjacency matrix of the PCN.
+    """
+    indptr = [0]
+    indices = []
+    data = []
+
+    with open(adj_file) as f:
+        for line in f:
+            row = np.array(line.split(), dtype=float)
+            if row.size == 0:
+                continue
+            cols = np.nonzero(row)[0]
+            indices.append(cols)
+            data.append(row[cols])
+            indptr.append(indptr[-1] + cols.size)
+
+    n = len(indptr) - 1
+    if n > 0:
+        indices = np.concatenate(indices)
+        data = np.concatenate(data)
+    else:
+        indices = np.array([], dtype=int)
+        data = np.array([], dtype=float)
+
+    return sparse.csr_matrix((data, indices, np.array(indptr)), shape=(n, n))
+
+def edges_to_sparse(edges, n, weights = None):
+    """
+    Build the symmetric sparse adjacency matrix of a PCN from its edge list.
+    Parameters:
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact.
+        n: int, number of residues (nodes) of the PCN.
+        weights: np.array of shape (m,), default None, the weight of each edge. If None, all the edges have weight 1.
+    Returns:
+        adj: scipy.sparse.csr_matrix, the adjacency matrix of the PCN.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if weights is None:
+        weights = np.ones(edges.shape[0])
+
+    rows = np.concatenate((edges[:, 0], edges[:, 1]))
+    cols = np.concatenate((edges[:, 1], edges[:, 0]))
+    data = np.concatenate((weights, weights)).astype(float)
+
+    adj = sparse.coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+    adj.sum_duplicates()
+
+    return adj
+
+def pcn_graph(A):
+    """
+    Create the networkx graph of the PCN from its adjacency matrix.
+    Parameters:
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the PCN.
+    Returns:
+        G: networkx.graph, the PCN.
+    """
+    if sparse.issparse(A):
+        return from_scipy_sparse_array(A)
+    else:
+        return from_numpy_array(A)
+
+
+def printProgressBar (iteration, total):
+
+    length = 100
+    fill = '█'
     printEnd = '\r'
     percent = ("{0:." + str(2) + "f}").format(100 * (iteration / float(total)))
     filledLength = int(length * iteration // total)
@@ -368,27 +1815,65 @@ def printProgressBar (iteration, total):
         print()
 
 
-def adjacent_matrix(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None):
+def blocked_contact_pairs(cords, min_=4, max_=8, block_size=1000):
+    """
+    Blocked computation of the contacts between residues.
+    The distances are computed (with sklearn pairwise_distances) for a tile of block_size rows against all the residues at a time,
+    and each tile is thresholded immediately, so the peak memory is proportional to block_size x n instead of n x n.
+    Parameters:
+        cords: np.array of shape (n, 3), the coordinates of the residues.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        block_size: int, default 1000, number of rows of each tile.
+    Returns:
+        generator, for each tile yields:
+            pairs: np.array of shape (m, 2), the (i, j) residue indices of the contacts found in the tile, with i < j.
+            n_done: int, number of rows processed so far.
+    """
     from sklearn.metrics import pairwise_distances
+
+    cords = np.asarray(cords, dtype=float)
+    n = cords.shape[0]
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        d = pairwise_distances(X = cords[start:stop], Y = cords, n_jobs = -1)
+        rows, cols = np.nonzero((d > min_) & (d < max_))
+        rows = rows + start
+        upper = rows < cols
+        pairs = np.stack((rows[upper], cols[upper]), axis=1).astype(np.int64)
+        yield pairs, stop
+
+def adjacent_matrix(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None, block_size = 1000, adj_mat_type = "", export_txt = False, writer = None):
     import time
     """
     Parallel computation of the adjacency matrix.
+    The distances are computed by row tiles (see blocked_contact_pairs) and each tile is reduced to its edges before the next one,
+    so the n x n distance matrix is never materialized: the peak memory is proportional to block_size x n plus the returned adjacency matrix.
+    The progress bar is updated once per tile. For the structures whose dense adjacency matrix does not fit in memory use
+    adjacent_matrix_sparse with method "blocked", which runs the same tiled search and returns a CSR matrix.
+    The PCN is saved in the binary adjacency format (see save_adj_mat).
     Parameters:
         output_path: string, is the output file path.
-        coordinates: np.array, contains the euclidean distance between the alpha carbon of the amino acids of the proteins.
+        coordinates: np.array, contains the residues names and the coordinates of their alpha-C, beta-C or centroids.
         p: string with len equals to 4, is the protein pdb code.
         min_: float, is the minimum threshold distance for extract only the non covalent interactions between amino acids.
         max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
         comp_adj_fr: tk.Frame, is the frame of the GUI that contains the progress bar.
         window: tk.Tk, is the window of the GUI.
-    Returns: adj
+        block_size: int, default 1000, number of rows of each distance tile.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB" or "centroid").
+        export_txt: boolean, default False. If True the text edge list is saved too (see save_edge_list_txt).
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+    Returns:
+        adj: np.array of shape (n, n), the adjacency matrix of the PCN.
     """
+    if adj_mat_type == "heavy":
+        raise Exception("adj_mat_type heavy not supported by adjacent_matrix, use adjacent_matrix_vectorized or adjacent_matrix_sparse.")
+
     start = time.time()
-    n = coordinates.shape[0]
-    cords = np.hstack(coordinates[:,1]).reshape(n,3)
-    adj = np.zeros((n,n))
-    #d = np.zeros((n,n), dtype=float)
-    d = pairwise_distances(X = cords, n_jobs = -1)
+    cords = getCoordinatesArray(coordinates)
+    n = cords.shape[0]
 
     if comp_adj_fr is not None:
         pb = ttk.Progressbar(comp_adj_fr, orient="horizontal", mode="determinate", length=100)
@@ -397,64 +1882,1175 @@ def adjacent_matrix(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=Non
         label = tk.Label(comp_adj_fr, text="Current progress {}%".format(pb["value"]))
         label.pack()
         window.update()
+
+    edges = []
+    for pairs, n_done in blocked_contact_pairs(cords, min_, max_, block_size):
+        edges.append(pairs)
+
+        if comp_adj_fr is not None:
+            pb["value"] = round((n_done / n) * 100, 2)
+            label['text'] = "Current progress {}%".format(pb["value"])
+            pb.pack()
+            label.pack()
+            window.update()
+
+    #the tiles are in row order and each tile in row-major order, so the edges are already sorted
+    edges = np.concatenate(edges) if len(edges) > 0 else np.zeros((0, 2), dtype=np.int64)
+
+    end = time.time()
+    print("Time for parallel PCN computation of protein {}: {} s".format(p, (end-start)))
+
+    save_adj_mat(output_path, p, edges, n, min_, max_, adj_mat_type, writer = writer)
+    if export_txt:
+        save_edge_list_txt(output_path, p, edges, min_, max_, adj_mat_type, writer)
+    print("saved adj matrix")
+
+    adj = np.zeros((n, n))
+    adj[edges[:, 0], edges[:, 1]] = 1
+    adj[edges[:, 1], edges[:, 0]] = 1
+    return adj
+
+def adjacent_matrix_nonparallel(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None, adj_mat_type = "", export_txt = False):
+    """
+    Non parallel computation the adjacency matrix.
+    Parameters:
+        output_path: string, is the output file path.
+        coordinates: np.array, contains the euclidean distance between the alpha carbon of the amino acids of the proteins.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        comp_adj_fr: tk.Frame, is the frame of the GUI that contains the progress bar.
+        window: tk.Tk, is the window of the GUI.
+        export_txt: boolean, default False. If True the dense text matrix is exported too (see save_adj_mat).
+    Returns: None
+    """
+    n = coordinates.shape[0]
+    adj = np.zeros((n,n))
+    d = np.zeros((n,n), dtype=float)
+    edge_list = []
+
+    if comp_adj_fr is not None:
+        pb = ttk.Progressbar(comp_adj_fr, orient="horizontal", mode = "determinate", length = 100)
+        pb.pack()
+        pb["value"] = 0
+        label = tk.Label(comp_adj_fr, text = "Current progress {}%".format(pb["value"]))
+        label.pack()
+        window.update()
+    else:
+
+        value = 0
+        #printProgressBar(value, n)
+
+    for i in range(n):
+        for j in range(n):
+            if (i!=j):
+                p1 = np.array(coordinates[i, 1], dtype=float) #CORD_C
+                p2 = np.array(coordinates[j, 1], dtype=float) #CORD_C
+                d[i][j] = euclidean(p1, p2)
+                if ((d[i][j]>min_) and (d[i][j]<max_)):
+                    adj[i][j] = 1
+                    adj[j][i] = 1
+                    if (([j, i] not in edge_list) and ([i, j] not in edge_list)):
+                        edge_list.append([i, j])
+
+        if comp_adj_fr is not None:
+            pb["value"]= round(((i+1)/n)*100, 2)
+            label['text'] = "Current progress {}%".format(pb["value"])
+            pb.pack()
+            label.pack()
+            window.update()
+        else:
+            pass
+            #printProgressBar(i + 1, n)
+
+    if comp_adj_fr is not None:
+        pb["value"]= round(((i+1)/n)*100, 2)
+        label['text'] = "Current progress {}%".format(pb["value"])
+        pb.pack()
+        label.pack()
+        window.update()
+    else:
+        pass
+        # printProgressBar(i + 1, n)
+
+
+    #save Edgelists, Adj matrixs and Distances matrixs
+    """
+    if not os.path.exists("{}Distances".format(output_path)):
+        os.makedirs("{}Distances".format(output_path))
+    np.savetxt("{}Distances{}{}_distances.txt".format(output_path, add_slash_to_path, p), d, fmt='%.2f')
+    print("saved distances matrix")
+
+    if not os.path.exists("{}Edgelists".format(output_path)):
+        os.makedirs("{}Edgelists".format(output_path))
+
+    np.savetxt("{}Edgelists{}{}_edgelist_{}_{}.csv".format(output_path, add_slash_to_path, p, min_, max_), np.array(edge_list), fmt='%.2f')
+    print("saved edge list")
+    """
+    matrix_file_name = save_adj_mat(output_path, p, adj_mat_edges(adj), n, min_, max_, adj_mat_type, export_txt)
+    print("saved adj matrix")
+
+    return adj, matrix_file_name
+
+def compute_contact_pairs(cords, min_=4, max_=8, method="kdtree", block_size=1000):
+    """
+    Find all the pairs of residues whose distance is greater than min_ and lower than max_.
+    Parameters:
+        cords: np.array of shape (n, 3), the coordinates of the residues.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        method: string, default "kdtree". With "kdtree" only the pairs closer than max_ are visited using a KD-tree, so that
+                time and memory grow linearly with the number of residues. With "dense" the full n x n distance matrix is computed.
+                With "blocked" the distances are computed by row tiles of block_size residues (see blocked_contact_pairs).
+        block_size: int, default 1000, number of rows of each distance tile of the method "blocked".
+    Returns:
+        pairs: np.array of shape (m, 2), the (i, j) residue indices of each contact, with i < j, sorted.
+        distances: np.array of shape (m,), the distance of each contact.
+    """
+    cords = np.asarray(cords, dtype=float)
+
+    if method == "kdtree":
+        tree = cKDTree(cords)
+        pairs = tree.query_pairs(r=max_, output_type='ndarray')
+    elif method == "dense":
+        d = cdist(cords, cords)
+        pairs = np.argwhere(np.triu(d < max_, k=1))
+        del d
+    elif method == "blocked":
+        pairs = np.concatenate([tile_pairs for tile_pairs, _ in blocked_contact_pairs(cords, min_, max_, block_size)] + [np.zeros((0, 2), dtype=np.int64)])
+    else:
+        raise Exception("method {} not supported".format(method))
+
+    pairs = pairs.reshape(-1, 2).astype(np.int64)
+    distances = np.sqrt(np.sum((cords[pairs[:, 0]] - cords[pairs[:, 1]])**2, axis=1))
+    mask = (distances > min_) & (distances < max_)
+    pairs = pairs[mask]
+    distances = distances[mask]
+
+    order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+
+    return pairs[order], distances[order]
+
+def sequence_neighbours(residue_labels):
+    """
+    Find the covalently bonded (consecutive) residues of the chains.
+    Parameters:
+        residue_labels: np.array of strings of shape (n,), the names of the residues (e.g. "LYS127 A").
+    Returns:
+        bonded_next: np.array of bool of shape (n-1,), bonded_next[i] is True if the residue i+1 follows the residue i in the same chain.
+    """
+    residue_table = residueTable(residue_labels)
+    return (residue_table.chain[1:] == residue_table.chain[:-1]) & (np.abs(residue_table.resnum[1:] - residue_table.resnum[:-1]) <= 1)
+
+def bonded_pairs_mask(rows, cols, bonded_next):
+    """
+    Mask of the residue pairs (rows[k], cols[k]) that are covalently bonded neighbours (see sequence_neighbours).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    first = np.minimum(rows, cols)
+    consecutive = np.abs(rows - cols) == 1
+    mask = np.zeros(rows.shape[0], dtype=bool)
+    mask[consecutive] = bonded_next[first[consecutive]]
+    return mask
+
+def compute_heavy_atom_contact_pairs(atom_cords, atom_residue, min_=4, max_=8, bonded_next=None, block_size=100000, return_counts=False):
+    """
+    Find all the pairs of residues whose minimum heavy-atom distance is greater than min_ and lower than max_.
+    The covalently bonded neighbours of the chains (bonded_next) are not contacts.
+    The atoms are indexed with a KD-tree and searched in blocks of block_size atoms: each block is reduced to
+    residue pairs (keeping the minimum atom distance) before the next one, so memory does not grow with the number of atom pairs.
+    Parameters:
+        atom_cords: np.array of shape (m, 3), the coordinates of the heavy atoms.
+        atom_residue: np.array of shape (m,), for each atom the index of its residue.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        bonded_next: np.array of bool of shape (n-1,), default None, the bonded neighbours (see sequence_neighbours). If None, no pair is excluded.
+        block_size: int, default 100000, number of atoms searched at a time.
+        return_counts: boolean, default False. If True, also return the number of heavy-atom pairs of each contact closer than max_.
+    Returns:
+        pairs: np.array of shape (k, 2), the (i, j) residue indices of each contact, with i < j, sorted.
+        distances: np.array of shape (k,), the minimum heavy-atom distance of each contact.
+        counts: np.array of shape (k,), only if return_counts is True, the number of heavy-atom contacts of each residue pair.
+    """
+    atom_cords = np.asarray(atom_cords, dtype=float)
+    atom_residue = np.asarray(atom_residue, dtype=np.int64)
+    n = int(atom_residue.max()) + 1 if atom_residue.size > 0 else 0
+    tree = cKDTree(atom_cords)
+
+    keys = []
+    min_distances = []
+    atom_counts = []
+
+    for start in range(0, atom_cords.shape[0], block_size):
+        block_tree = cKDTree(atom_cords[start:start+block_size])
+        found = block_tree.sparse_distance_matrix(tree, max_, output_type='ndarray')
+        i = atom_residue[found['i'] + start]
+        j = atom_residue[found['j']]
+        d = found['v']
+        mask = i < j #each residue pair once, no intra-residue contacts
+        in_window = (d[mask] < max_).astype(float)
+        key, d, count = reduce_min_by_key(i[mask] * n + j[mask], d[mask], in_window)
+        keys.append(key)
+        min_distances.append(d)
+        atom_counts.append(count)
+
+    if len(keys) > 0:
+        key, d, count = reduce_min_by_key(np.concatenate(keys), np.concatenate(min_distances), np.concatenate(atom_counts))
+    else:
+        key, d, count = np.zeros((0), dtype=np.int64), np.zeros((0)), np.zeros((0))
+
+    pairs = np.stack((key // max(n, 1), key % max(n, 1)), axis=1)
+    mask = (d > min_) & (d < max_)
+    if bonded_next is not None:
+        mask &= ~bonded_pairs_mask(pairs[:, 0], pairs[:, 1], bonded_next)
+    pairs = pairs[mask]
+
+    if return_counts:
+        return pairs, d[mask], count[mask]
+
+    return pairs, d[mask]
+
+def reduce_min_by_key(keys, values, counts = None):
+    """
+    For each distinct key keep the minimum value.
+    Parameters:
+        keys: np.array of ints.
+        values: np.array, same length of keys.
+        counts: np.array, default None, same length of keys. If given, the counts of each distinct key are summed.
+    Returns:
+        unique_keys: np.array, the sorted distinct keys.
+        min_values: np.array, the minimum value of each distinct key.
+        summed_counts: np.array, only if counts is given, the sum of the counts of each distinct key.
+    """
+    order = np.lexsort((values, keys))
+    keys = keys[order]
+    values = values[order]
+    first = np.ones(keys.shape[0], dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+
+    if counts is not None:
+        group = np.cumsum(first) - 1
+        summed_counts = np.bincount(group, weights=counts[order], minlength=int(first.sum()))
+        return keys[first], values[first], summed_counts
+
+    return keys[first], values[first]
+
+def residue_contact_pairs(coordinates, min_=4, max_=8, adj_mat_type = "", method = "kdtree", return_counts = False):
+    """
+    Find the contacts between residues for the given type of adjacency matrix.
+    For "heavy" the distance between two residues is their minimum heavy-atom distance and the covalently bonded
+    neighbours of the chains are excluded (see sequence_neighbours).
+    Parameters:
+        coordinates: np.array, contains the residues names and the coordinates returned by getResidueCoordinates.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        method: string, default "kdtree", the contact search method used by compute_contact_pairs ("kdtree", "dense" or "blocked").
+        return_counts: boolean, default False. If True, also return the number of atom contacts of each residue pair
+                       (always 1 for the single-point types "CA", "CB" and "centroid").
+    Returns:
+        pairs: np.array of shape (m, 2), the (i, j) residue indices of each contact, with i < j, sorted.
+        distances: np.array of shape (m,), the distance of each contact.
+        counts: np.array of shape (m,), only if return_counts is True, the number of atom contacts of each residue pair.
+    """
+    if adj_mat_type == "heavy":
+        counts = [len(cords) for cords in coordinates[:, 1]]
+        atom_cords = np.concatenate(list(coordinates[:, 1])).reshape(-1, 3) if len(counts) > 0 else np.zeros((0, 3))
+        atom_residue = np.repeat(np.arange(len(counts)), counts)
+        return compute_heavy_atom_contact_pairs(atom_cords, atom_residue, min_, max_, sequence_neighbours(coordinates[:, 0]), return_counts = return_counts)
+    else:
+        cords = getCoordinatesArray(coordinates)
+        pairs, distances = compute_contact_pairs(cords, min_, max_, method = method)
+        if return_counts:
+            return pairs, distances, np.ones(distances.shape[0])
+        return pairs, distances
+
+def compute_edge_weights(distances, counts, weight_type, pairs = None, confidence = None):
+    """
+    Compute the weight of the edges of the PCN.
+    With "plddt" the edges are down-weighted by the confidence of their residues: the weight is the lower pLDDT of the two residues divided by 100.
+    Parameters:
+        distances: np.array of shape (m,), the distance of each contact.
+        counts: np.array of shape (m,), the number of atom contacts of each residue pair.
+        weight_type: string, "distance", "inverse_distance", "contact_count" or "plddt".
+        pairs: np.array of shape (m, 2), default None, the (i, j) residue indices of each contact, required by "plddt".
+        confidence: np.array of shape (n,), default None, the pLDDT of each residue (see residueConfidence), required by "plddt".
+    Returns:
+        weights: np.array of shape (m,), the weight of each edge.
+    """
+    if weight_type == "distance":
+        return np.asarray(distances, dtype=float)
+    elif weight_type == "inverse_distance":
+        return 1 / np.asarray(distances, dtype=float)
+    elif weight_type == "contact_count":
+        return np.asarray(counts, dtype=float)
+    elif weight_type == "plddt":
+        if confidence is None:
+            raise Exception("weight type plddt needs the confidence of the residues")
+        confidence = np.nan_to_num(np.asarray(confidence, dtype=float), nan=100.0)
+        return np.minimum(confidence[pairs[:, 0]], confidence[pairs[:, 1]]) / 100
+    else:
+        raise Exception("weight type {} not supported".format(weight_type))
+
+def save_weighted_pcn(output_path, p, edges, weights, n, min_, max_, adj_mat_type = "", weight_type = "distance", writer = None):
+    """
+    Save the edge weights of the PCN in a compressed numpy file, {p}_weights_{adj_mat_type}_{min_}_{max_}_{weight_type}.npz in the Weighted folder.
+    Only the edges are stored (int32 indices and float32 weights), so the file size is proportional to the number of contacts.
+    Parameters:
+        output_path: string, is the output file path.
+        p: string with len equals to 4, is the protein pdb code.
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact, with i < j.
+        weights: np.array of shape (m,), the weight of each edge.
+        n: int, number of residues (nodes) of the PCN.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        weight_type: string, "distance", "inverse_distance", "contact_count" or "plddt".
+        writer: ResultsWriter, default None. If given the file is written in background (see ResultsWriter).
+    Returns:
+        weights_file_name: string, the name of the saved file.
+    """
+    weights_file_name = "{}_weights_{}_{}_{}_{}.npz".format(p, adj_mat_type, min_, max_, weight_type)
+    if writer is not None:
+        writer.submit(save_weighted_pcn, output_path, p, edges, weights, n, min_, max_, adj_mat_type, weight_type)
+        return weights_file_name
+
+    if not os.path.exists("{}Weighted".format(output_path)):
+        os.makedirs("{}Weighted".format(output_path))
+    np.savez_compressed("{}Weighted{}{}".format(output_path, add_slash_to_path, weights_file_name),
+                        edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2),
+                        weights = np.asarray(weights, dtype=np.float32),
+                        n = n,
+                        weight_type = weight_type)
+    catalog_results(output_path, ["{}Weighted{}{}".format(output_path, add_slash_to_path, weights_file_name)], "weighted", p, adj_mat_type = adj_mat_type,
+                    params = {"min": min_, "max": max_, "weight_type": weight_type})
+    print("saved edge weights")
+
+    return weights_file_name
+
+def read_weighted_pcn(weights_filepath, p, min_, max_, adj_mat_type, weight_type):
+    """
+    Read the edge weights of the PCN saved by save_weighted_pcn.
+    Parameters:
+        weights_filepath: string, is the path of the Weighted folder.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        weight_type: string, "distance", "inverse_distance", "contact_count" or "plddt".
+    Returns:
+        W: scipy.sparse.csr_matrix, the weighted adjacency matrix of the PCN.
+    """
+    weights_file = "{}{}_weights_{}_{}_{}_{}.npz".format(weights_filepath, p, adj_mat_type, min_, max_, weight_type)
+    if (os.path.isfile(weights_file)):
+        with np.load(weights_file) as data:
+            return edges_to_sparse(data["edges"], int(data["n"]), data["weights"].astype(float))
+    else:
+        raise Exception("Weighted PCN for protein {} doesn't exists.".format(p))
+
+def contact_edge_list(output_path, coordinates, p, min_=4, max_=8, adj_mat_type = "", weight_type = None, confidence = None, export_txt = False, writer = None, method = "kdtree"):
+    """
+    Compute the edge list of the PCN with the KD-tree (or blocked) contact search, without building the n x n adjacency matrix.
+    Used for large assemblies (tens of thousands of residues) whose dense adjacency matrix does not fit in memory.
+    The edge list is saved in the binary adjacency format (see save_adj_mat).
+    Parameters:
+        output_path: string, is the output file path.
+        coordinates: np.array, contains the residues names and the coordinates of their alpha-C, beta-C, centroids or heavy atoms.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        weight_type: string, default None. If "distance", "inverse_distance", "contact_count" or "plddt", the edge weights are saved too (see save_weighted_pcn).
+        confidence: np.array, default None, the pLDDT of each residue, required by the weight type "plddt" (see compute_edge_weights).
+        export_txt: boolean, default False. If True the text edge list {p}_edgelist_{adj_mat_type}_{min_}_{max_}.txt is saved in the Edgelists folder too.
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+        method: string, default "kdtree", the contact search method used by compute_contact_pairs ("kdtree", "dense" or "blocked").
+    Returns:
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact, with i < j.
+        edge_list_file_name: string, the name of the saved adjacency matrix file.
+    """
+    edges, distances, counts = residue_contact_pairs(coordinates, min_, max_, adj_mat_type, method = method, return_counts = True)
+    if weight_type is not None:
+        save_weighted_pcn(output_path, p, edges, compute_edge_weights(distances, counts, weight_type, edges, confidence), coordinates.shape[0], min_, max_, adj_mat_type, weight_type, writer)
+
+    edge_list_file_name = save_adj_mat(output_path, p, edges, coordinates.shape[0], min_, max_, adj_mat_type, writer = writer)
+    if export_txt:
+        save_edge_list_txt(output_path, p, edges, min_, max_, adj_mat_type, writer)
+    print("saved edge list")
+
+    return edges, edge_list_file_name
+
+def save_edge_list_txt(output_path, p, edges, min_, max_, adj_mat_type = "", writer = None):
+    """
+    Export the edge list of the PCN as text, {p}_edgelist_{adj_mat_type}_{min_}_{max_}.txt in the Edgelists folder.
+    Parameters:
+        output_path: string, is the output file path.
+        p: string with len equals to 4, is the protein pdb code.
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        writer: ResultsWriter, default None. If given the file is written in background (see ResultsWriter).
+    Returns:
+        edge_list_file_name: string, the name of the saved text edge list file.
+    """
+    edge_list_file_name = "{}_edgelist_{}_{}_{}.txt".format(p, adj_mat_type, min_, max_)
+    if writer is not None:
+        writer.submit(save_edge_list_txt, output_path, p, edges, min_, max_, adj_mat_type)
+        return edge_list_file_name
+
+    if not os.path.exists("{}Edgelists".format(output_path)):
+        os.makedirs("{}Edgelists".format(output_path))
+    np.savetxt("{}Edgelists{}{}".format(output_path, add_slash_to_path, edge_list_file_name), edges, fmt='%d')
+    catalog_results(output_path, ["{}Edgelists{}{}".format(output_path, add_slash_to_path, edge_list_file_name)], "edgelist", p, adj_mat_type = adj_mat_type, params = {"min": min_, "max": max_})
+    return edge_list_file_name
+
+def weighted_adjacent_matrix(output_path, coordinates, p, min_=4, max_=8, adj_mat_type = "", weight_type = "distance", confidence = None, writer = None):
+    """
+    Get the weighted adjacency matrix of the PCN.
+    The edge weights saved by save_weighted_pcn are read if present in the Weighted folder, otherwise they are computed and saved.
+    Parameters:
+        output_path: string, is the output file path.
+        coordinates: np.array, contains the residues names and the coordinates of their alpha-C, beta-C, centroids or heavy atoms.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        weight_type: string, "distance", "inverse_distance", "contact_count" or "plddt".
+        confidence: np.array, default None, the pLDDT of each residue, required by the weight type "plddt" (see compute_edge_weights).
+        writer: ResultsWriter, default None. If given the queued saves are written before looking for the edge weights, and the computed ones are written in background.
+    Returns:
+        W: scipy.sparse.csr_matrix, the weighted adjacency matrix of the PCN.
+    """
+    if writer is not None:
+        writer.flush() #the edge weights saved with the adjacency matrix may be still in the queue
+    weights_filepath = "{}Weighted{}".format(output_path, add_slash_to_path)
+    if os.path.isfile("{}{}_weights_{}_{}_{}_{}.npz".format(weights_filepath, p, adj_mat_type, min_, max_, weight_type)):
+        return read_weighted_pcn(weights_filepath, p, min_, max_, adj_mat_type, weight_type)
+
+    n = coordinates.shape[0]
+    pairs, distances, counts = residue_contact_pairs(coordinates, min_, max_, adj_mat_type, return_counts = True)
+    weights = compute_edge_weights(distances, counts, weight_type, pairs, confidence)
+    save_weighted_pcn(output_path, p, pairs, weights, n, min_, max_, adj_mat_type, weight_type, writer)
+
+    return edges_to_sparse(pairs, n, weights)
+
+def adjacent_matrix_vectorized(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None, adj_mat_type = "", method = "kdtree", weight_type = None, confidence = None, export_txt = False, writer = None):
+    """
+    Vectorized computation of the adjacency matrix.
+    Same output of adjacent_matrix_nonparallel, but the contacts are found with compute_contact_pairs
+    instead of looping over every pair of residues.
+    Parameters:
+        output_path: string, is the output file path.
+        coordinates: np.array, contains the residues names and the coordinates of their alpha-C, beta-C, centroids or heavy atoms.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        comp_adj_fr: tk.Frame, is the frame of the GUI that contains the progress bar.
+        window: tk.Tk, is the window of the GUI.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        method: string, default "kdtree", the contact search method used by compute_contact_pairs ("kdtree", "dense" or "blocked").
+        weight_type: string, default None. If "distance", "inverse_distance", "contact_count" or "plddt", the edge weights are saved too (see save_weighted_pcn).
+        confidence: np.array, default None, the pLDDT of each residue, required by the weight type "plddt" (see compute_edge_weights).
+        export_txt: boolean, default False. If True the dense text matrix is exported too (see save_adj_mat).
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+    Returns:
+        adj: np.array, the adjacency matrix of the PCN.
+        matrix_file_name: string, the name of the saved adjacency matrix file.
+    """
+    if comp_adj_fr is not None:
+        pb = ttk.Progressbar(comp_adj_fr, orient="horizontal", mode = "determinate", length = 100)
+        pb.pack()
+        pb["value"] = 0
+        label = tk.Label(comp_adj_fr, text = "Current progress {}%".format(pb["value"]))
+        label.pack()
+        window.update()
+
+    n = coordinates.shape[0]
+    pairs, distances, counts = residue_contact_pairs(coordinates, min_, max_, adj_mat_type, method = method, return_counts = True)
+    if weight_type is not None:
+        save_weighted_pcn(output_path, p, pairs, compute_edge_weights(distances, counts, weight_type, pairs, confidence), n, min_, max_, adj_mat_type, weight_type, writer)
+    adj = np.zeros((n, n))
+    adj[pairs[:, 0], pairs[:, 1]] = 1
+    adj[pairs[:, 1], pairs[:, 0]] = 1
+
+    if comp_adj_fr is not None:
+        pb["value"] = 100
+        label['text'] = "Current progress {}%".format(pb["value"])
+        pb.pack()
+        label.pack()
+        window.update()
+
+    matrix_file_name = save_adj_mat(output_path, p, pairs, n, min_, max_, adj_mat_type, export_txt, writer)
+    print("saved adj matrix")
+
+    return adj, matrix_file_name
+
+def adjacent_matrix_sweep(output_path, coordinates, p, thresholds, comp_adj_fr=None, window = None, adj_mat_type = "", sparse_pcn = False, export_txt = False, writer = None, return_pcns = False):
+    """
+    Compute the PCNs of a protein for many (min_, max_) thresholds with a single neighbor search.
+    The contacts are searched once up to the largest max_ and sorted by distance, then the PCN of each threshold pair
+    is a slice of the sorted edge list, so a sweep over many thresholds costs about the same as a single build.
+    Each PCN is saved as {p}_adj_{adj_mat_type}_{min_}_{max_}.npz (see save_adj_mat).
+    Parameters:
+        output_path: string, is the output file path.
+        coordinates: np.array, contains the residues names and the coordinates of their alpha-C, beta-C, centroids or heavy atoms.
+        p: string with len equals to 4, is the protein pdb code.
+        thresholds: list of tuples (min_, max_), the thresholds of the PCNs to compute.
+        comp_adj_fr: tk.Frame, is the frame of the GUI that contains the progress bar.
+        window: tk.Tk, is the window of the GUI.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        sparse_pcn: boolean, default False. If True the exported text files (see export_txt) are edge lists instead of dense adjacency matrices.
+        export_txt: boolean, default False. If True each PCN is exported as text too.
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+        return_pcns: boolean, default False. If True the PCNs are returned too, as scipy.sparse CSR matrices.
+    Returns:
+        file_names: dict {(min_, max_): file_name}, the name of the saved file of each PCN.
+        pcns: dict {(min_, max_): scipy.sparse.csr_matrix}, the adjacency matrix of each PCN, only if return_pcns is True.
+    """
+    if comp_adj_fr is not None:
+        pb = ttk.Progressbar(comp_adj_fr, orient="horizontal", mode = "determinate", length = 100)
+        pb.pack()
+        pb["value"] = 0
+        label = tk.Label(comp_adj_fr, text = "Current progress {}%".format(pb["value"]))
+        label.pack()
+        window.update()
+
+    n = coordinates.shape[0]
+    lowest_min = min(min_ for min_, max_ in thresholds)
+    highest_max = max(max_ for min_, max_ in thresholds)
+
+    pairs, distances = residue_contact_pairs(coordinates, lowest_min, highest_max, adj_mat_type)
+    order = np.argsort(distances, kind="stable")
+    pairs = pairs[order]
+    distances = distances[order]
+
+    file_names = dict()
+    pcns = dict()
+    for count, (min_, max_) in enumerate(thresholds):
+        #distances > min_ and distances < max_
+        start = np.searchsorted(distances, min_, side="right")
+        stop = np.searchsorted(distances, max_, side="left")
+        edges = pairs[start:stop]
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+        file_name = save_adj_mat(output_path, p, edges, n, min_, max_, adj_mat_type, export_txt and not sparse_pcn, writer = writer)
+        if export_txt and sparse_pcn:
+            save_edge_list_txt(output_path, p, edges, min_, max_, adj_mat_type, writer = writer)
+        file_names[(min_, max_)] = file_name
+        if return_pcns:
+            pcns[(min_, max_)] = edges_to_sparse(edges, n)
+        print("saved PCN with thresholds: min = {} and max = {}".format(min_, max_))
+
+        if comp_adj_fr is not None:
+            pb["value"] = round(((count + 1) / len(thresholds)) * 100, 2)
+            label['text'] = "Current progress {}%".format(pb["value"])
+            pb.pack()
+            label.pack()
+            window.update()
+
+    if return_pcns:
+        return file_names, pcns
+    return file_names
+
+def getEnsembleCoordinates(models, adj_mat_type):
+    """
+    Compute the residue coordinates of every model of an ensemble.
+    Parameters:
+        models: list of np.array, the atoms of each model, as returned by readPDBModels.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+    Returns:
+        models_coordinates: list of np.array, for each model the residues names and coordinates, as returned by getResidueCoordinates.
+    """
+    models_coordinates = [getResidueCoordinates(atoms, adj_mat_type) for atoms in models]
+
+    for k, coordinates in enumerate(models_coordinates[1:]):
+        if ((coordinates.shape[0] != models_coordinates[0].shape[0]) or np.any(coordinates[:, 0] != models_coordinates[0][:, 0])):
+            raise Exception("Model {} has different residues from model 1.".format(k+2))
+
+    return models_coordinates
+
+def adjacent_matrix_ensemble(output_path, models_coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None, adj_mat_type = "", export_txt = False, writer = None):
+    """
+    Compute the PCNs of all the models of an ensemble and their contact-frequency matrix in one pass.
+    The contacts of each model are found with the KD-tree pair search (see residue_contact_pairs) and only the sparse
+    contact counts are accumulated (see contact_frequency_stream), so no (models x n x n) array is built.
+    The PCN of model k is saved as {p}-model{k}_adj_{adj_mat_type}_{min_}_{max_}.npz (see save_adj_mat) and the contact frequency
+    (fraction of models in which each contact is present) as {p}_freq_{adj_mat_type}_{min_}_{max_}.npz in the ContactFrequency folder (see save_contact_frequency).
+    Parameters:
+        output_path: string, is the output file path.
+        models_coordinates: list of np.array, the residues names and coordinates of each model, as returned by getEnsembleCoordinates.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        comp_adj_fr: tk.Frame, is the frame of the GUI that contains the progress bar.
+        window: tk.Tk, is the window of the GUI.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        export_txt: boolean, default False. If True the saved files are exported as dense text matrices too.
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+    Returns:
+        adjs: list of scipy.sparse.csr_matrix, the adjacency matrix of each model.
+        freq: scipy.sparse.csr_matrix, the contact-frequency matrix.
+        matrix_file_names: list of strings, the names of the saved adjacency matrix files, one for each model.
+    """
+    if comp_adj_fr is not None:
+        pb = ttk.Progressbar(comp_adj_fr, orient="horizontal", mode = "determinate", length = 100)
+        pb.pack()
+        pb["value"] = 0
+        label = tk.Label(comp_adj_fr, text = "Current progress {}%".format(pb["value"]))
+        label.pack()
+        window.update()
+
+    n_models = len(models_coordinates)
+    n = models_coordinates[0].shape[0]
+    adjs = []
+
+    def add_model(k, pairs):
+        adjs.append(edges_to_sparse(pairs, n))
+        if comp_adj_fr is not None:
+            pb["value"] = round(((k + 1) / n_models) * 100, 2)
+            label['text'] = "Current progress {}%".format(pb["value"])
+            pb.pack()
+            label.pack()
+            window.update()
+
+    #the models are numbered from 1 in the files names, as the frames of contact_frequency_stream
+    frames = ((k, coordinates, coordinates[:, 0], None) for k, coordinates in enumerate(models_coordinates))
+    _, freq, matrix_file_names = contact_frequency_stream(output_path, frames, p, min_, max_, adj_mat_type, save_frames = True,
+                                                          frame_callback = add_model, export_txt = export_txt, writer = writer)
+    print("saved {} adj matrices".format(n_models))
+
+    return adjs, freq, matrix_file_names
+
+def accumulate_contact_counts(keys, counts, new_keys):
+    """
+    Add contacts to sparse contact counts, stored as the sorted codes i*n+j of the counted contacts and their counts.
+    The memory is proportional to the number of distinct contacts, not to n x n.
+    Parameters:
+        keys: np.array of int64, the sorted codes of the counted contacts.
+        counts: np.array of int64, the count of each code.
+        new_keys: list of np.array of int64, the codes of the contacts to add (e.g. one array for each frame).
+    Returns:
+        keys: np.array of int64, the sorted codes of the counted contacts.
+        counts: np.array of int64, the count of each code.
+    """
+    new_counts = [counts] + [np.ones(len(codes), dtype=np.int64) for codes in new_keys]
+    keys, inverse = np.unique(np.concatenate([keys] + list(new_keys)), return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=np.concatenate(new_counts), minlength=len(keys)).astype(np.int64)
+    return keys, counts
+
+def save_contact_frequency(output_path, p, edges, counts, n_frames, n, min_, max_, adj_mat_type = "", export_txt = False, writer = None):
+    """
+    Save the contact-frequency matrix of an ensemble or trajectory, {p}_freq_{adj_mat_type}_{min_}_{max_}.npz in the ContactFrequency folder.
+    Only the contacts present in at least one frame are stored (int32 indices and counts) with the number of frames,
+    so the file size is proportional to the number of contacts (see read_contact_frequency).
+    Parameters:
+        output_path: string, is the output file path.
+        p: string with len equals to 4, is the protein pdb code.
+        edges: np.array of shape (m, 2), the (i, j) residue indices of each contact, with i < j.
+        counts: np.array of shape (m,), the number of frames in which each contact is present.
+        n_frames: int, number of frames.
+        n: int, number of residues (nodes) of the PCN.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        export_txt: boolean, default False. If True the dense text matrix {p}_freq_{adj_mat_type}_{min_}_{max_}.txt is exported too, the format of the previous versions.
+        writer: ResultsWriter, default None. If given the file is written in background (see ResultsWriter).
+    Returns:
+        freq_file_name: string, the name of the saved file.
+    """
+    freq_file_name = "{}_freq_{}_{}_{}.npz".format(p, adj_mat_type, min_, max_)
+    if writer is not None:
+        writer.submit(save_contact_frequency, output_path, p, edges, counts, n_frames, n, min_, max_, adj_mat_type, export_txt)
+        return freq_file_name
+
+    if not os.path.exists("{}ContactFrequency".format(output_path)):
+        os.makedirs("{}ContactFrequency".format(output_path))
+    files = ["{}ContactFrequency{}{}".format(output_path, add_slash_to_path, freq_file_name)]
+    with open(files[0], "wb") as f:
+        np.savez(f, edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2),
+                 counts = np.asarray(counts, dtype=np.int32),
+                 n_frames = np.int64(n_frames),
+                 n = np.int64(n))
+    if export_txt:
+        files.append("{}.txt".format(os.path.splitext(files[0])[0]))
+        np.savetxt(files[1], edges_to_sparse(edges, n, np.asarray(counts) / n_frames).toarray(), fmt='%.4f')
+    catalog_results(output_path, files, "freq", p, adj_mat_type = adj_mat_type, params = {"min": min_, "max": max_, "frames": int(n_frames)})
+    print("saved contact frequency matrix of {} frames".format(n_frames))
+
+    return freq_file_name
+
+def read_contact_frequency(freq_file):
+    """
+    Read a contact-frequency matrix saved by save_contact_frequency.
+    Parameters:
+        freq_file: string, is the complete contact-frequency file path.
+    Returns:
+        freq: scipy.sparse.csr_matrix, the contact-frequency matrix (fraction of frames in which each contact is present).
+    """
+    if (os.path.isfile(freq_file)):
+        with np.load(freq_file) as data:
+            return edges_to_sparse(data["edges"], int(data["n"]), data["counts"] / int(data["n_frames"]))
+    else:
+        raise Exception("Contact frequency file {} doesn't exists.".format(freq_file))
+
+def contact_frequency_stream(output_path, frames, p, min_=4, max_=8, adj_mat_type = "", save_frames = False, frame_callback = None, export_txt = False, writer = None):
+    """
+    Compute the contact-frequency matrix of the frames of a trajectory or ensemble, consuming them one at a time.
+    Only the sparse contact counts are accumulated (see accumulate_contact_counts), so the memory grows neither with
+    the number of frames nor with n x n: frames can be the generator returned by iterPDBFrames.
+    The contact frequency (fraction of frames in which each contact is present) is saved as
+    {p}_freq_{adj_mat_type}_{min_}_{max_}.npz in the ContactFrequency folder (see save_contact_frequency).
+    Parameters:
+        output_path: string, is the output file path.
+        frames: iterable of (frame, residues, residue_labels, res_list) tuples, as yielded by iterPDBFrames.
+        p: string with len equals to 4, is the protein pdb code.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        save_frames: boolean, default False. If True the PCN of frame k is saved as {p}-model{k+1}_adj_{adj_mat_type}_{min_}_{max_}.npz in the Adj folder (see save_adj_mat).
+        frame_callback: function, default None, called as frame_callback(frame, pairs) for each frame, with the (m, 2) contacts of the frame,
+                        to run a per-frame network stage on the stream.
+        export_txt: boolean, default False. If True the saved files are exported as dense text matrices too.
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+    Returns:
+        adj_first: scipy.sparse.csr_matrix, the adjacency matrix of the first frame.
+        freq: scipy.sparse.csr_matrix, the contact-frequency matrix.
+        matrix_file_names: list of strings, the names of the saved adjacency matrix files, empty if save_frames is False.
+    """
+    n = None
+    keys = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(0, dtype=np.int64)
+    pending = []
+    pending_size = 0
+    adj_first = None
+    labels_first = None
+    n_frames = 0
+    matrix_file_names = []
+
+    for frame, residues, residue_labels, _ in frames:
+        if n is None:
+            n = len(residue_labels)
+            labels_first = np.asarray(residue_labels, dtype=str)
+        elif (len(residue_labels) != n) or np.any(np.asarray(residue_labels, dtype=str) != labels_first):
+            raise Exception("The frame {} has different residues from the first frame.".format(frame))
+
+        pairs, _ = residue_contact_pairs(residues, min_, max_, adj_mat_type)
+        pairs = np.sort(np.asarray(pairs, dtype=np.int64).reshape(-1, 2), axis=1)
+        pending.append(pairs[:, 0]*n + pairs[:, 1])
+        pending_size += pairs.shape[0]
+        #the codes of the frames are merged in batches, the cost of a merge is shared by many frames
+        if pending_size > max(keys.shape[0], 2**20):
+            keys, counts = accumulate_contact_counts(keys, counts, pending)
+            pending = []
+            pending_size = 0
+
+        if adj_first is None:
+            adj_first = edges_to_sparse(pairs, n)
+        if save_frames:
+            matrix_file_names.append(save_adj_mat(output_path, "{}-model{}".format(p, frame+1), pairs, n, min_, max_, adj_mat_type, export_txt, writer))
+
+        if frame_callback is not None:
+            frame_callback(frame, pairs)
+
+        n_frames += 1
+        if n_frames % 1000 == 0:
+            print("processed {} frames".format(n_frames))
+
+    if n is None:
+        raise Exception("No frames with 'ATOM' records for protein {}.".format(p))
+
+    keys, counts = accumulate_contact_counts(keys, counts, pending)
+    edges = np.stack((keys // n, keys % n), axis=1)
+    freq = edges_to_sparse(edges, n, counts / n_frames)
+    save_contact_frequency(output_path, p, edges, counts, n_frames, n, min_, max_, adj_mat_type, export_txt, writer)
+
+    return adj_first, freq, matrix_file_names
+
+def changed_residues(coordinates_ref, coordinates_new, tol = 1e-3, adj_mat_type = ""):
+    """
+    Find the residues that differ between two structures with the same residues (e.g. a wild type and a point mutant model).
+    A residue is changed if its name (amino acid type) is different or if any of its coordinates moved more than tol.
+    The structures are compared as whole arrays: the (n, 3) coordinates of the single-point types (see getCoordinatesArray)
+    or all the heavy atoms at once, so the cost has no per-residue Python loop.
+    Parameters:
+        coordinates_ref: np.array, the residues names and coordinates of the reference structure, as returned by getResidueCoordinates
+                         (or the (n, 3) float array of the single-point types).
+        coordinates_new: np.array, the residues names and coordinates of the new structure, in the same format of coordinates_ref.
+        tol: float, default 1e-3, tolerance on the coordinates (Angstrom).
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+    Returns:
+        changed: np.array of ints, the indices of the changed residues.
+    """
+    n = coordinates_ref.shape[0]
+    if n != coordinates_new.shape[0]:
+        raise Exception("The structures have a different number of residues ({} and {}).".format(n, coordinates_new.shape[0]))
+
+    if (coordinates_ref.dtype == object) and (coordinates_new.dtype == object):
+        renamed = coordinates_ref[:, 0].astype(str) != coordinates_new[:, 0].astype(str)
+    else:
+        renamed = np.zeros(n, dtype=bool)
+
+    if adj_mat_type == "heavy":
+        counts_ref = np.array([len(cords) for cords in coordinates_ref[:, 1]], dtype=np.int64)
+        counts_new = np.array([len(cords) for cords in coordinates_new[:, 1]], dtype=np.int64)
+        atoms_ref = np.concatenate(list(coordinates_ref[:, 1]) + [np.zeros((0, 3))]).reshape(-1, 3)
+        atoms_new = np.concatenate(list(coordinates_new[:, 1]) + [np.zeros((0, 3))]).reshape(-1, 3)
+        moved = counts_ref != counts_new
+        #the atoms of the residues with the same number of atoms are compared pairwise, in one gather
+        same = np.flatnonzero(~moved & (counts_ref > 0))
+        if same.size > 0:
+            counts = counts_ref[same]
+            first_atom = np.cumsum(counts) - counts
+            offsets = np.arange(counts.sum()) - np.repeat(first_atom, counts)
+            atom_moved = np.any(np.abs(atoms_ref[np.repeat(np.cumsum(counts_ref)[same] - counts, counts) + offsets]
+                                       - atoms_new[np.repeat(np.cumsum(counts_new)[same] - counts, counts) + offsets]) > tol, axis=1)
+            moved[same] = np.logical_or.reduceat(atom_moved, first_atom)
+    else:
+        moved = np.any(np.abs(getCoordinatesArray(coordinates_ref) - getCoordinatesArray(coordinates_new)) > tol, axis=1)
+
+    return np.flatnonzero(renamed | moved).astype(np.int64)
+
+def changed_residue_distances(coordinates, changed, adj_mat_type = ""):
+    """
+    Compute the distances between the changed residues and all the residues of the structure.
+    For adj_mat_type "heavy" the distance between two residues is their minimum heavy-atom distance.
+    The cost is proportional to the number of changed residues times the size of the structure.
+    Parameters:
+        coordinates: np.array, the residues names and coordinates of the structure, as returned by getResidueCoordinates.
+        changed: np.array of ints, the indices of the changed residues.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+    Returns:
+        d: np.array of shape (len(changed), n), the distances of the changed residues from all the residues.
+    """
+    if adj_mat_type == "heavy":
+        counts = np.array([len(cords) for cords in coordinates[:, 1]])
+        atom_cords = np.concatenate(list(coordinates[:, 1])).reshape(-1, 3)
+        changed_cords = np.concatenate([coordinates[i, 1] for i in changed]).reshape(-1, 3)
+        d = cdist(changed_cords, atom_cords)
+        #minimum over the atoms of each residue (columns) and of each changed residue (rows)
+        d = np.minimum.reduceat(d, np.concatenate(([0], np.cumsum(counts)[:-1])), axis=1)
+        d = np.minimum.reduceat(d, np.concatenate(([0], np.cumsum(counts[changed])[:-1])), axis=0)
+        return d
+    else:
+        cords = getCoordinatesArray(coordinates)
+        return cdist(cords[changed], cords)
+
+def update_adjacent_matrix(adj_ref, coordinates_ref, coordinates_new, changed = None, min_=4, max_=8, adj_mat_type = "", output_path = None, p = None, export_txt = False, copy = True):
+    """
+    Incremental update of the adjacency matrix of a PCN for an edited or mutated structure.
+    Only the rows and the columns of the changed residues are recomputed, so the cost is proportional to
+    the number of changed residues instead of the number of pairs of residues.
+    A sparse adj_ref is updated on its CSR arrays, without densifying it. adj_ref is left unchanged, so one reference PCN serves many mutants; a dense adj_ref is updated in place only if copy is False.
+    Parameters:
+        adj_ref: np.array or scipy.sparse matrix, the adjacency matrix of the reference PCN.
+        coordinates_ref: np.array, the residues names and coordinates of the reference structure, as returned by getResidueCoordinates.
+        coordinates_new: np.array, the residues names and coordinates of the new structure, as returned by getResidueCoordinates.
+        changed: list of ints, default None, the indices of the changed residues. If None, they are found with changed_residues.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        output_path: string, default None, is the output file path. If given, the new PCN is saved in the binary adjacency format (see save_adj_mat).
+        p: string, default None, the pdb code of the new structure, used for the output file name.
+        export_txt: boolean, default False. If True the new PCN is exported as text too (edge list if adj_ref is sparse, dense matrix otherwise).
+        copy: boolean, default True. If False a dense adj_ref is updated in place, without the n x n copy (the reference PCN is lost).
+    Returns:
+        adj: np.array or scipy.sparse.csr_matrix (same type of adj_ref), the adjacency matrix of the new PCN.
+    """
+    if changed is None:
+        changed = changed_residues(coordinates_ref, coordinates_new, adj_mat_type = adj_mat_type)
+    changed = np.unique(np.asarray(changed, dtype=np.int64))
+    n = coordinates_new.shape[0]
+
+    if adj_ref.shape[0] != n:
+        raise Exception("The reference PCN has {} residues but the new structure has {}.".format(adj_ref.shape[0], n))
+
+    if changed.size > 0:
+        d = changed_residue_distances(coordinates_new, changed, adj_mat_type)
+        if adj_mat_type == "heavy":
+            #minimum heavy-atom distance between min_ and max_, except the bonded neighbours (see residue_contact_pairs)
+            rows, cols = np.nonzero((d > min_) & (d < max_))
+            rows = changed[rows]
+            not_self = (rows != cols) & ~bonded_pairs_mask(rows, cols, sequence_neighbours(coordinates_new[:, 0]))
+        else:
+            rows, cols = np.nonzero((d > min_) & (d < max_))
+            rows = changed[rows]
+            not_self = rows != cols
+        rows = rows[not_self]
+        cols = cols[not_self]
     else:
-        value = 0
-        #printProgressBar(value, n)
+        rows = cols = np.zeros((0), dtype=np.int64)
+
+    is_changed = np.zeros(n, dtype=bool)
+    is_changed[changed] = True
+
+    if sparse.issparse(adj_ref):
+        #drop the stored edges of the changed residues from the CSR arrays, then add the recomputed edges
+        A = sparse.csr_matrix(adj_ref)
+        edge_rows = np.repeat(np.arange(n), np.diff(A.indptr))
+        keep = ~(is_changed[edge_rows] | is_changed[A.indices])
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(edge_rows[keep], minlength=n))))
+        adj = sparse.csr_matrix((np.ones(np.count_nonzero(keep)), A.indices[keep], indptr), shape=(n, n))
+        adj = adj + sparse.csr_matrix((np.ones(2 * rows.size), (np.concatenate((rows, cols)), np.concatenate((cols, rows)))), shape=(n, n))
+        adj.data[:] = 1
+    else:
+        adj = np.array(adj_ref, copy=True) if copy else np.asarray(adj_ref)
+        adj[changed, :] = 0
+        adj[:, changed] = 0
+        adj[rows, cols] = 1
+        adj[cols, rows] = 1
+
+    if output_path is not None:
+        edges = adj_mat_edges(adj)
+        save_adj_mat(output_path, p, edges, n, min_, max_, adj_mat_type, export_txt and not sparse.issparse(adj))
+        if export_txt and sparse.issparse(adj):
+            save_edge_list_txt(output_path, p, edges, min_, max_, adj_mat_type)
+        print("saved adj matrix")
 
-    for i in range(n):
-        for j in range(i):
-            if ((d[i][j]>min_) and (d[i][j]<max_)):
-                adj[i][j] = 1
-                adj[j][i] = 1
+    return adj
 
-        if comp_adj_fr is not None:
-            pb["value"] = round(((i + 1) / n) * 100, 2)
-            label['text'] = "Current progress {}%".format(pb["value"])
-            pb.pack()
-            label.pack()
-            window.update()
+def build_pcn_worker(args):
+    """
+    Worker of build_pcns_parallel: parse the pdb file of a protein and build its PCN.
+    It is a top-level function so that it can be sent to the processes of the pool.
+    Parameters:
+        args: tuple (p_name, protein_path, output_path, min_, max_, adj_mat_type, sparse_pcn, weight_type, export_txt).
+    Returns:
+        p_name: string, the protein pdb code.
+        pcn: dict with keys "residues", "residue_labels", "res_list", "has_chain", "confidence", "A" (scipy.sparse.csr_matrix) and "matrix_file_name", None if the build failed.
+        error: string, the error raised while building the PCN, None if the build succeeded.
+    """
+    p_name, protein_path, output_path, min_, max_, adj_mat_type, sparse_pcn, weight_type, export_txt = args
+
+    try:
+        structure = ProteinStructure(protein_path, "{}Cache{}".format(output_path, add_slash_to_path), parseSelection(p_name)[1])
+        residues, residue_labels = structure.residueCoordinates(adj_mat_type)
+        res_list = structure.res_list
+        confidence = structure.residueConfidence(adj_mat_type)
+        if sparse_pcn:
+            A, matrix_file_name = adjacent_matrix_sparse(output_path, residues, p_name, min_, max_, adj_mat_type = adj_mat_type, weight_type = weight_type, confidence = confidence, export_txt = export_txt)
         else:
-            pass
-            #printProgressBar(i + 1, n)
+            A, matrix_file_name = adjacent_matrix_vectorized(output_path, residues, p_name, min_, max_, adj_mat_type = adj_mat_type, weight_type = weight_type, confidence = confidence, export_txt = export_txt)
+            A = sparse.csr_matrix(A) #compact to send back to the main process
+        pcn = {"residues": residues, "residue_labels": residue_labels, "res_list": res_list, "has_chain": structure.has_chain, "confidence": confidence, "A": A, "matrix_file_name": matrix_file_name}
+        return p_name, pcn, None
+    except Exception as e:
+        return p_name, None, "{}: {}".format(type(e).__name__, e)
+
+def build_pcns_parallel(proteins_list, proteins_path, output_path, min_=4, max_=8, adj_mat_type = "", processes = None, sparse_pcn = False, weight_type = None, export_txt = False):
+    """
+    Parse the pdb files and build the PCNs of many proteins with a pool of processes.
+    A protein that fails does not stop the batch: its error is collected in the failure report.
+    Parameters:
+        proteins_list: list of strings, the proteins pdb codes or selection names (see selectionName).
+        proteins_path: string, is the path of the pdb files.
+        output_path: string, is the output file path.
+        min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
+        max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        processes: int, default None, number of processes of the pool. If None, the number of CPUs is used.
+        sparse_pcn: boolean, default False. If True the PCNs are built without the dense adjacency matrices.
+        weight_type: string, default None. If "distance", "inverse_distance", "contact_count" or "plddt", the edge weights are saved too.
+        export_txt: boolean, default False. If True the PCNs are exported as text too (see save_adj_mat).
+    Returns:
+        pcns: dict {p_name: pcn}, the PCNs built successfully (see build_pcn_worker).
+        failures: dict {p_name: error}, the proteins whose PCN could not be built.
+    """
+    args = [(p_name, resolveStructurePath(proteins_path, parseSelection(p_name)[0]), output_path, min_, max_, adj_mat_type, sparse_pcn, weight_type, export_txt) for p_name in proteins_list]
+    pcns = dict()
+    failures = dict()
+
+    print("building {} PCNs with {} processes... (This may take time)".format(len(args), processes if processes is not None else os.cpu_count()))
+    with Pool(processes=processes) as pool:
+        for p_name, pcn, error in pool.imap_unordered(build_pcn_worker, args):
+            if error is None:
+                pcns[p_name] = pcn
+            else:
+                failures[p_name] = error
 
-    if comp_adj_fr is not None:
-        pb["value"] = round(((i + 1) / n) * 100, 2)
-        label['text'] = "Current progress {}%".format(pb["value"])
-        pb.pack()
-        label.pack()
-        window.update()
-    else:
-        pass
-        #printProgressBar(i + 1, n)
+    print("built {} PCNs, {} failed".format(len(pcns), len(failures)))
+    for p_name, error in failures.items():
+        print("protein {} failed: {}".format(p_name, error))
 
-    end = time.time()
-    print("Time for parallel PCN computation of protein {}: {} s".format(p, (end-start)))
+    return pcns, failures
 
-    if not os.path.exists("{}Adj".format(output_path)):
-        os.makedirs("{}Adj".format(output_path))
-    np.savetxt("{}Adj{}{}_adj_mat_{}_{}.txt".format(output_path, add_slash_to_path, p, min_, max_), adj, fmt='%.2f')
-    print("saved adj matrix")
+def index_structure_worker(args):
+    """
+    Worker of index_structures_parallel: parse the structure file of a protein and compute its manifest entry.
+    It is a top-level function so that it can be sent to the processes of the pool.
+    Parameters:
+        args: tuple (p_name, protein_path, cache_path).
+    Returns:
+        p_name: string, the protein pdb code.
+        entry: dict with keys "file", "size", "mtime", "hash", "residues" and "chains", None if the parsing failed.
+        error: string, the error raised while parsing the file, None if the parsing succeeded.
+    """
+    p_name, protein_path, cache_path = args
 
-    return adj
+    try:
+        stat = os.stat(protein_path)
+        file_hash = structureFileHash(protein_path)
+        if cache_path is not None:
+            columns, res_list = cachedStructureColumns(protein_path, cache_path, file_hash)
+        else:
+            columns, res_list = readStructureColumns(protein_path)
+        if len(res_list) == 0:
+            raise Exception("no 'ATOM' records in {}.".format(protein_path))
+        chains = np.char.strip(columns["chain"]).astype(str)
+        _, first = np.unique(chains, return_index=True)
+        entry = {"file": os.path.basename(protein_path), "size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": file_hash,
+                 "residues": len(res_list), "chains": chains[np.sort(first)].tolist()}
+        return p_name, entry, None
+    except Exception as e:
+        return p_name, None, "{}: {}".format(type(e).__name__, e)
+
+def structureManifestPath(proteins_path, output_path):
+    """
+    Path of the structures manifest of a pdb files folder, in the Manifests folder of the output directory.
+    The manifest is keyed by the absolute path of the pdb files folder, which is never written.
+    Parameters:
+        proteins_path: string, is the path of the pdb files.
+        output_path: string, is the output file path.
+    Returns:
+        manifest_path: string, the path of the manifest file.
+    """
+    key = hashlib.sha1(os.path.abspath(proteins_path).encode()).hexdigest()[:16]
+    return "{}Manifests{}{}".format(output_path, add_slash_to_path, structure_manifest_name.format(key))
 
-def adjacent_matrix_nonparallel(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None, adj_mat_type = ""):
+def readStructureManifest(proteins_path, output_path):
     """
-    Non parallel computation the adjacency matrix.
+    Read the structures manifest of a pdb files folder (see index_structures_parallel).
     Parameters:
+        proteins_path: string, is the path of the pdb files.
         output_path: string, is the output file path.
-        coordinates: np.array, contains the euclidean distance between the alpha carbon of the amino acids of the proteins.
+    Returns:
+        manifest: dict with keys "proteins_path", "proteins" ({p_name: entry}) and "failures" ({file: failure}, see index_structures_parallel),
+                  None if the folder was never indexed.
+    """
+    manifest_path = structureManifestPath(proteins_path, output_path)
+    if not os.path.isfile(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return None
+
+def saveStructureManifest(proteins_path, output_path, manifest):
+    """
+    Save the structures manifest of a pdb files folder, under a temporary name that is then renamed.
+    Parameters:
+        proteins_path: string, is the path of the pdb files.
+        output_path: string, is the output file path.
+        manifest: dict, the manifest (see readStructureManifest).
+    Returns: None
+    """
+    manifest_path = structureManifestPath(proteins_path, output_path)
+    if not os.path.exists("{}Manifests".format(output_path)):
+        os.makedirs("{}Manifests".format(output_path))
+    tmp_path = "{}.{}.tmp".format(manifest_path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp_path, manifest_path)
+
+def index_structures_parallel(proteins_path, output_path, processes = None, cache_path = None, checkpoint = 1000):
+    """
+    Index all the structure files of a folder with a pool of processes and save the manifest in the output directory (see structureManifestPath),
+    the pdb files folder is only read.
+    For each protein the manifest stores its structure file, the residues count, the chains and the content hash, so that
+    the following stages and the GUI query it instead of rescanning and parsing the folder.
+    The update is incremental: only the files that are new or changed (size or modification time) since the last indexing are parsed,
+    the entries of the removed files are dropped. A file that fails does not stop the indexing: its error is saved in the manifest
+    with the size and the modification time of the file, and it is not parsed again until the file changes.
+    Parameters:
+        proteins_path: string, is the path of the pdb files.
+        output_path: string, is the output file path.
+        processes: int, default None, number of processes of the pool. If None, the number of CPUs is used.
+        cache_path: string, default None, path of the Cache folder. If not None the parsed structures are saved in the cache too (see cachedStructureColumns).
+        checkpoint: int, default 1000, the manifest is saved every checkpoint parsed files, so an interrupted indexing is resumed.
+    Returns:
+        manifest: dict with keys "proteins_path", "proteins" ({p_name: entry}, see index_structure_worker) and
+                  "failures" ({file: failure}, failure is a dict with keys "error", "size" and "mtime").
+    """
+    #a single pass on the folder, the files of each protein in the order of preference of structure_extensions
+    files = dict()
+    stats = dict()
+    with os.scandir(proteins_path) as entries:
+        for entry in entries:
+            p_name = structureName(entry.name)
+            if (p_name is None) or (not entry.is_file()):
+                continue
+            files.setdefault(p_name, []).append(entry.name)
+            stats[entry.name] = entry.stat()
+    order = {extension: i for i, extension in enumerate(structure_extensions)}
+    files = {p_name: min(names, key = lambda name: order[name[len(p_name):]]) for p_name, names in files.items()}
+
+    def unchanged(entry, file):
+        #the entry (or failure) of the last indexing is reused if the file has the same size and modification time
+        stat = stats[file]
+        return isinstance(entry, dict) and (entry.get("size") == stat.st_size) and (entry.get("mtime") == stat.st_mtime_ns)
+
+    old_manifest = readStructureManifest(proteins_path, output_path) or {"proteins": dict(), "failures": dict()}
+    manifest = {"proteins_path": os.path.abspath(proteins_path), "proteins": dict(), "failures": dict()}
+    args = []
+    for p_name, file in sorted(files.items()):
+        old_entry = old_manifest["proteins"].get(p_name)
+        old_failure = old_manifest["failures"].get(file)
+        if (old_entry is not None) and (old_entry["file"] == file) and unchanged(old_entry, file):
+            manifest["proteins"][p_name] = old_entry
+        elif unchanged(old_failure, file):
+            manifest["failures"][file] = old_failure
+        else:
+            args.append((p_name, os.path.join(proteins_path, file), cache_path))
+
+    if len(manifest["failures"]) > 0:
+        print("skipping {} structure files that failed and did not change since the last indexing".format(len(manifest["failures"])))
+
+    if len(args) > 0:
+        print("indexing {} structure files with {} processes ({} already indexed)... (This may take time)".format(len(args), processes if processes is not None else os.cpu_count(), len(manifest["proteins"])))
+        new_failures = dict()
+        with Pool(processes=processes) as pool:
+            for i, (p_name, entry, error) in enumerate(pool.imap_unordered(index_structure_worker, args, chunksize = 16)):
+                if error is None:
+                    manifest["proteins"][p_name] = entry
+                else:
+                    file = files[p_name]
+                    new_failures[file] = {"error": error, "size": stats[file].st_size, "mtime": stats[file].st_mtime_ns}
+                    manifest["failures"][file] = new_failures[file]
+                if (i+1) % checkpoint == 0:
+                    saveStructureManifest(proteins_path, output_path, manifest)
+
+        print("indexed {} structure files, {} failed".format(len(args)-len(new_failures), len(new_failures)))
+        for file, failure in new_failures.items():
+            print("structure file {} failed: {}".format(file, failure["error"]))
+
+    saveStructureManifest(proteins_path, output_path, manifest)
+    return manifest
+
+def adjacent_matrix_sparse(output_path, coordinates, p, min_=4, max_=8, comp_adj_fr=None, window = None, adj_mat_type = "", weight_type = None, confidence = None, export_txt = False, writer = None, method = "kdtree"):
+    """
+    Sparse computation of the adjacency matrix, for large structures.
+    The contacts are found with the KD-tree (or blocked) search of compute_contact_pairs and stored in a scipy.sparse CSR matrix,
+    so that the n x n dense matrix is never allocated. The PCN is saved in the binary adjacency format (see contact_edge_list).
+    Parameters:
+        output_path: string, is the output file path.
+        coordinates: np.array, contains the residues names and the coordinates of their alpha-C, beta-C, centroids or heavy atoms.
         p: string with len equals to 4, is the protein pdb code.
         min_: float, is the minimum threshold distance for extract only the non-covalent interactions between amino acids.
         max_: float, is the maximum threshold distance for extract only the significant interactions between amino acids.
         comp_adj_fr: tk.Frame, is the frame of the GUI that contains the progress bar.
         window: tk.Tk, is the window of the GUI.
-    Returns: None
+        adj_mat_type: string, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        weight_type: string, default None. If "distance", "inverse_distance", "contact_count" or "plddt", the edge weights are saved too (see save_weighted_pcn).
+        confidence: np.array, default None, the pLDDT of each residue, required by the weight type "plddt" (see compute_edge_weights).
+        export_txt: boolean, default False. If True the text edge list is saved too (see save_edge_list_txt).
+        writer: ResultsWriter, default None. If given the files are written in background (see ResultsWriter).
+        method: string, default "kdtree", the contact search method used by compute_contact_pairs ("kdtree", "dense" or "blocked").
+    Returns:
+        adj: scipy.sparse.csr_matrix, the adjacency matrix of the PCN.
+        edge_list_file_name: string, the name of the saved adjacency matrix file.
     """
-    n = coordinates.shape[0]
-    adj = np.zeros((n,n))
-    d = np.zeros((n,n), dtype=float)
-    edge_list = []
-
     if comp_adj_fr is not None:
         pb = ttk.Progressbar(comp_adj_fr, orient="horizontal", mode = "determinate", length = 100)
         pb.pack()
@@ -462,73 +3058,283 @@ def adjacent_matrix_nonparallel(output_path, coordinates, p, min_=4, max_=8, com
         label = tk.Label(comp_adj_fr, text = "Current progress {}%".format(pb["value"]))
         label.pack()
         window.update()
-    else:
-
-        value = 0
-        #printProgressBar(value, n)
-
-    for i in range(n):
-        for j in range(n):
-            if (i!=j):
-                p1 = np.array(coordinates[i, 1], dtype=float) #CORD_C
-                p2 = np.array(coordinates[j, 1], dtype=float) #CORD_C
-                d[i][j] = euclidean(p1, p2)
-                if ((d[i][j]>min_) and (d[i][j]<max_)):
-                    adj[i][j] = 1
-                    adj[j][i] = 1
-                    if (([j, i] not in edge_list) and ([i, j] not in edge_list)):
-                        edge_list.append([i, j])
 
-        if comp_adj_fr is not None:
-            pb["value"]= round(((i+1)/n)*100, 2)
-            label['text'] = "Current progress {}%".format(pb["value"])
-            pb.pack()
-            label.pack()
-            window.update()
-        else:
-            pass
-            #printProgressBar(i + 1, n)
+    edges, edge_list_file_name = contact_edge_list(output_path, coordinates, p, min_, max_, adj_mat_type, weight_type, confidence, export_txt, writer, method)
+    adj = edges_to_sparse(edges, coordinates.shape[0])
 
     if comp_adj_fr is not None:
-        pb["value"]= round(((i+1)/n)*100, 2)
+        pb["value"] = 100
         label['text'] = "Current progress {}%".format(pb["value"])
         pb.pack()
         label.pack()
         window.update()
-    else:
-        pass
-        # printProgressBar(i + 1, n)
 
+    return adj, edge_list_file_name
 
-    #save Edgelists, Adj matrixs and Distances matrixs
+def results_catalog_path(output_path):
     """
-    if not os.path.exists("{}Distances".format(output_path)):
-        os.makedirs("{}Distances".format(output_path))
-    np.savetxt("{}Distances{}{}_distances.txt".format(output_path, add_slash_to_path, p), d, fmt='%.2f')
-    print("saved distances matrix")
+    Path of the results catalog of an output directory, next to its Adj, Centralities, ... folders.
+    """
+    return "{}{}".format(output_path, results_catalog_name)
 
-    if not os.path.exists("{}Edgelists".format(output_path)):
-        os.makedirs("{}Edgelists".format(output_path))
+def connect_results_catalog(output_path):
+    """
+    Connection to the results catalog of an output directory, creating it if it does not exist.
+    The catalog is a SQLite database with a row for each saved file, indexed by protein, algorithm, k, adj type and kind,
+    so that the results can be listed without scanning the output directories and parsing the file names.
+    Each thread keeps one open connection for each catalog (see results_catalog_connections) and the tables are created
+    once for each catalog, so the many saves of a run do not reconnect and run the schema statements again.
+    The connection must not be closed by the caller.
+    Parameters:
+        output_path: string, is the output file path.
+    Returns:
+        conn: sqlite3.Connection, the connection to the catalog (rows as sqlite3.Row).
+    """
+    catalog_path = os.path.abspath(results_catalog_path(output_path))
+    if getattr(results_catalog_connections, "pid", None) != os.getpid():
+        #first catalog of this thread, or connections inherited by a forked process (they cannot be shared)
+        results_catalog_connections.pid = os.getpid()
+        results_catalog_connections.connections = dict()
+    connections = results_catalog_connections.connections
+
+    exists = os.path.isfile(catalog_path)
+    conn = connections.pop(catalog_path, None)
+    if conn is not None:
+        if exists:
+            connections[catalog_path] = conn
+            return conn
+        conn.close() #the catalog was removed
+
+    if not exists:
+        results_catalog_initialized.discard(catalog_path)
+        if not os.path.exists(os.path.dirname(catalog_path)):
+            os.makedirs(os.path.dirname(catalog_path), exist_ok = True)
+
+    conn = sqlite3.connect(catalog_path, timeout = 60) #the PCNs built in parallel are catalogued by many processes
+    conn.row_factory = sqlite3.Row
+    if catalog_path not in results_catalog_initialized:
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, folder TEXT NOT NULL, file TEXT NOT NULL, kind TEXT NOT NULL,
+                            protein TEXT, algorithm TEXT, k INTEGER, adj_mat_type TEXT, params TEXT, created REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_kind_algorithm ON results (kind, algorithm, k)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_protein ON results (protein, adj_mat_type)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_folder ON results (folder)")
+        results_catalog_initialized.add(catalog_path)
+    connections[catalog_path] = conn
+    return conn
+
+def catalog_params(params):
+    """
+    Canonical text of the parameters of a result (e.g. {"d": 2, "beta": 0.01}), the None parameters are dropped.
+    """
+    params = {key: value for key, value in (params or {}).items() if value is not None}
+    return json.dumps(params, sort_keys = True) if params else None
 
-    np.savetxt("{}Edgelists{}{}_edgelist_{}_{}.csv".format(output_path, add_slash_to_path, p, min_, max_), np.array(edge_list), fmt='%.2f')
-    print("saved edge list")
+def catalog_results(output_path, files, kind, protein = None, algorithm = None, k = None, adj_mat_type = None, params = None):
     """
-    if not os.path.exists("{}Adj".format(output_path)):
-        os.makedirs("{}Adj".format(output_path))
-    np.savetxt("{}Adj{}{}_adj_{}_{}_{}.txt".format(output_path, add_slash_to_path, p, adj_mat_type, min_, max_), adj, fmt='%.2f')
-    matrix_file_name = "{}_adj_{}_{}_{}.txt".format(p, adj_mat_type, min_, max_)
-    print("saved adj matrix")
+    Record saved files in the results catalog of the output directory, in a single transaction.
+    The paths are stored relative to the folder of the catalog, so the output directory can be moved. A file saved again replaces its previous row.
+    Parameters:
+        output_path: string, is the output file path.
+        files: list of strings, the paths of the saved files.
+        kind: string, the kind of result: "adj", "edgelist", "weighted", "freq", "centralities", "labels", "summary", "part_coefs",
+              "part_coefs_plot", "z_intraconn", "session", "centralities_session" or "part_coefs_session".
+        protein: string, default None, the pdb code or selection name of the protein.
+        algorithm: string, default None, the algorithm used.
+        k: int, default None, number of clusters/communities.
+        adj_mat_type: string, default None, type of the residue coordinates ("CA", "CB", "centroid" or "heavy").
+        params: dict, default None, the other parameters of the result (thresholds, embedding dimension, ...).
+    Returns: None
+    """
+    created = time.time()
+    catalog_folder = os.path.dirname(os.path.abspath(results_catalog_path(output_path)))
+    paths = [os.path.relpath(os.path.abspath(file), catalog_folder) for file in files]
+    rows = [(path, os.path.dirname(path) or os.curdir, os.path.basename(path), kind, protein, algorithm,
+             None if k is None else int(k), adj_mat_type, catalog_params(params), created) for path in paths]
 
-    return adj, matrix_file_name
+    conn = connect_results_catalog(output_path)
+    with conn: #commit, or rollback on error
+        conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
 
-def save_centralities(output_path, centralities, p_name, method = None, adj_mat_type = ""):
+def query_results_catalog(output_path, kind = None, protein = None, algorithm = None, k = None, adj_mat_type = None, params = None, folder = None):
     """
-    Save the node centralities as txt file in the output directory.
+    Query the results catalog of the output directory (see catalog_results).
+    Parameters:
+        output_path: string, is the output file path.
+        kind: string or list of strings, default None, the kinds of result to select. If None, all the kinds are selected.
+        protein, algorithm, k, adj_mat_type: default None, the values to select. If None, all the values are selected.
+        params: dict, default None, the other parameters to select (see catalog_params).
+        folder: string, default None, the folder of the files to select.
+    Returns:
+        rows: list of dicts with keys "path", "folder", "file", "kind", "protein", "algorithm", "k", "adj_mat_type", "params" and "created",
+              ordered by protein and file name, "path" and "folder" are absolute. Empty if the catalog does not exist.
+    """
+    if not os.path.isfile(results_catalog_path(output_path)):
+        return []
+
+    catalog_folder = os.path.dirname(os.path.abspath(results_catalog_path(output_path)))
+    conditions = []
+    values = []
+    if folder is not None:
+        conditions.append("folder = ?")
+        values.append(os.path.relpath(os.path.abspath(folder), catalog_folder))
+    if kind is not None:
+        kinds = [kind] if isinstance(kind, str) else list(kind)
+        conditions.append("kind IN ({})".format(", ".join("?" * len(kinds))))
+        values.extend(kinds)
+    for column, value in (("protein", protein), ("algorithm", algorithm), ("k", k), ("adj_mat_type", adj_mat_type), ("params", catalog_params(params))):
+        if value is not None:
+            conditions.append("{} = ?".format(column))
+            values.append(value)
+
+    conn = connect_results_catalog(output_path)
+    query = "SELECT * FROM results{} ORDER BY protein, file".format(" WHERE " + " AND ".join(conditions) if conditions else "")
+    rows = [dict(row) for row in conn.execute(query, values)]
+
+    for row in rows:
+        row["path"] = os.path.normpath(os.path.join(catalog_folder, row["path"]))
+        row["folder"] = os.path.dirname(row["path"])
+    return rows
+
+class ResultsWriter():
+    """
+    Background writer of the results files.
+    The save_* calls are queued and run in order by a writer thread, so the computation continues while the files are written
+    (e.g. on a network filesystem). The queue is bounded: when max_pending saves are waiting, submit blocks until the writer
+    catches up (back-pressure), so the results waiting to be written do not pile up in memory.
+    The errors of the saves do not stop the writer, they are collected and reported by close at the end of the run.
+    Used as context manager, close is called at the exit of the with block.
+    Parameters:
+        max_pending: int, default 16, maximum number of queued saves.
+    """
+
+    def __init__(self, max_pending = 16):
+        self.queue = queue.Queue(maxsize = max_pending)
+        self.errors = []
+        self.n_written = 0
+        self.waited = 0.0 #seconds the computation was blocked on a full queue
+        self.thread = threading.Thread(target = self.run, name = "ResultsWriter", daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            task = self.queue.get()
+            try:
+                if task is None: #sent by close
+                    return
+                func, args, kwargs = task
+                try:
+                    func(*args, **kwargs)
+                    self.n_written += 1
+                except Exception as e:
+                    self.errors.append("{}: {}".format(func.__name__, e))
+            finally:
+                self.queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue the call func(*args, **kwargs), blocking while the queue is full.
+        The arguments are written later, they must not be modified by the caller after the submit.
+        """
+        if not self.thread.is_alive():
+            raise Exception("The results writer is closed.")
+        start = time.time()
+        self.queue.put((func, args, kwargs))
+        self.waited += time.time() - start
+
+    def flush(self):
+        """
+        Wait until all the queued saves are written, e.g. before reading back a saved file.
+        """
+        self.queue.join()
+
+    def close(self, raise_errors = True):
+        """
+        Write the queued saves, stop the writer thread and report the run.
+        Parameters:
+            raise_errors: boolean, default True. If True an Exception with the failed saves is raised, otherwise they are only printed.
+        Returns:
+            n_written: int, the number of saves written.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        print("results writer: {} saves written, {} failed, computation blocked on the full queue for {:.1f}s".format(self.n_written, len(self.errors), self.waited))
+        if self.errors:
+            message = "{} results could not be saved:\n{}".format(len(self.errors), "\n".join(self.errors))
+            if raise_errors:
+                raise Exception(message)
+            print(message)
+        return self.n_written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        #the errors of the saves do not hide the exception of the computation
+        self.close(raise_errors = exc_type is None)
+        return False
+
+def save_residue_results(results_file, residue_table, values, export_txt = False):
+    """
+    Save a per-residue result (centralities, clusters/communities labels, participation coefficients, ...) in the columnar results format:
+    a .npz file with the columns of the residue table ("resname", "resnum", "chain") and the aligned "values" array.
+    It is read back with load_residue_results, without parsing the {residue_name: value} dict.
+    Parameters:
+        results_file: string, the results file path, its extension (if any) is replaced by .npz.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
+        values: np.array of shape (n,), the value of each residue, aligned to residue_table.
+        export_txt: boolean, default False. If True the {residue_name: value} dict is exported as .txt file too, the format of the previous versions.
+    Returns:
+        results_file: string, the path of the saved .npz file.
+    """
+    stem = os.path.splitext(results_file)[0]
+    values = np.asarray(values).reshape(-1)
+    with open(stem + ".npz", "wb") as f:
+        np.savez(f, resname = residue_table.resname, resnum = residue_table.resnum, chain = residue_table.chain, values = values)
+
+    if export_txt:
+        with open(stem + ".txt", "w") as f:
+            f.write(str(residue_table.toDict(values)))
+
+    return stem + ".npz"
+
+def results_files(results_file, export_txt = False):
+    """
+    Files written by save_residue_results: the .npz file and, if exported, the .txt file.
+    """
+    return [results_file, os.path.splitext(results_file)[0] + ".txt"] if export_txt else [results_file]
+
+def load_residue_results(results_file):
+    """
+    Load a per-residue result saved by save_residue_results. The results files of the previous versions ({residue_name: value} dict as .txt)
+    are read too: the .npz file is preferred if both exist.
+    Parameters:
+        results_file: string, the results file path, with .npz, .txt or no extension.
+    Returns:
+        residue_table: ResidueTable, the residues of the protein.
+        values: np.array of shape (n,), the value of each residue, aligned to residue_table.
+    """
+    stem = os.path.splitext(results_file)[0]
+    if os.path.isfile(stem + ".npz"):
+        with np.load(stem + ".npz") as data:
+            return ResidueTable(data["resname"], data["resnum"], data["chain"]), data["values"]
+    if os.path.isfile(stem + ".txt"):
+        with open(stem + ".txt") as f:
+            dict_residue_value = literal_eval(f.read())
+        return residueTable(np.array(list(dict_residue_value.keys()), dtype=str)), np.array(list(dict_residue_value.values()))
+    raise Exception("Results file {} doesn't exists.".format(results_file))
+
+def save_centralities(output_path, centralities, residue_table, p_name, method = None, adj_mat_type = "", export_txt = False):
+    """
+    Save the node centralities in the output directory (see save_residue_results).
     Parameters:
         output_path: string, path to use when save the centralities.
-        centralities: dict {node: centrality}, node 'method' centralities.
+        centralities: np.array of shape (n,), node 'method' centralities, aligned to residue_table.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         p_name: string, pdb code of the protein to study.
         method: string, the centrality measure algorithms used.
+        export_txt: boolean, default False. If True the centralities are exported as txt file too.
     Returns: None
     """
 
@@ -538,24 +3344,24 @@ def save_centralities(output_path, centralities, p_name, method = None, adj_mat_
 
         os.makedirs(centrality_output_path)
 
-    f = open("{}{}_{}{}.txt".format(centrality_output_path, p_name, method, adj_mat_type),"w")
-    f.write(str(centralities))
-    f.close()
+    results_file = save_residue_results("{}{}_{}{}".format(centrality_output_path, p_name, method, adj_mat_type), residue_table, centralities, export_txt)
+    catalog_results(output_path, results_files(results_file, export_txt), "centralities", p_name, method, adj_mat_type = adj_mat_type)
 
 
-def save_labels(output_path, labels, residue_names, p_name, method=None, d=None, beta=None, walk_len=None, num_walks=None, adj_mat_type = ""):
+def save_labels(output_path, labels, residue_table, p_name, method=None, d=None, beta=None, walk_len=None, num_walks=None, adj_mat_type = "", export_txt = False):
     """
-    Save the node centralities as txt file in the output directory.
+    Save the clusters/communities of the nodes in the output directory (see save_residue_results) and their txt summary.
     Parameters:
         output_path: string, path to use when save communities/clusters.
         labels : np.array, list of clusters/communities.
-        residue_names: np.array, list of the residues names of the protein.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         p_name: string, pdb code of the protein to study.
         method: string, the spectral clustering / embedding+clustering / community detection algorithm used to create the partition.
         d: int, default None, dimension for the embedding
         beta: float, default None, decay factor for HOPE embedding
         walk_len: int, default None, length of the random walks used in node2vec embedding.
         num_walks: int, default None, number of random walks each node computed in node2vec embedding.
+        export_txt: boolean, default False. If True the clusters/communities are exported as txt file too.
     Returns:
         dict_node_cluster_1: dict {node: label}, 'method' extracted clusters/communities.
     """
@@ -579,8 +3385,8 @@ def save_labels(output_path, labels, residue_names, p_name, method=None, d=None,
         if method in supported_methods_embeddings:
             name = "ClustersEmbeddings"
 
-    residue_names_0 = np.array(residue_names[:, 0], dtype = int)
-    residue_names_1 = np.array(residue_names[:, 1], dtype = str)
+    labels = np.asarray(labels).reshape(-1).astype(int)
+    residue_labels = residue_table.labels()
 
     labels_u, counts = np.unique(labels, return_counts=True)
 
@@ -588,24 +3394,13 @@ def save_labels(output_path, labels, residue_names, p_name, method=None, d=None,
 
         print(labels_u[i], counts[i])
 
-    dict_node_cluster_0 = dict ()
-    for i, label in enumerate(labels):
-
-      dict_node_cluster_0[str (residue_names_0[i])] = label
-
-    residue_clusters = np.array(list (dict_node_cluster_0.items()))
     residue_names_cluster = dict ()
 
     k = int (max(labels)) + 1
 
     for label in range(k):
 
-        temp = []
-
-        for (resi, res_name) in residue_names:
-            if ((residue_names[int (resi), 0]==residue_clusters[int (resi), 0]) and (str (int ((residue_clusters[int (resi), 1]))) == str (label))):
-
-                temp.append(res_name)
+        temp = residue_labels[labels == label].tolist()
 
         print(len(temp))
         residue_names_cluster[label] = temp
@@ -617,7 +3412,8 @@ def save_labels(output_path, labels, residue_names, p_name, method=None, d=None,
 
         os.makedirs(summary_output_path)
 
-    f = open("{}{}{}_{}_{}_k{}_{}.txt".format(summary_output_path, add_slash_to_path, p_name, "{}_Summary".format(name), method, k, adj_mat_type),"w")
+    summary_file = "{}{}{}_{}_{}_k{}_{}.txt".format(summary_output_path, add_slash_to_path, p_name, "{}_Summary".format(name), method, k, adj_mat_type)
+    f = open(summary_file,"w")
 
     for label in range(k):
 
@@ -625,12 +3421,10 @@ def save_labels(output_path, labels, residue_names, p_name, method=None, d=None,
         f.write("\r\n")
 
     f.close()
+    params = {"d": d, "beta": beta, "walk_len": walk_len, "num_walks": num_walks} if name == "ClustersEmbeddings" else None
+    catalog_results(output_path, [summary_file], "summary", p_name, method, k, adj_mat_type, params)
 
-    dict_node_cluster_1 = dict ()
-
-    for i, label in enumerate(labels):
-
-        dict_node_cluster_1[residue_names_1[i]] = int (label)
+    dict_node_cluster_1 = residue_table.toDict(labels)
 
     method_output_path = "{}{}{}{}".format(output_path, method, add_slash_to_path, name)
 
@@ -640,54 +3434,76 @@ def save_labels(output_path, labels, residue_names, p_name, method=None, d=None,
 
     if (name == "Clusters"):
 
-        f = open("{}{}{}_{}_{}_k{}_{}.txt".format(method_output_path, add_slash_to_path, p_name, name, method, k, adj_mat_type),"w")
-        f.write(str (dict_node_cluster_1))
-        f.close()
+        results_file = save_residue_results("{}{}{}_{}_{}_k{}_{}".format(method_output_path, add_slash_to_path, p_name, name, method, k, adj_mat_type), residue_table, labels, export_txt)
+        catalog_results(output_path, results_files(results_file, export_txt), "labels", p_name, method, k, adj_mat_type)
         return dict_node_cluster_1
 
     elif (name == "ClustersEmbeddings"):
 
         if beta is not None:
 
-            f = open("{}{}{}_{}_{}_d{}_beta{}_k{}_{}.txt".format(method_output_path, add_slash_to_path, p_name, name, method, d, beta, k, adj_mat_type),"w")
+            results_file = "{}{}{}_{}_{}_d{}_beta{}_k{}_{}".format(method_output_path, add_slash_to_path, p_name, name, method, d, beta, k, adj_mat_type)
         elif num_walks is not None and walk_len is not None:
-            f = open("{}{}{}_{}_{}_d{}_wl{}_nw{}_k{}_{}.txt".format(method_output_path, add_slash_to_path, p_name, name, method, d, walk_len, num_walks, k, adj_mat_type), "w")
+            results_file = "{}{}{}_{}_{}_d{}_wl{}_nw{}_k{}_{}".format(method_output_path, add_slash_to_path, p_name, name, method, d, walk_len, num_walks, k, adj_mat_type)
         else:
 
-            f = open("{}{}{}_{}_{}_d{}_k{}_{}.txt".format(method_output_path, add_slash_to_path, p_name, name, method, d, k, adj_mat_type),"w")
+            results_file = "{}{}{}_{}_{}_d{}_k{}_{}".format(method_output_path, add_slash_to_path, p_name, name, method, d, k, adj_mat_type)
 
-        f.write(str (dict_node_cluster_1))
-        f.close()
+        results_file = save_residue_results(results_file, residue_table, labels, export_txt)
+        catalog_results(output_path, results_files(results_file, export_txt), "labels", p_name, method, k, adj_mat_type, params)
         return dict_node_cluster_1
 
     elif (name == "Communities"):
 
-        f = open("{}{}{}_{}_{}_ncoms{}_{}.txt".format(method_output_path, add_slash_to_path, p_name, name, method, k, adj_mat_type),"w")
-        f.write(str (dict_node_cluster_1))
-        f.close()
+        results_file = save_residue_results("{}{}{}_{}_{}_ncoms{}_{}".format(method_output_path, add_slash_to_path, p_name, name, method, k, adj_mat_type), residue_table, labels, export_txt)
+        catalog_results(output_path, results_files(results_file, export_txt), "labels", p_name, method, k, adj_mat_type)
 
         return dict_node_cluster_1
 
     else:
         raise Exception ("method {} not supported".format(method))
 
-def save_part_coef(output_path, part_coefs, p_name, method, k, adj_mat_type = ""):
+def save_part_coef(output_path, part_coefs, residue_table, p_name, method, k, adj_mat_type = "", export_txt = False):
     """
-    Save the nodes partecipation coefficients as txt file in the output directory.
+    Save the nodes partecipation coefficients in the output directory (see save_residue_results).
     Parameters:
         output_path: string, path to use when save the node partecipation coefficients.
-        part_coefs: dict {node: part_coef}, node partecipation coefficient.
+        part_coefs: np.array of shape (n,), node partecipation coefficient, aligned to residue_table.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         p_name: string, pdb code of the protein to study.
         method: string, the spectral clustering/ embedding+clusterin / community detection algorithm used to create the partition.
         k: int, number of clusters/communities extracted.
+        export_txt: boolean, default False. If True the partecipation coefficients are exported as txt file too.
     Returns: None
     """
     method_output_path = "{}{}{}Part_coefs_txt".format(output_path, method, add_slash_to_path)
     if (not os.path.exists(method_output_path)):
         os.makedirs(method_output_path)
-    f = open("{}{}{}_{}_part_coefs_k{}_{}.txt".format(method_output_path, add_slash_to_path, p_name, method, k, adj_mat_type),"w")
-    f.write(str (part_coefs))
-    f.close()
+    results_file = save_residue_results("{}{}{}_{}_part_coefs_k{}_{}".format(method_output_path, add_slash_to_path, p_name, method, k, adj_mat_type), residue_table, part_coefs, export_txt)
+    catalog_results(output_path, results_files(results_file, export_txt), "part_coefs", p_name, method, k, adj_mat_type)
+
+def save_part_coef_plot_data(output_path, part_coefs, z, residue_table, p_name, method, k, adj_mat_type = "", export_txt = False):
+    """
+    Save the nodes partecipation coefficients and z-intraconnectivity next to the participation coefficients PyMOL session
+    (Part_coefs_Sessions folder, see pymol_plot_part_coefs), where the GUI plots read them.
+    Parameters:
+        output_path: string, is the output file path.
+        part_coefs: np.array of shape (n,), node partecipation coefficient, aligned to residue_table.
+        z: np.array of shape (n,), node z-intraconnectivity, aligned to residue_table.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
+        p_name: string, pdb code of the protein to study.
+        method: string, the spectral clustering/ embedding+clusterin / community detection algorithm used to create the partition.
+        k: int, number of clusters/communities extracted.
+        export_txt: boolean, default False. If True the values are exported as txt files too.
+    Returns: None
+    """
+    sessions_path = os.path.join(output_path, method, "Part_coefs_Sessions") #the folder of the session saved by pymol_plot_part_coefs, read by the GUI
+    if (not os.path.exists(sessions_path)):
+        os.makedirs(sessions_path)
+    results_file = save_residue_results("{}{}{}_part_coefs_{}_k{}_{}".format(sessions_path, add_slash_to_path, p_name, method, k, adj_mat_type), residue_table, part_coefs, export_txt)
+    catalog_results(output_path, results_files(results_file, export_txt), "part_coefs_plot", p_name, method, k, adj_mat_type)
+    results_file = save_residue_results("{}{}{}_z_intraconn_{}_k{}_{}".format(sessions_path, add_slash_to_path, p_name, method, k, adj_mat_type), residue_table, z, export_txt)
+    catalog_results(output_path, results_files(results_file, export_txt), "z_intraconn", p_name, method, k, adj_mat_type)
 
 #COMMUNITY EXTRACTION
 def extract_labels_from_coms(num_nodes, coms, algorithm_name):
@@ -852,56 +3668,76 @@ def degree_matrix(A):
     """
     Compute the degree matrix of a graph
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
     Returns:
-        D: numpy.array, the degree matrix of the graph.
+        D: numpy.array, the degree matrix of the graph (scipy.sparse.csr_matrix if A is sparse).
     """
-    n = A.shape[0]
-    diag = np.zeros((n, n))
-    rows, cols = A.nonzero()
-
-    for row, col in zip(rows, cols):
+    if sparse.issparse(A):
+        degrees = np.diff(sparse.csr_matrix(A).indptr).astype(float)
+        return sparse.diags(degrees, format="csr")
 
-        diag[row, row] += 1
+    degrees = np.count_nonzero(A, axis=1).astype(float)
 
-    return diag
+    return np.diag(degrees)
 
 def compute_laplacian_matrix(A):
     """
     Compute the unnormalized laplacian matrix of a graph
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
     Returns:
-        L: numpy.array, the unnormalized laplacian matrix of the graph.
+        L: numpy.array, the unnormalized laplacian matrix of the graph (scipy.sparse.csr_matrix if A is sparse).
     """
     D = degree_matrix(A)
     L = D-A
+    if sparse.issparse(L):
+        L = sparse.csr_matrix(L)
     return L
 
 def compute_normalized_laplacian(A):
     """
     Compute the normalized laplacian matrix of a graph
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
     Returns:
         L: numpy.array, the normalized laplacian matrix of the graph.
     """
+    if sparse.issparse(A):
+        # 1 - D^-1/2 A D^-1/2 has no zero entries, so the result is dense also for sparse PCNs
+        D_inv_sqrt = sparse.diags(1 / np.sqrt(degree_matrix(A).diagonal()))
+        return 1 - (D_inv_sqrt @ A @ D_inv_sqrt).toarray()
+
     D = degree_matrix(A)
     D_inv_sqrt = np.linalg.inv(np.sqrt(D))
     L_sym = 1 - np.dot(D_inv_sqrt, A).dot(D_inv_sqrt)
     return L_sym
 
-def computeSortEigens(mat):
+def computeSortEigens(mat, k = None, B = None):
     """
     Compute and sort eigenvalues and eigenvectors of a given matrix.
     Eigenvalues are sorted in ascending order, then the associated eigenvectors are sorted following the eigenvalues sorting indices.
+    If mat is a scipy.sparse matrix and k is given, only the k smallest eigenpairs are computed with a sparse solver (shift-invert Lanczos).
     Parameters:
-        mat: numpy.array, is the matrix (adjacency or laplacian matrix) used for the computation of eigenvalues and eigenvectors.
+        mat: numpy.array or scipy.sparse matrix, is the matrix (adjacency or laplacian matrix) used for the computation of eigenvalues and eigenvectors.
+        k: int, default None, number of smallest eigenpairs needed. Only used for sparse matrices.
+        B: numpy.array or scipy.sparse matrix, default None, right-hand side matrix of a generalized eigenvalue problem (Shi Malik approach).
     Returns:
         sortedEigenvalues: numpy.array, sorted eigenvalues of the matrix.
         sortedEigenvectors: numpy.array, sorted eigenvectors of the matrix.
     """
-    eigenvalues, eigenvectors = eig(mat)
+    if sparse.issparse(mat):
+        if k is not None and k < mat.shape[0] - 1:
+            eigenvalues, eigenvectors = eigsh(mat.astype(float), k=k, M=B, sigma=-1e-5, which='LM')
+            idx = eigenvalues.argsort()
+            return eigenvalues[idx], eigenvectors[:,idx]
+        mat = mat.toarray()
+        if B is not None and sparse.issparse(B):
+            B = B.toarray()
+
+    if B is not None:
+        eigenvalues, eigenvectors = eigh(mat, B, eigvals_only=False)
+    else:
+        eigenvalues, eigenvectors = eig(mat)
 
     idx = eigenvalues.argsort()
     sortedEigenvalues = eigenvalues[idx].real
@@ -959,6 +3795,26 @@ def computeBestK(eigenvalues, n_k = 1):
 
     return best_ks
 
+def computeLargestEigenvalues(mat, B = None, n_eigenvalues = 61):
+    """
+    Compute the largest eigenvalues of a sparse laplacian matrix, used by computeBestK on sparse PCNs.
+    computeBestK only looks at the eigengaps between the 60 largest eigenvalues, so the whole spectrum is not needed.
+    Parameters:
+        mat: scipy.sparse matrix, the laplacian matrix.
+        B: scipy.sparse matrix, default None, right-hand side matrix of the generalized eigenvalue problem (Shi Malik approach).
+        n_eigenvalues: int, default 61, number of eigenvalues to compute.
+    Returns:
+        eigenvalues: numpy.array, the largest eigenvalues of the matrix.
+    """
+    n = mat.shape[0]
+
+    if n_eigenvalues >= n - 1:
+        if B is not None:
+            return eigh(mat.toarray(), B.toarray(), eigvals_only=True)
+        return eigh(mat.toarray(), eigvals_only=True)
+
+    return eigsh(mat.astype(float), k=n_eigenvalues, M=B, which='LA', return_eigenvectors=False)
+
 
 def hardSpectralClustering(A, n_clusters = None, norm=False, embedding=None, d=None, beta=None, walk_len=None, num_walks=None):
     """
@@ -967,7 +3823,7 @@ def hardSpectralClustering(A, n_clusters = None, norm=False, embedding=None, d=N
     In case of embedding, it uses the embedding on the graph and then use KMeans for extract the clusters.
 
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
         n_clusters: int, default None. The number of clusters
         norm: boolean, default False. If is True the algorithm will compute the normalized laplacian matrix, otherwise the algorithm will compute the unnormalize laplacian matrix.
         embedding: string, default None. If None, no embeddings algorithms are applied. Outherwise, a supported embedding algorithm is applied on the eigenvectors of the laplacian matrix.
@@ -987,14 +3843,14 @@ def hardSpectralClustering(A, n_clusters = None, norm=False, embedding=None, d=N
         else:
             L = compute_laplacian_matrix(A)
 
-        sortedEigenvalues, sortedEigenvectors = computeSortEigens(L)             #sorted eigenvalues/eigenvectors
+        sortedEigenvalues, sortedEigenvectors = computeSortEigens(L, k=n_clusters)             #sorted eigenvalues/eigenvectors
         train = sortedEigenvectors[:, :n_clusters]
 
     else:
 
         if (embedding in supported_embeddings):
 
-            G = from_numpy_matrix(A)
+            G = pcn_graph(A)
             if (embedding == "HOPE"): #embedding dimension (d) and decay factor (beta) as inputs
                 model = HOPE(d=d, beta=beta)
             elif (embedding == "LaplacianEigenmaps"):
@@ -1027,7 +3883,7 @@ def softSpectralClustering(A, n_clusters = None, norm=False, embedding = None,
     In case of embedding, it uses the embedding on the graph and then use Fuzzy C-Means for extract the clusters.
 
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
         n_clusters: int, default None. The number of clusters
         norm: boolean, default False. If is True the algorithm will compute the normalized laplacian matrix, otherwise the algorithm will compute the unnormalize laplacian matrix.
         embedding: string, default None. If None, no embeddings algorithms are applied. Outherwise, a supported embedding algorithm is applied on the eigenvectors of the laplacian matrix.
@@ -1047,14 +3903,14 @@ def softSpectralClustering(A, n_clusters = None, norm=False, embedding = None,
         else:
             L = compute_laplacian_matrix(A)
 
-        sortedEigenvalues, sortedEigenvectors = computeSortEigens(L)            #sorted eigenvalues/eigenvectors
+        sortedEigenvalues, sortedEigenvectors = computeSortEigens(L, k=n_clusters)            #sorted eigenvalues/eigenvectors
         train = sortedEigenvectors[:, :n_clusters]
 
     else:
 
         if (embedding in supported_embeddings):
 
-            G = from_numpy_matrix(A)
+            G = pcn_graph(A)
             file = open("printG.txt", "w")
             file.write(str(G))
             file.close()
@@ -1088,7 +3944,7 @@ def ssc_shimalik(A, n_clusters = None):
     Soft Spectral Clustering with Shi Malik Approach.
     Compute the eigenvalues and eigenvectors of the laplacian matrix solving the generalized eigenvalue problem.
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
         n_clusters: int, default None. The number of clusters.
 
     Returns:
@@ -1097,10 +3953,7 @@ def ssc_shimalik(A, n_clusters = None):
 
     L = compute_laplacian_matrix(A)
     D = degree_matrix(A)
-    eigenvalues, eigenvectors = eigh(L, D, eigvals_only=False)
-    idx = eigenvalues.argsort()
-    sortedEigenvalues = eigenvalues[idx].real
-    sortedEigenvectors = eigenvectors[:,idx].real
+    sortedEigenvalues, sortedEigenvectors = computeSortEigens(L, k=n_clusters, B=D)
 
     if n_clusters is None:
         n_clusters = computeBestK(sortedEigenvalues)
@@ -1118,7 +3971,7 @@ def hsc_shimalik(A, n_clusters = None):
     Hard Spectral Clustering with Shi Malik Approach.
     Compute the eigenvalues and eigenvectors of the laplacian matrix solving the generalized eigenvalue problem.
     Parameters:
-        A: numpy.array, the adjacency matrix of the graph.
+        A: numpy.array or scipy.sparse matrix, the adjacency matrix of the graph.
         n_clusters: int, default None. The number of clusters
     Returns:
         labels: extracted clusters
@@ -1126,10 +3979,7 @@ def hsc_shimalik(A, n_clusters = None):
 
     L = compute_laplacian_matrix(A)
     D = degree_matrix(A)
-    eigenvalues, eigenvectors = eigh(L, D, eigvals_only=False)
-    idx = eigenvalues.argsort()
-    sortedEigenvalues = eigenvalues[idx].real
-    sortedEigenvectors = eigenvectors[:,idx].real
+    sortedEigenvalues, sortedEigenvectors = computeSortEigens(L, k=n_clusters, B=D)
 
     if n_clusters is None:
         n_clusters = computeBestK(sortedEigenvalues)
@@ -1254,186 +4104,163 @@ def fuzzycmeans_laplacianeigenmaps(A, n_clusters = None, norm=False, embedding="
 
 #CENTRALITY MEASURES
 
-def betweenness(G, residue_names_1, n=10):
+def node_values_vector(node_values, n):
+    """
+    Convert a {node: value} dict returned by networkx into a vector aligned to the residue table.
+    Parameters:
+        node_values: dict {node: value}, the value of each node of the PCN.
+        n: int, number of nodes of the PCN.
+    Returns:
+        values: np.array of shape (n,), the value of each node.
+    """
+    values = np.zeros(n)
+    for node, value in node_values.items():
+        values[int (float (node))] = value
+    return values
+
+def print_top_nodes(values, residue_table, n, measure):
+    """
+    Print the n nodes with the highest value.
+    Parameters:
+        values: np.array of shape (N,), the value of each node.
+        residue_table: ResidueTable, the residues of the PCN.
+        n: int, number of nodes to print.
+        measure: string, name of the measure.
+    Returns: None
+    """
+    top = np.argsort(-values, kind="stable")[:n]
+    labels = residue_table.labels()
+    print("Top {} nodes by {}".format(n, measure))
+    for i in top:
+        print((labels[i], values[i]))
+
+def betweenness(G, residue_table, n=10, weight=None):
     """
     Compute the betweenness centrality of the nodes of the graph using the networkx implementation.
     Parameters:
         G: networkx.graph, the graph (the PCN) you want to compute the betweenness centrality.
-        residue_names_1: np.array, list of the residues names of the protein.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         n: int, default equals to 10, number of best nodes with highest centrality to print.
+        weight: string, default None, the edge attribute used as weight (edge length, e.g. a 'distance' weighted PCN). If None, the PCN is unweighted.
     Returns:
-        centralities: dict {node: P_coef[node]}, for each node is linked its betweenness centrality
+        centralities: np.array of shape (N,), the betweenness centrality of each node, aligned to residue_table.
     """
     print(G)
-    bc = betweenness_centrality(G)
-    print(bc)
+    bc = betweenness_centrality(G, weight=weight)
     #bc= betweenness_centrality_parallel(G)
-    bc = {int (float (k)):v for k,v in bc.items()}
-    dict_node_centrality = dict ()
+    centralities = node_values_vector(bc, len(residue_table))
+    print_top_nodes(centralities, residue_table, n, "betweenness centrality")
 
-    for i, cent in bc.items():
+    return centralities
 
-        dict_node_centrality[residue_names_1[i]] = cent
-
-    sorted_bc = sorted(dict_node_centrality.items(), key=itemgetter(1), reverse=True)
-    print("Top {} nodes by betweenness centrality".format(n))
-    for d in sorted_bc[:n]:
-        print(d)
-
-    return dict_node_centrality
-
-def eigenvector_c(G, residue_names_1, n=10):
+def eigenvector_c(G, residue_table, n=10, weight=None):
     """
     Compute the eigenvector centrality of the nodes of the graph using the networkx implementation.
     Parameters:
         G: networkx.graph, the graph (the PCN) you want to compute the eigenvector centrality.
-        residue_names_1: np.array, list of the residues names of the protein.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         n: int, default equals to 10, number of best nodes with highest centrality to print.
+        weight: string, default None, the edge attribute used as weight (edge strength). If None, the PCN is unweighted.
     Returns:
-        centralities: dict {node: eigenvector_centrality[node]}, for each node is linked its eigenvector centrality
+        centralities: np.array of shape (N,), the eigenvector centrality of each node, aligned to residue_table.
     """
     print(G)
-    ec = eigenvector_centrality(G, max_iter=10000)
-    print(ec)
-    ec = {int (float (k)):v for k,v in ec.items()}
-    dict_node_centrality = dict ()
+    ec = eigenvector_centrality(G, max_iter=10000, weight=weight)
+    centralities = node_values_vector(ec, len(residue_table))
+    print_top_nodes(centralities, residue_table, n, "eigenvector centrality")
 
-    for i, cent in ec.items():
+    return centralities
 
-        dict_node_centrality[residue_names_1[i]] = cent
-
-    sorted_ec = sorted(dict_node_centrality.items(), key=itemgetter(1), reverse=True)
-    print("Top {} nodes by eigenvector centrality".format(n))
-    for d in sorted_ec[:n]:
-        print(d)
-
-    return dict_node_centrality
-
-def degree_c(G, residue_names_1, n=10):
+def degree_c(G, residue_table, n=10):
     """
     Compute the degree centrality of the nodes of the graph using the networkx implementation.
     Parameters:
         G: networkx.graph, the graph (the PCN) you want to compute the degree centrality.
-        residue_names_1: np.array, list of the residues names of the protein.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         n: int, default equals to 10, number of best nodes with highest centrality to print.
     Returns:
-        centralities: dict {node: degree_centrality[node]}, for each node is linked its degree centrality
+        centralities: np.array of shape (N,), the degree centrality of each node, aligned to residue_table.
     """
     dc = degree_centrality(G)
-    dc = {int (float (k)):v for k,v in dc.items()}
-    dict_node_centrality = dict ()
+    centralities = node_values_vector(dc, len(residue_table))
+    print_top_nodes(centralities, residue_table, n, "degree centrality")
 
-    for i, cent in dc.items():
+    return centralities
 
-        dict_node_centrality[residue_names_1[i]] = cent
-
-    sorted_dc = sorted(dict_node_centrality.items(), key=itemgetter(1), reverse=True)
-    print("Top {} nodes by degree centrality".format(n))
-    for d in sorted_dc[:n]:
-        print(d)
-
-    return dict_node_centrality
-
-def closeness(G, residue_names_1, n=10):
+def closeness(G, residue_table, n=10, weight=None):
     """
     Compute the closeness centrality of the nodes of the graph using the networkx implementation.
     Parameters:
         G: networkx.graph, the graph (the PCN) you want to compute the closeness centrality.
-        residue_names_1: np.array, list of the residues names of the protein.
+        residue_table: ResidueTable, the residues of the protein (see residueTable).
         n: int, default equals to 10, number of best nodes with highest centrality to print.
+        weight: string, default None, the edge attribute used as weight (edge length, e.g. a 'distance' weighted PCN). If None, the PCN is unweighted.
     Returns:
-        centralities: dict {node: closeness_centrality[node]}, for each node is linked its closeness centrality
+        centralities: np.array of shape (N,), the closeness centrality of each node, aligned to residue_table.
     """
-    cc = closeness_centrality(G)
-    cc = {int (float (k)):v for k,v in cc.items()}
-    dict_node_centrality = dict ()
+    cc = closeness_centrality(G, distance=weight)
+    centralities = node_values_vector(cc, len(residue_table))
+    print_top_nodes(centralities, residue_table, n, "closeness_centrality")
 
-    for i, cent in cc.items():
+    return centralities
 
-        dict_node_centrality[residue_names_1[i]] = cent
+def intra_cluster_degrees(G, labels):
+    """
+    Compute, for each node of the graph, its degree and the sum of the weights of the edges towards nodes of the same cluster/community.
+    The computation uses the sparse adjacency matrix of the graph, so it is linear in the number of edges.
+    Parameters:
+        G: networkx.graph, the graph (the PCN).
+        labels: np.array, extracted clusters/communities
+    Returns:
+        k: np.array, the (weighted) degree of each node.
+        k_s: np.array, the (weighted) degree of each node computed only on the edges inside its cluster/community.
+    """
+    A = sparse.coo_matrix(to_scipy_sparse_array(G))
+    n = A.shape[0]
+    labels = np.asarray(labels).reshape(-1)
 
-    sorted_cc = sorted(dict_node_centrality.items(), key=itemgetter(1), reverse=True)
-    print("Top {} nodes by closeness_centrality".format(n))
-    for d in sorted_cc[:n]:
-        print(d)
+    k = np.bincount(A.row, weights=A.data, minlength=n).astype(float)
+    same = (labels[A.row] == labels[A.col]) & (A.row != A.col) & (A.data != 0) #se il nodo i e il nodo j sono dello stesso cluster e c'è un arco che li connette
+    k_s = np.bincount(A.row[same], weights=A.data[same], minlength=n).astype(float)
 
-    return dict_node_centrality
+    return k, k_s
 
-def z_intraconnectivity(G, labels, residue_names_1):
+def z_intraconnectivity(G, labels):
 
     """
     Compute the z-score for the intraconnectivity of the nodes of the graph given a partition.
     Parameters:
         G: networkx.graph, the graph (the PCN) you want to compute the closeness centrality.
         labels: np.array, extracted clusters/communities
-        residue_names_1: np.array, list of the residues names of the protein.
     Returns:
-        P: dict {node: P_coef[node]}, for each node is linked its participation coefficient
+        z: np.array of shape (n,), the intraconnectivity z-score of each node, aligned to the residue table.
     """
-    A = to_numpy_matrix(G)
-    n = A.shape[0]
-    Z = dict()
-    k_s = np.zeros((n))
-    list_k_s_i = []
-
-    for i in range(n):
-        k_i = np.sum(A[i,:])
-        k_si = 0
-
-        for j in range(n):
-            if (i!=j):
-                if ((labels[i] == labels[j]) and (A[i,j]!=0)):#se il nodo i e il nodo j sono dello stesso cluster e c'è un arco che li connette
-                    k_si += A[i,j]
-
-        k_s[i] = k_si
-        list_k_s_i.append(k_s[i])
-
-    mean_k_si = np.mean(np.array(list_k_s_i))
-    std_k_si = np.std(np.array(list_k_s_i))
-
-    for i in range(n):
-        k_i = np.sum(A[i,:])
-        k_si = 0
+    k, k_s = intra_cluster_degrees(G, labels)
 
-        for j in range(n):
-            if (i!=j):
-                if ((labels[i] == labels[j]) and (A[i,j]!=0)):#se il nodo i e il nodo j sono dello stesso cluster e c'è un arco che li connette
-                    k_si += A[i,j]
+    mean_k_si = np.mean(k_s)
+    std_k_si = np.std(k_s)
 
-        k_s[i] = k_si
-        Z[residue_names_1[i]] = (k_i - mean_k_si) / std_k_si
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (k - mean_k_si) / std_k_si
 
-    return Z
+    return z
 
 
-def participation_coefs(G, labels, residue_names_1):
+def participation_coefs(G, labels):
     """
     Compute the participation coefficient of the nodes of the graph given a partition.
     Parameters:
         G: networkx.graph, the graph (the PCN) you want to compute the closeness centrality.
         labels: np.array, extracted clusters/communities
-        residue_names_1: np.array, list of the residues names of the protein.
     Returns:
-        P: dict {node: P_coef[node]}, for each node is linked its participation coefficient
+        p: np.array of shape (n,), the participation coefficient of each node, aligned to the residue table.
     """
-    A = to_numpy_matrix(G)
-    n = A.shape[0]
-    P = dict()
-    k_s = np.zeros((n))
-
-    for i in range(n):
-        k_i = np.sum(A[i,:])
-        k_si = 0
-
-        for j in range(n):
-            if (i!=j):
-                if ((labels[i] == labels[j]) and (A[i,j]!=0)):#se il nodo i e il nodo j sono dello stesso cluster e c'è un arco che li connette
-                    k_si += A[i,j]
+    k, k_s = intra_cluster_degrees(G, labels)
 
-        k_s[i] = k_si
-        P[residue_names_1[i]] = 1 - (k_s[i]/k_i)**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = 1 - (k_s/k)**2
 
-    return P
+    return p
 
 #END
 
@@ -1449,7 +4276,7 @@ def z_score(G, labels, residue_names_1):
     Returns:
         z_s: dict {node: z_score[node]}, for each node is linked its z-score
     """
-    A = to_numpy_matrix(G)
+    A = to_numpy_array(G)
     n = A.shape[0]
     z_s = dict()
     k_s = np.zeros((n))
@@ -1,10 +1,10 @@
 from __future__ import print_function
-from ast import literal_eval
 import numpy as np
 from pymol import cmd
 from pymol.querying import get_color_indices
 import os
 from sys import platform
+from .pcn_miner import load_residue_results, catalog_results
 
 #tk GUI progress bar
 import tkinter as tk
@@ -38,27 +38,41 @@ cmd.extend('get_colors',get_colors)
 cmd.auto_arg[0]['get_colors']=[lambda: cmd.Shortcut(['""','all']), 'selection=', ',']
 cmd.auto_arg[1]['get_colors']=[lambda: cmd.Shortcut(['0']), 'quiet=', '']
 
-def pymol_plot(protein_path, output_path, algorithm_type, algorithm_name, k, adj_mat_type, results_fr = None, window = None):
-
-    cmd.do("delete {}".format("all"))
-    cmd.do("load {}".format(protein_path))
-
+def structure_name(protein_path):
+    """
+    Name of the protein of a structure file (.pdb, .pdb.gz, .cif or .cif.gz), without the format extension.
+    """
     protein = os.path.basename(protein_path)
-    protein_name = os.path.splitext(protein)[0]
-
-    if (algorithm_type == "Communities"):
-        ncoms_or_k = "ncoms"
-        sele_name = "Community"
-    else:
-        ncoms_or_k = "k"
-        sele_name = "Cluster"
-
-    filepath = output_path+"{}{}{}{}{}_{}_{}_{}{}_{}.txt".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, ncoms_or_k, k, adj_mat_type)
-    f = open(filepath, "r")
-    data = f.read()
-    dict_node_comms = literal_eval(data)
-    f.close()
-
+    if protein.endswith(".gz"):
+        protein = protein[:-3]
+    return os.path.splitext(protein)[0]
+
+def residue_selections(resnums, chain, max_residues = 500):
+    """
+    PyMOL selections of a group of residues of the same chain, at most max_residues residues for each selection.
+    Parameters:
+        resnums: np.array of int, the residue numbers.
+        chain: string, the chain identifier.
+        max_residues: int, default 500, maximum number of residues in a selection.
+    Returns:
+        selections: list of strings, the PyMOL selections.
+    """
+    resis = [str(resnum).replace("-", "\\-") for resnum in resnums]
+    return ["(resi {} and chain {})".format("+".join(resis[i:i+max_residues]), chain) for i in range(0, len(resis), max_residues)]
+
+def color_clusters(residue_table, labels, k, sele_name, results_fr = None, window = None):
+    """
+    Color the residues of each cluster/community and create a selection for each of them.
+    The residues are grouped by cluster and chain, so PyMOL runs a few commands for each cluster instead of one for each residue.
+    Parameters:
+        residue_table: ResidueTable, the residues of the protein.
+        labels: np.array of int, the cluster/community of each residue, aligned to residue_table.
+        k: int, number of clusters/communities.
+        sele_name: string, prefix of the selections names ("Cluster" or "Community").
+        results_fr: tk.Frame, default None, the frame of the GUI that contains the progress bar.
+        window: tk.Tk, default None, the window of the GUI.
+    Returns: None
+    """
     colors = get_colors()
     cmd.do("remove hetatm")
 
@@ -70,208 +84,160 @@ def pymol_plot(protein_path, output_path, algorithm_type, algorithm_name, k, adj
         label_tk.pack()
         window.update()
 
-    n = len(list(dict_node_comms.keys()))
-
-    for count, (residue, label) in enumerate((dict_node_comms.items())):
-        residue_n, residue_chain = residue.split()
-        residue_name = residue_n[:3]
-        residue_num = residue_n[3:]
-        for i in range(k):
-            if(label==i):
-                print(residue + " " + colors[i])
-                line="color "+colors[i]+", (resi "+ residue_num + " and chain "+ residue_chain + ")"
-                cmd.do(line)
-                cmd.do("sele {}, resi {} and chain {}, 1, 0, 1".format("{}{}_{}".format(sele_name, label, colors[i]), residue_num, residue_chain))
+    for label in range(k):
+        in_cluster = (labels == label)
+        for chain in np.unique(residue_table.chain[in_cluster]):
+            members = in_cluster & (residue_table.chain == chain)
+            for selection in residue_selections(residue_table.resnum[members], chain):
+                cmd.do("color {}, {}".format(colors[label], selection))
+                cmd.do("sele {}, {}, 1, 0, 1".format("{}{}_{}".format(sele_name, label, colors[label]), selection))
+        print("{} {}: {} residues, {}".format(sele_name, label, int(np.sum(in_cluster)), colors[label]))
 
         if results_fr is not None:
-            pb["value"]= round((count/n)*100, 2)
+            pb["value"]= round(((label+1)/k)*100, 2)
             label_tk['text'] = "Current progress {}%".format(pb["value"])
             pb.pack()
             label_tk.pack()
             window.update()
 
+def plot_b_factors(residue_table, values, results_fr = None, window = None):
+    """
+    Write a per-residue value in the B-factor of the atoms of each residue, with a single PyMOL alter command.
+    Parameters:
+        residue_table: ResidueTable, the residues of the protein.
+        values: np.array, the value of each residue, aligned to residue_table.
+        results_fr: tk.Frame, default None, the frame of the GUI that contains the progress bar.
+        window: tk.Tk, default None, the window of the GUI.
+    Returns: None
+    """
+    cmd.do("remove hetatm")
+
     if results_fr is not None:
-        pb["value"]=round((n/n)*100, 2)
-        label_tk['text'] = "Current progress {}%".format(pb["value"])
+        pb = ttk.Progressbar(results_fr, orient="horizontal", mode = "determinate", length = 100)
         pb.pack()
-        label_tk.pack()
+        pb["value"] = 0
+        label = tk.Label(results_fr, text = "Current progress {}%".format(pb["value"]))
+        label.pack()
         window.update()
 
-    if (not os.path.exists("{}{}{}Sessions".format(output_path, algorithm_name, add_slash_to_path))):
-        os.makedirs("{}{}{}Sessions".format(output_path, algorithm_name, add_slash_to_path))
+    b_factors = dict(zip(zip(residue_table.chain.tolist(), residue_table.resnum.astype(str).tolist()), np.asarray(values, dtype=float).tolist()))
+    cmd.alter("all", "b = b_factors.get((chain, resi), b)", space = {"b_factors": b_factors})
 
-    cmd.do("save {}{}{}Sessions{}{}_{}_{}_{}{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_type, algorithm_name, ncoms_or_k, k, adj_mat_type))
-    cmd.do("delete {}".format(protein))
+    if results_fr is not None:
+        pb["value"]= 100
+        label['text'] = "Current progress {}%".format(pb["value"])
+        pb.pack()
+        label.pack()
+        window.update()
 
-def pymol_plot_embeddings(protein_path, output_path, algorithm_type, algorithm_name, k, d, adj_mat_type = "", beta=None, walk_len=None, num_walks=None, results_fr = None, window = None):
+def pymol_plot(protein_path, output_path, algorithm_type, algorithm_name, k, adj_mat_type, results_fr = None, window = None, protein_name = None, labels = None, residue_table = None):
 
     cmd.do("delete {}".format("all"))
     cmd.do("load {}".format(protein_path))
 
     protein = os.path.basename(protein_path)
-    protein_name = os.path.splitext(protein)[0]
+    if protein_name is None: #the name of a selection (e.g. 6vxx~A~1-150) is given by the caller
+        protein_name = structure_name(protein_path)
 
-    if (beta is not None):
-        filepath = output_path+"{}{}{}{}{}_{}_{}_d{}_beta{}_k{}_{}.txt".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, d, beta, k, adj_mat_type)
+    if (algorithm_type == "Communities"):
+        ncoms_or_k = "ncoms"
+        sele_name = "Community"
+    else:
+        ncoms_or_k = "k"
+        sele_name = "Cluster"
 
-    elif ((num_walks is not None) and (walk_len is not None)):
-        filepath = output_path+"{}{}{}{}{}_{}_{}_d{}_wl{}_nw{}_k{}_{}.txt".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, d, walk_len, num_walks, k, adj_mat_type)
+    if labels is None: #the labels are read from the saved file, unless given in memory by the caller (they may be still in the results writer queue)
+        filepath = output_path+"{}{}{}{}{}_{}_{}_{}{}_{}".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, ncoms_or_k, k, adj_mat_type)
+        residue_table, labels = load_residue_results(filepath)
+    labels = np.asarray(labels).reshape(-1).astype(int)
+    color_clusters(residue_table, labels, k, sele_name, results_fr, window)
 
-    else:
-        filepath = output_path+"{}{}{}{}{}_{}_{}_d{}_k{}_{}.txt".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, d, k, adj_mat_type)
+    if (not os.path.exists("{}{}{}Sessions".format(output_path, algorithm_name, add_slash_to_path))):
+        os.makedirs("{}{}{}Sessions".format(output_path, algorithm_name, add_slash_to_path))
 
-    f = open(filepath, "r")
-    data = f.read()
-    dict_node_comms = literal_eval(data)
-    f.close()
+    session_file = "{}{}{}Sessions{}{}_{}_{}_{}{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_type, algorithm_name, ncoms_or_k, k, adj_mat_type)
+    cmd.do("save {}".format(session_file))
+    catalog_results(output_path, [session_file], "session", protein_name, algorithm_name, k, adj_mat_type)
+    cmd.do("delete {}".format(protein))
 
-    colors = get_colors()
-    cmd.do("remove hetatm")
+def pymol_plot_embeddings(protein_path, output_path, algorithm_type, algorithm_name, k, d, adj_mat_type = "", beta=None, walk_len=None, num_walks=None, results_fr = None, window = None, protein_name = None, labels = None, residue_table = None):
 
-    if results_fr is not None:
-        pb = ttk.Progressbar(results_fr, orient="horizontal", mode = "determinate", length = 100)
-        pb.pack()
-        pb["value"] = 0
-        label_tk = tk.Label(results_fr, text = "Current progress {}%".format(pb["value"]))
-        label_tk.pack()
-        window.update()
+    cmd.do("delete {}".format("all"))
+    cmd.do("load {}".format(protein_path))
 
-    n = len(list(dict_node_comms.keys()))
-    for count, (residue, label) in enumerate(dict_node_comms.items()):
-        residue_n, residue_chain = residue.split()
-        residue_name = residue_n[:3]
-        residue_num = residue_n[3:]
-        for i in range(k):
-            if(label==i):
-                print(residue + " " + colors[i])
-                line="color "+colors[i]+", (resi "+ residue_num + " and chain "+ residue_chain + ")"
-                cmd.do(line)
-                cmd.do("sele {}, resi {} and chain {}, 1, 0, 1".format("Cluster{}_{}".format(label, colors[i]), residue_num, residue_chain))
+    protein = os.path.basename(protein_path)
+    if protein_name is None: #the name of a selection (e.g. 6vxx~A~1-150) is given by the caller
+        protein_name = structure_name(protein_path)
 
-        if results_fr is not None:
-            pb["value"]= round((count/n)*100, 2)
-            label_tk['text'] = "Current progress {}%".format(pb["value"])
-            pb.pack()
-            label_tk.pack()
-            window.update()
+    if labels is None: #the labels are read from the saved file, unless given in memory by the caller (they may be still in the results writer queue)
+        if (beta is not None):
+            filepath = output_path+"{}{}{}{}{}_{}_{}_d{}_beta{}_k{}_{}".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, d, beta, k, adj_mat_type)
 
-    if results_fr is not None:
-        pb["value"]=round((n/n)*100, 2)
-        label_tk['text'] = "Current progress {}%".format(pb["value"])
-        pb.pack()
-        label_tk.pack()
-        window.update()
+        elif ((num_walks is not None) and (walk_len is not None)):
+            filepath = output_path+"{}{}{}{}{}_{}_{}_d{}_wl{}_nw{}_k{}_{}".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, d, walk_len, num_walks, k, adj_mat_type)
+
+        else:
+            filepath = output_path+"{}{}{}{}{}_{}_{}_d{}_k{}_{}".format(algorithm_name, add_slash_to_path, algorithm_type, add_slash_to_path, protein_name, algorithm_type, algorithm_name, d, k, adj_mat_type)
+
+        residue_table, labels = load_residue_results(filepath)
+    labels = np.asarray(labels).reshape(-1).astype(int)
+    color_clusters(residue_table, labels, k, "Cluster", results_fr, window)
 
     if (not os.path.exists("{}{}{}Sessions".format(output_path, algorithm_name, add_slash_to_path))):
         os.makedirs("{}{}{}Sessions".format(output_path, algorithm_name, add_slash_to_path))
 
     if (beta is not None):
-        cmd.do("save {}{}{}Sessions{}{}_{}_d{}_beta{}_k{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, d, beta, k, adj_mat_type))
+        session_file = "{}{}{}Sessions{}{}_{}_d{}_beta{}_k{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, d, beta, k, adj_mat_type)
     elif ((num_walks is not None) and (walk_len is not None)):
-        cmd.do("save {}{}{}Sessions{}{}_{}_d{}_wl{}_nw{}_k{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, d, walk_len, num_walks, k, adj_mat_type))
+        session_file = "{}{}{}Sessions{}{}_{}_d{}_wl{}_nw{}_k{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, d, walk_len, num_walks, k, adj_mat_type)
     else:
-        cmd.do("save {}{}{}Sessions{}{}_{}_d{}_k{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, d, k, adj_mat_type))
+        session_file = "{}{}{}Sessions{}{}_{}_d{}_k{}_session{}.pse".format(output_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, d, k, adj_mat_type)
+    cmd.do("save {}".format(session_file))
+    catalog_results(output_path, [session_file], "session", protein_name, algorithm_name, k, adj_mat_type,
+                    {"d": d, "beta": beta, "walk_len": walk_len, "num_walks": num_walks})
 
     cmd.do("delete {}".format(protein))
 
-def pymol_plot_centralities(output_path, centralities, protein_path, algorithm_name, adj_mat_type, results_fr = None, window = None):
+def pymol_plot_centralities(output_path, centralities, residue_table, protein_path, algorithm_name, adj_mat_type, results_fr = None, window = None, protein_name = None):
 
     cmd.do("delete {}".format("all"))
     cmd.do("load {}".format(protein_path))
     cmd.do("set specular, off")
     protein = os.path.basename(protein_path)
-    protein_name = os.path.splitext(protein)[0]
-
-    colors = get_colors()
+    if protein_name is None: #the name of a selection (e.g. 6vxx~A~1-150) is given by the caller
+        protein_name = structure_name(protein_path)
 
-    cmd.do("remove hetatm")
-
-    if results_fr is not None:
-        pb = ttk.Progressbar(results_fr, orient="horizontal", mode = "determinate", length = 100)
-        pb.pack()
-        pb["value"] = 0
-        label = tk.Label(results_fr, text = "Current progress {}%".format(pb["value"]))
-        label.pack()
-        window.update()
-
-    n = len(list(centralities.keys()))
-    for count, (residue, cent) in enumerate(centralities.items()):
-        residue_n, residue_chain = residue.split(" ")
-        residue_name = residue_n[:3]
-        residue_num = residue_n[3:]
-        line="alter (resi "+ str(residue_num) + " and chain "+ residue_chain + "), b = "+ str(cent)
-        cmd.do(line)
-
-        if results_fr is not None:
-            pb["value"]= round((count/n)*100, 2)
-            label['text'] = "Current progress {}%".format(pb["value"])
-            pb.pack()
-            label.pack()
-            window.update()
-
-    if results_fr is not None:
-        pb["value"]=round((n/n)*100, 2)
-        label['text'] = "Current progress {}%".format(pb["value"])
-        pb.pack()
-        label.pack()
-        window.update()
+    plot_b_factors(residue_table, centralities, results_fr, window)
 
     cmd.do("spectrum b, rainbow")
-    cmd.do("ramp_new colorbar, none, [{}, {}], rainbow".format(min(centralities.values()), max(centralities.values())))
+    cmd.do("ramp_new colorbar, none, [{}, {}], rainbow".format(np.min(centralities), np.max(centralities)))
 
     if (not os.path.exists("{}Centralities{}{}{}Sessions".format(output_path, add_slash_to_path, algorithm_name, add_slash_to_path))):
         os.makedirs("{}Centralities{}{}{}Sessions".format(output_path, add_slash_to_path, algorithm_name, add_slash_to_path))
 
-    cmd.do("save {}Centralities{}{}{}Sessions{}{}_{}_session{}.pse".format(output_path, add_slash_to_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, adj_mat_type))
+    session_file = "{}Centralities{}{}{}Sessions{}{}_{}_session{}.pse".format(output_path, add_slash_to_path, algorithm_name, add_slash_to_path, add_slash_to_path, protein_name, algorithm_name, adj_mat_type)
+    cmd.do("save {}".format(session_file))
+    catalog_results(output_path, [session_file], "centralities_session", protein_name, algorithm_name, adj_mat_type = adj_mat_type)
 
 
-def pymol_plot_part_coefs(part_coefs, protein_path, output_path, algorithm_name, k, adj_mat_type, results_fr = None, window = None):
+def pymol_plot_part_coefs(part_coefs, residue_table, protein_path, output_path, algorithm_name, k, adj_mat_type, results_fr = None, window = None, protein_name = None, catalog_output_path = None):
 
     cmd.do("delete {}".format("all"))
     cmd.do("load {}".format(protein_path))
     cmd.do("set specular, off")
     protein = os.path.basename(protein_path)
-    protein_name = os.path.splitext(protein)[0]
-
-    colors = get_colors()
-
-    cmd.do("remove hetatm")
+    if protein_name is None: #the name of a selection (e.g. 6vxx~A~1-150) is given by the caller
+        protein_name = structure_name(protein_path)
 
-    if results_fr is not None:
-        pb = ttk.Progressbar(results_fr, orient="horizontal", mode = "determinate", length = 100)
-        pb.pack()
-        pb["value"] = 0
-        label = tk.Label(results_fr, text = "Current progress {}%".format(pb["value"]))
-        label.pack()
-        window.update()
-
-    n = len(list(part_coefs.keys()))
-    for count, (residue, p) in enumerate(part_coefs.items()):
-
-        residue_n, residue_chain = residue.split()
-        residue_name = residue_n[:3]
-        residue_num = residue_n[3:]
-        line="alter (resi "+ str(residue_num) + " and chain "+ residue_chain + "), b = "+ str(p)
-        cmd.do(line)
-
-        if results_fr is not None:
-            pb["value"]= round((count/n)*100, 2)
-            label['text'] = "Current progress {}%".format(pb["value"])
-            pb.pack()
-            label.pack()
-            window.update()
-
-    if results_fr is not None:
-        pb["value"]=round((n/n)*100, 2)
-        label['text'] = "Current progress {}%".format(pb["value"])
-        pb.pack()
-        label.pack()
-        window.update()
+    plot_b_factors(residue_table, part_coefs, results_fr, window)
 
     cmd.do("spectrum b, rainbow")
-    cmd.do("ramp_new colorbar, none, [{}, {}], rainbow".format(min(part_coefs.values()), max(part_coefs.values())))
+    cmd.do("ramp_new colorbar, none, [{}, {}], rainbow".format(np.nanmin(part_coefs), np.nanmax(part_coefs)))
 
     if (not os.path.exists("{}Part_coefs_Sessions".format(output_path))):
         os.makedirs("{}Part_coefs_Sessions".format(output_path))
 
-    cmd.do("save {}Part_coefs_Sessions{}{}_part_coefs_{}_k{}_{}_session.pse".format(output_path, add_slash_to_path, protein_name, algorithm_name, k, adj_mat_type))
+    session_file = "{}Part_coefs_Sessions{}{}_part_coefs_{}_k{}_{}_session.pse".format(output_path, add_slash_to_path, protein_name, algorithm_name, k, adj_mat_type)
+    cmd.do("save {}".format(session_file))
+    if catalog_output_path is not None: #output_path is the folder of the algorithm, the catalog is in the output root
+        catalog_results(catalog_output_path, [session_file], "part_coefs_session", protein_name, algorithm_name, k, adj_mat_type)
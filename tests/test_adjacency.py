@@ -0,0 +1,243 @@
+"""
+Equivalence of the vectorized adjacency matrix (adjacent_matrix_vectorized) with the reference loop (adjacent_matrix_nonparallel).
+pcn_miner is imported from its folder, the lib package imports PyMOL.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "program_main", "program_scripts", "pcn", "pcn_miner"))
+import pcn_miner
+
+
+def write_pdb(path, n_residues = 80, chains = "AB", seed = 0):
+    ## Write a pdb file with backbone and beta-C atoms, the residues of each chain follow a random walk of ~3.8 Angstrom steps
+    rng = np.random.default_rng(seed)
+    residue_names = ["ALA", "GLY", "LEU", "SER", "LYS"]
+    lines = []
+    serial = 1
+    for chain in chains:
+        position = rng.uniform(0, 30, 3)
+        for resnum in range(1, n_residues + 1):
+            position = position + rng.normal(0, 2.2, 3)
+            residue_name = residue_names[resnum % len(residue_names)]
+            atom_names = ["N", "CA", "C", "O"] + (["CB"] if residue_name != "GLY" else [])
+            for atom_name in atom_names:
+                x, y, z = position + rng.normal(0, 1.0, 3)
+                lines.append("ATOM  {:5d}  {:<3s} {:3s} {:1s}{:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}           {:1s}\n".format(
+                    serial, atom_name, residue_name, chain, resnum, x, y, z, 1.0, 50.0, atom_name[0]))
+                serial += 1
+    lines.append("END\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+def object_coordinates(cords):
+    ## Residues in the format of getResidueCoordinates (name, coordinates), read by adjacent_matrix_nonparallel
+    coordinates = np.empty((cords.shape[0], 2), dtype=object)
+    for i, cord in enumerate(cords):
+        coordinates[i, 0] = "ALA{} A".format(i + 1)
+        coordinates[i, 1] = cord
+    return coordinates
+
+
+class AdjacencyEquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.tmp_dir, "output")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assertSameAdjacency(self, coordinates_reference, coordinates, adj_mat_type, min_ = 4, max_ = 8):
+        adj_reference, file_reference = pcn_miner.adjacent_matrix_nonparallel(self.output_path, coordinates_reference, "reference", min_, max_, adj_mat_type = adj_mat_type)
+        adj, file_name = pcn_miner.adjacent_matrix_vectorized(self.output_path, coordinates, "vectorized", min_, max_, adj_mat_type = adj_mat_type)
+
+        np.testing.assert_array_equal(adj, adj_reference)
+        self.assertGreater(adj.sum(), 0)
+
+        saved_reference = pcn_miner.load_adj_file(os.path.join("{}Adj".format(self.output_path), file_reference))
+        saved = pcn_miner.load_adj_file(os.path.join("{}Adj".format(self.output_path), file_name))
+        np.testing.assert_array_equal(saved, saved_reference)
+        np.testing.assert_array_equal(saved, adj)
+
+    def test_random_coordinates(self):
+        rng = np.random.default_rng(1)
+        for n in (50, 300):
+            cords = rng.uniform(0, 3 * n**(1/3) + 5, (n, 3))
+            with self.subTest(n = n):
+                self.assertSameAdjacency(object_coordinates(cords), cords, "CA")
+
+    def test_few_residues(self):
+        #one or two residues, with and without contact
+        for cords in (np.zeros((1, 3)), np.array([[0, 0, 0], [5, 0, 0]]), np.array([[0, 0, 0], [20, 0, 0]])):
+            with self.subTest(n = cords.shape[0]):
+                adj_reference, _ = pcn_miner.adjacent_matrix_nonparallel(self.output_path, object_coordinates(cords), "reference", 4, 8, adj_mat_type = "CA")
+                adj, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, np.asarray(cords, dtype=float), "vectorized", 4, 8, adj_mat_type = "CA")
+                np.testing.assert_array_equal(adj, adj_reference)
+
+    def test_thresholds(self):
+        rng = np.random.default_rng(2)
+        cords = rng.uniform(0, 20, (200, 3))
+        for min_, max_ in ((0, 5), (3.5, 6), (4, 8), (6, 12)):
+            with self.subTest(min_ = min_, max_ = max_):
+                self.assertSameAdjacency(object_coordinates(cords), cords, "CA", min_, max_)
+
+    def test_tiled_adjacency(self):
+        #adjacent_matrix keeps only the edges of each distance tile, the tiles must not change the PCN
+        rng = np.random.default_rng(3)
+        cords = rng.uniform(0, 20, (250, 3))
+        adj, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords, "vectorized", 4, 8, adj_mat_type = "CA")
+        adj_tiled = pcn_miner.adjacent_matrix(self.output_path, cords, "tiled", 4, 8, block_size = 37, adj_mat_type = "CA")
+        np.testing.assert_array_equal(adj_tiled, adj)
+        np.testing.assert_array_equal(pcn_miner.load_adj_file(os.path.join("{}Adj".format(self.output_path), "tiled_adj_CA_4_8.npz")), adj)
+        #the same tiled search, without the dense matrix
+        adj_sparse, _ = pcn_miner.adjacent_matrix_sparse(self.output_path, cords, "blocked", 4, 8, adj_mat_type = "CA", method = "blocked")
+        np.testing.assert_array_equal(adj_sparse.toarray(), adj)
+        np.testing.assert_array_equal(pcn_miner.compute_contact_pairs(cords, 4, 8, method = "blocked", block_size = 37)[0], pcn_miner.compute_contact_pairs(cords, 4, 8)[0])
+
+    def test_threshold_sweep(self):
+        #one neighbor search for all the thresholds pairs, each PCN must be the one built with its own thresholds
+        rng = np.random.default_rng(4)
+        cords = rng.uniform(0, 20, (200, 3))
+        thresholds = pcn_miner.parseThresholds("4-8, 3.5-6, 6-12")
+        file_names, pcns = pcn_miner.adjacent_matrix_sweep(self.output_path, cords, "sweep", thresholds, adj_mat_type = "CA", return_pcns = True)
+        for min_, max_ in thresholds:
+            with self.subTest(min_ = min_, max_ = max_):
+                adj, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords, "vectorized", min_, max_, adj_mat_type = "CA")
+                np.testing.assert_array_equal(pcns[(min_, max_)].toarray(), adj)
+                np.testing.assert_array_equal(pcn_miner.load_adj_file(os.path.join("{}Adj".format(self.output_path), file_names[(min_, max_)])), adj)
+
+    def test_heavy_atom_thresholds(self):
+        #min_ applies to the minimum heavy-atom distance: thresholds that differ only in min_ give different PCNs
+        pdb_path = os.path.join(self.tmp_dir, "test.pdb")
+        write_pdb(pdb_path)
+        atoms, _ = pcn_miner.readPDBFile(pdb_path)
+        coordinates = pcn_miner.getResidueCoordinates(atoms, "heavy")
+        thresholds = pcn_miner.parseThresholds("0-8, 4-8")
+        file_names, pcns = pcn_miner.adjacent_matrix_sweep(self.output_path, coordinates, "sweep", thresholds, adj_mat_type = "heavy", return_pcns = True)
+        adjs = dict()
+        for min_, max_ in thresholds:
+            with self.subTest(min_ = min_, max_ = max_):
+                adjs[min_], _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, coordinates, "vectorized", min_, max_, adj_mat_type = "heavy")
+                np.testing.assert_array_equal(pcns[(min_, max_)].toarray(), adjs[min_])
+                np.testing.assert_array_equal(pcn_miner.load_adj_file(os.path.join("{}Adj".format(self.output_path), file_names[(min_, max_)])), adjs[min_])
+        self.assertGreater(adjs[0].sum(), adjs[4].sum())
+        self.assertGreater(adjs[4].sum(), 0)
+
+        coordinates_new = pcn_miner.getResidueCoordinates(atoms, "heavy")
+        coordinates_new[20, 1] = coordinates_new[20, 1] + 2.0
+        for min_ in (0, 4):
+            with self.subTest(update_min_ = min_):
+                adj_new, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, coordinates_new, "new", min_, 8, adj_mat_type = "heavy")
+                np.testing.assert_array_equal(pcn_miner.update_adjacent_matrix(adjs[min_], coordinates, coordinates_new, min_ = min_, max_ = 8, adj_mat_type = "heavy"), adj_new)
+
+    def test_contact_frequency(self):
+        #sparse contact counts of a stream of frames, against the mean of the dense adjacency matrices
+        rng = np.random.default_rng(5)
+        cords = rng.uniform(0, 20, (150, 3))
+        labels = ["ALA{} A".format(i + 1) for i in range(cords.shape[0])]
+        models = [cords + rng.normal(0, 0.8, cords.shape) for _ in range(6)]
+        frames = ((k, model, labels, labels) for k, model in enumerate(models))
+        adj_first, freq, matrix_file_names = pcn_miner.contact_frequency_stream(self.output_path, frames, "stream", 4, 8, adj_mat_type = "CA")
+
+        adjs = [pcn_miner.adjacent_matrix_vectorized(self.output_path, model, "vectorized", 4, 8, adj_mat_type = "CA")[0] for model in models]
+        np.testing.assert_array_equal(adj_first.toarray(), adjs[0])
+        np.testing.assert_allclose(freq.toarray(), np.mean(adjs, axis=0))
+        np.testing.assert_allclose(pcn_miner.read_contact_frequency(os.path.join("{}ContactFrequency".format(self.output_path), "stream_freq_CA_4_8.npz")).toarray(), np.mean(adjs, axis=0))
+        self.assertEqual(matrix_file_names, [])
+
+    def test_incremental_update(self):
+        #the rows and columns of the moved residues are recomputed, the PCN must be the one built from scratch
+        rng = np.random.default_rng(6)
+        cords = rng.uniform(0, 20, (200, 3))
+        cords_new = cords.copy()
+        cords_new[[5, 60, 61, 150]] += rng.normal(0, 2.0, (4, 3))
+        np.testing.assert_array_equal(pcn_miner.changed_residues(object_coordinates(cords), object_coordinates(cords_new)), [5, 60, 61, 150])
+
+        adj_ref, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords, "reference", 4, 8, adj_mat_type = "CA")
+        adj_new, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords_new, "new", 4, 8, adj_mat_type = "CA")
+        adj_sparse = pcn_miner.update_adjacent_matrix(pcn_miner.edges_to_sparse(pcn_miner.adj_mat_edges(adj_ref), 200), cords, cords_new, adj_mat_type = "CA")
+        np.testing.assert_array_equal(adj_sparse.toarray(), adj_new)
+        adj_dense = pcn_miner.update_adjacent_matrix(adj_ref, cords, cords_new, adj_mat_type = "CA")
+        np.testing.assert_array_equal(adj_dense, adj_new)
+
+    def test_incremental_update_keeps_reference(self):
+        #mutational scan: the reference PCN is updated for two mutants in a row and must not change
+        rng = np.random.default_rng(7)
+        cords = rng.uniform(0, 20, (150, 3))
+        adj_ref, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords, "reference", 4, 8, adj_mat_type = "CA")
+        adj_ref_sparse = pcn_miner.edges_to_sparse(pcn_miner.adj_mat_edges(adj_ref), 150)
+        adj_ref_before = adj_ref.copy()
+
+        for mutated in (10, 90):
+            cords_new = cords.copy()
+            cords_new[mutated] += 3.0
+            adj_new, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords_new, "new", 4, 8, adj_mat_type = "CA")
+            with self.subTest(mutated = mutated):
+                np.testing.assert_array_equal(pcn_miner.update_adjacent_matrix(adj_ref, cords, cords_new, adj_mat_type = "CA"), adj_new)
+                np.testing.assert_array_equal(pcn_miner.update_adjacent_matrix(adj_ref_sparse, cords, cords_new, adj_mat_type = "CA").toarray(), adj_new)
+                np.testing.assert_array_equal(adj_ref, adj_ref_before)
+                np.testing.assert_array_equal(adj_ref_sparse.toarray(), adj_ref_before)
+
+    def test_edge_list_input(self):
+        #the edge lists (text, .npy, .npz) are read into the same PCN of the dense adjacency matrix
+        rng = np.random.default_rng(8)
+        cords = rng.uniform(0, 20, (120, 3))
+        adj, _ = pcn_miner.adjacent_matrix_vectorized(self.output_path, cords, "dense", 4, 8, adj_mat_type = "CA")
+        edges = pcn_miner.adj_mat_edges(adj)
+        #listed in any order and direction, with repeated contacts
+        listed = np.concatenate((edges, edges[:10]))[rng.permutation(edges.shape[0] + 10)]
+        listed[::2] = listed[::2, ::-1]
+
+        adj_path = os.path.join(self.tmp_dir, "input") + os.sep
+        os.makedirs(adj_path)
+        np.savetxt(os.path.join(adj_path, "txt_edgelist_CA_4_8.txt"), listed, fmt = "%d")
+        np.save(os.path.join(adj_path, "npy_edgelist_CA_4_8.npy"), listed)
+        np.savez(os.path.join(adj_path, "npz_edgelist_CA_4_8.npz"), edges = listed, n = 120)
+        pcn_miner.save_edge_list_txt(self.output_path, "saved", edges, 4, 8, "CA")
+        edge_list_files = [os.path.join(adj_path, file) for file in sorted(os.listdir(adj_path))] + [os.path.join("{}Edgelists".format(self.output_path), "saved_edgelist_CA_4_8.txt")]
+
+        for edge_list_file in edge_list_files:
+            with self.subTest(edge_list_file = os.path.basename(edge_list_file)):
+                self.assertTrue(pcn_miner.is_edge_list_file(edge_list_file))
+                A = pcn_miner.read_edge_list(edge_list_file, n = 120)
+                self.assertEqual(A.format, "csr")
+                np.testing.assert_array_equal(A.toarray(), adj)
+                np.testing.assert_array_equal(pcn_miner.load_adj_file(edge_list_file, n = 120), adj)
+
+        for p in ("txt", "npy", "npz"):
+            with self.subTest(p = p):
+                #no adjacency matrix file, read_adj_mat falls back to the edge list
+                np.testing.assert_array_equal(pcn_miner.read_adj_mat(adj_path, p, 4, 8, "CA", sparse_pcn = True, n = 120).toarray(), adj)
+                np.testing.assert_array_equal(pcn_miner.read_adj_mat(adj_path, p, 4, 8, "CA", n = 120), adj)
+
+        #weighted contacts "i j w", and residue indices out of the protein
+        np.savetxt(os.path.join(adj_path, "weighted_edgelist_CA_4_8.txt"), np.column_stack((edges, np.arange(edges.shape[0]) + 1.5)))
+        W = pcn_miner.read_edge_list(os.path.join(adj_path, "weighted_edgelist_CA_4_8.txt"), n = 120)
+        np.testing.assert_array_equal(W.toarray() != 0, adj != 0)
+        np.testing.assert_array_equal(W.toarray()[edges[:, 0], edges[:, 1]], np.arange(edges.shape[0]) + 1.5)
+        with self.assertRaises(Exception):
+            pcn_miner.read_edge_list(os.path.join(adj_path, "txt_edgelist_CA_4_8.txt"), n = int(edges.max()))
+
+    def test_parsed_structure(self):
+        pdb_path = os.path.join(self.tmp_dir, "test.pdb")
+        write_pdb(pdb_path)
+        atoms, _ = pcn_miner.readPDBFile(pdb_path)
+
+        for adj_mat_type in ("CA", "CB", "centroid"):
+            with self.subTest(adj_mat_type = adj_mat_type):
+                #reference: the text parser and the per-residue coordinates, vectorized: the columnar parser of ProteinStructure
+                coordinates_reference = pcn_miner.getResidueCoordinates(atoms, adj_mat_type)
+                coordinates, residue_labels = pcn_miner.ProteinStructure(pdb_path).residueCoordinates(adj_mat_type)
+                np.testing.assert_array_equal(coordinates_reference[:, 0].astype(str), np.asarray(residue_labels, dtype=str))
+                self.assertSameAdjacency(coordinates_reference, coordinates, adj_mat_type)
+
+
+if __name__ == "__main__":
+    unittest.main()
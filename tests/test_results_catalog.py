@@ -0,0 +1,65 @@
+"""
+Results catalog (catalog_results, query_results_catalog): rows of the saved files and reuse of the connections.
+pcn_miner is imported from its folder, the lib package imports PyMOL.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "program_main", "program_scripts", "pcn", "pcn_miner"))
+import pcn_miner
+
+
+class ResultsCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.tmp_dir, "output") + os.sep
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_rows(self):
+        edges = np.array([[0, 1], [1, 2]])
+        pcn_miner.save_adj_mat(self.output_path, "1abc", edges, 3, 4, 8, "CA")
+        pcn_miner.save_adj_mat(self.output_path, "2abc", edges, 3, 4, 8, "CB")
+        pcn_miner.save_adj_mat(self.output_path, "1abc", edges, 3, 4, 8, "CA") #saved again, same row
+
+        rows = pcn_miner.query_results_catalog(self.output_path, kind = "adj")
+        self.assertEqual([(row["protein"], row["adj_mat_type"], row["file"]) for row in rows], [("1abc", "CA", "1abc_adj_CA_4_8.npz"), ("2abc", "CB", "2abc_adj_CB_4_8.npz")])
+        self.assertTrue(all(os.path.isfile(row["path"]) for row in rows))
+        self.assertEqual(len(pcn_miner.query_results_catalog(self.output_path, protein = "1abc", params = {"min": 4, "max": 8})), 1)
+        self.assertEqual(pcn_miner.query_results_catalog(os.path.join(self.tmp_dir, "other") + os.sep), [])
+
+    def test_connection_reuse(self):
+        #one connection for each thread, the tables are created once
+        statements = []
+        conn = pcn_miner.connect_results_catalog(self.output_path)
+        conn.set_trace_callback(statements.append)
+        for i in range(5):
+            pcn_miner.catalog_results(self.output_path, ["{}file{}.npz".format(self.output_path, i)], "adj", protein = "p{}".format(i))
+        self.assertIs(pcn_miner.connect_results_catalog(self.output_path), conn)
+        self.assertFalse(any("CREATE" in statement for statement in statements))
+        self.assertEqual(len(pcn_miner.query_results_catalog(self.output_path)), 5)
+
+        #the writer thread of ResultsWriter has its own connection
+        connections = []
+        thread = threading.Thread(target = lambda: connections.append(pcn_miner.connect_results_catalog(self.output_path)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(connections[0], conn)
+
+        #a removed catalog is created again
+        conn.set_trace_callback(None)
+        os.remove(pcn_miner.results_catalog_path(self.output_path))
+        pcn_miner.catalog_results(self.output_path, ["{}file.npz".format(self.output_path)], "adj", protein = "p")
+        self.assertEqual([row["protein"] for row in pcn_miner.query_results_catalog(self.output_path)], ["p"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Protein selections (parseSelection, selectionName, selectColumns): parsing of the specs, round trip through the selection names
+of the output files, selection of the atoms at parse time and pLDDT filtering and edge weights.
+pcn_miner is imported from its folder, the lib package imports PyMOL.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "program_main", "program_scripts", "pcn", "pcn_miner"))
+import pcn_miner
+
+
+def write_pdb(path, n_residues = 40, chains = "ABC", seed = 0, plddt = None):
+    ## Write a pdb file with backbone and beta-C atoms, the residues of each chain follow a random walk of ~3.8 Angstrom steps.
+    ## plddt: the B-factor of each residue (chain after chain), as in the AlphaFold models, default 50
+    rng = np.random.default_rng(seed)
+    residue_names = ["ALA", "GLY", "LEU", "SER", "LYS"]
+    lines = []
+    serial = 1
+    residue = 0
+    for chain in chains:
+        position = rng.uniform(0, 30, 3)
+        for resnum in range(1, n_residues + 1):
+            position = position + rng.normal(0, 2.2, 3)
+            residue_name = residue_names[resnum % len(residue_names)]
+            b_factor = plddt[residue] if plddt is not None else 50.0
+            residue += 1
+            for atom_name in ["N", "CA", "C", "O"] + (["CB"] if residue_name != "GLY" else []):
+                x, y, z = position + rng.normal(0, 1.0, 3)
+                lines.append("ATOM  {:5d}  {:<3s} {:3s} {:1s}{:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}           {:1s}\n".format(
+                    serial, atom_name, residue_name, chain, resnum, x, y, z, 1.0, b_factor, atom_name[0]))
+                serial += 1
+    lines.append("END\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+class SelectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pdb_path = os.path.join(self.tmp_dir, "test.pdb")
+        write_pdb(self.pdb_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse(self):
+        selections = {
+            "6vxx": ("6vxx", None),
+            "6VXX:A": ("6VXX", {"chains": ["A"], "ranges": None, "shell": None, "plddt": None}),
+            "6vxx:A+B:1-150+300-320:8": ("6vxx", {"chains": ["A", "B"], "ranges": [(1, 150), (300, 320)], "shell": 8.0, "plddt": None}),
+            "6vxx::1-150": ("6vxx", {"chains": None, "ranges": [(1, 150)], "shell": None, "plddt": None}),
+            "6vxx:*:-5--1+7:": ("6vxx", {"chains": None, "ranges": [(-5, -1), (7, 7)], "shell": None, "plddt": None}),
+            "6vxx::20-10": ("6vxx", {"chains": None, "ranges": [(10, 20)], "shell": None, "plddt": None}),
+            "6vxx:::": ("6vxx", None),
+            "AF-P69905-F1::::70": ("AF-P69905-F1", {"chains": None, "ranges": None, "shell": None, "plddt": 70.0}),
+            "6vxx~A+B~1-150~8": ("6vxx", {"chains": ["A", "B"], "ranges": [(1, 150)], "shell": 8.0, "plddt": None}),
+        }
+        for spec, expected in selections.items():
+            with self.subTest(spec = spec):
+                self.assertEqual(pcn_miner.parseSelection(spec), expected)
+        self.assertEqual(pcn_miner.parseSelection("6VXX:A", casefold_code = True)[0], "6vxx")
+
+        for spec in ("6vxx:A:1-2:3:4:5", "6vxx::a-b", "6vxx::1-", "6vxx:::x"):
+            with self.subTest(spec = spec):
+                with self.assertRaises(Exception):
+                    pcn_miner.parseSelection(spec)
+
+    def test_round_trip(self):
+        #the selection name is used in the output files names and parsed back from them (see checkIfFilesExists)
+        for spec in ("6vxx", "6vxx:A+B:1-150+300-320:8", "6vxx::1-150", "6vxx:A", "6vxx:::4.5", "6vxx:B:-5--1", "AF-P69905-F1::::70", "6vxx:A:::62.5"):
+            with self.subTest(spec = spec):
+                p_code, selection = pcn_miner.parseSelection(spec)
+                p_name = pcn_miner.selectionName(p_code, selection)
+                self.assertNotIn(":", p_name)
+                self.assertNotIn("_", p_name)
+                self.assertEqual(pcn_miner.parseSelection(p_name), (p_code, selection))
+                self.assertEqual(pcn_miner.parseSelection("{}_adj_CA_4_8.npz".format(p_name).split("_")[0]), (p_code, selection))
+                self.assertEqual(pcn_miner.selectionName(*pcn_miner.parseSelection(p_name)), p_name)
+        self.assertEqual(pcn_miner.selectionName(*pcn_miner.parseSelection("6vxx:A+B:1-150:8")), "6vxx~A+B~1-150~8")
+        self.assertEqual(pcn_miner.confidenceSelectionName("6vxx~A", 70), "6vxx~A~~~70")
+
+    def test_chains_and_ranges(self):
+        _, labels = pcn_miner.ProteinStructure(self.pdb_path).residueCoordinates("CA")
+        table = pcn_miner.residueTable(labels)
+        _, selection = pcn_miner.parseSelection("test:A+C:5-12+30-35")
+        cords, labels_selected = pcn_miner.ProteinStructure(self.pdb_path, selection = selection).residueCoordinates("CA")
+
+        selected = np.isin(table.chain, ["A", "C"]) & (((table.resnum >= 5) & (table.resnum <= 12)) | ((table.resnum >= 30) & (table.resnum <= 35)))
+        np.testing.assert_array_equal(labels_selected, labels[selected])
+        np.testing.assert_array_equal(cords, pcn_miner.ProteinStructure(self.pdb_path).residueCoordinates("CA")[0][selected])
+        self.assertEqual(pcn_miner.readResidueCoordinates(self.pdb_path, "CA", selection = selection)[1].tolist(), labels_selected.tolist())
+
+    def test_shell(self):
+        #the shell adds the whole residues with at least one atom within the distance of the selected atoms
+        columns, _ = pcn_miner.readPDBColumns(self.pdb_path)
+        _, selection = pcn_miner.parseSelection("test:B:10-15:6")
+        selected = pcn_miner.selectColumns(columns, selection)
+
+        core = (columns["chain"] == b"B") & (columns["resnum"] >= 10) & (columns["resnum"] <= 15)
+        distances = np.linalg.norm(columns["coords"][:, None, :] - columns["coords"][core][None, :, :], axis=2).min(axis=1)
+        residue_id = pcn_miner.residueIds(columns)
+        expected = np.isin(residue_id, residue_id[distances <= 6])
+        self.assertGreater(np.count_nonzero(expected), np.count_nonzero(core))
+        np.testing.assert_array_equal(selected["coords"], columns["coords"][expected])
+        np.testing.assert_array_equal(selected["resnum"], columns["resnum"][expected])
+
+    def test_plddt(self):
+        #AlphaFold model: the residues below the pLDDT cutoff are dropped at parse time, also from the shell
+        plddt = np.random.default_rng(9).uniform(20, 100, 120).round(2)
+        write_pdb(self.pdb_path, plddt = plddt)
+        _, labels = pcn_miner.ProteinStructure(self.pdb_path).residueCoordinates("CA")
+        np.testing.assert_allclose(pcn_miner.ProteinStructure(self.pdb_path).residueConfidence("CA"), plddt)
+
+        for spec, selected in (("test::::70", plddt >= 70), ("test:A:::70", (plddt >= 70) & (np.arange(120) < 40))):
+            with self.subTest(spec = spec):
+                _, selection = pcn_miner.parseSelection(spec)
+                structure = pcn_miner.ProteinStructure(self.pdb_path, selection = selection)
+                _, labels_selected = structure.residueCoordinates("CA")
+                np.testing.assert_array_equal(labels_selected, labels[selected])
+                np.testing.assert_allclose(structure.residueConfidence("CA"), plddt[selected])
+
+        #the shell is computed around the confident selected atoms
+        columns, _ = pcn_miner.readPDBColumns(self.pdb_path)
+        _, selection = pcn_miner.parseSelection("test:B:10-15:6:70")
+        selected = pcn_miner.selectColumns(columns, selection)
+        residue_id = pcn_miner.residueIds(columns)
+        confident = plddt[residue_id] >= 70
+        core = (columns["chain"] == b"B") & (columns["resnum"] >= 10) & (columns["resnum"] <= 15) & confident
+        distances = np.linalg.norm(columns["coords"][:, None, :] - columns["coords"][core][None, :, :], axis=2).min(axis=1)
+        expected = np.isin(residue_id, residue_id[distances <= 6]) & confident
+        self.assertGreater(np.count_nonzero(expected), np.count_nonzero(core))
+        self.assertLess(np.count_nonzero(expected), np.count_nonzero(np.isin(residue_id, residue_id[distances <= 6])))
+        np.testing.assert_array_equal(selected["coords"], columns["coords"][expected])
+
+    def test_plddt_weights(self):
+        #the weight of an edge is the lower pLDDT of its residues, divided by 100
+        plddt = np.random.default_rng(10).uniform(20, 100, 120).round(2)
+        write_pdb(self.pdb_path, plddt = plddt)
+        structure = pcn_miner.ProteinStructure(self.pdb_path)
+        cords, _ = structure.residueCoordinates("CA")
+        confidence = structure.residueConfidence("CA")
+        output_path = os.path.join(self.tmp_dir, "output")
+
+        W = pcn_miner.weighted_adjacent_matrix(output_path, cords, "test", 4, 8, adj_mat_type = "CA", weight_type = "plddt", confidence = confidence)
+        adj, _ = pcn_miner.adjacent_matrix_vectorized(output_path, cords, "test", 4, 8, adj_mat_type = "CA")
+        np.testing.assert_array_equal(W.toarray() != 0, adj != 0)
+        i, j = np.nonzero(adj)
+        np.testing.assert_allclose(W.toarray()[i, j], np.minimum(plddt[i], plddt[j]) / 100, rtol = 1e-6)
+        #the saved edge weights are read back
+        np.testing.assert_allclose(pcn_miner.read_weighted_pcn("{}Weighted{}".format(output_path, os.sep), "test", 4, 8, "CA", "plddt").toarray(), W.toarray())
+
+        with self.assertRaises(Exception):
+            pcn_miner.compute_edge_weights(np.ones(1), np.ones(1), "plddt", np.array([[0, 1]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
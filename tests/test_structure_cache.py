@@ -0,0 +1,152 @@
+"""
+Parsed structure cache (cachedStructureColumns, cachedResidueCoordinates): hits, misses after the file changes, corrupt entries and LRU eviction.
+Structures manifest (index_structures_parallel): incremental indexing and the files that failed.
+pcn_miner is imported from its folder, the lib package imports PyMOL.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "program_main", "program_scripts", "pcn", "pcn_miner"))
+import pcn_miner
+
+
+def write_pdb(path, n_residues = 40, chains = "AB", seed = 0):
+    ## Write a pdb file with backbone and beta-C atoms, the residues of each chain follow a random walk of ~3.8 Angstrom steps
+    rng = np.random.default_rng(seed)
+    residue_names = ["ALA", "GLY", "LEU", "SER", "LYS"]
+    lines = []
+    serial = 1
+    for chain in chains:
+        position = rng.uniform(0, 30, 3)
+        for resnum in range(1, n_residues + 1):
+            position = position + rng.normal(0, 2.2, 3)
+            residue_name = residue_names[resnum % len(residue_names)]
+            for atom_name in ["N", "CA", "C", "O"] + (["CB"] if residue_name != "GLY" else []):
+                x, y, z = position + rng.normal(0, 1.0, 3)
+                lines.append("ATOM  {:5d}  {:<3s} {:3s} {:1s}{:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}           {:1s}\n".format(
+                    serial, atom_name, residue_name, chain, resnum, x, y, z, 1.0, 50.0, atom_name[0]))
+                serial += 1
+    lines.append("END\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+class StructureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, "Cache") + os.sep
+        self.pdb_path = os.path.join(self.tmp_dir, "test.pdb")
+        write_pdb(self.pdb_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def cacheEntries(self):
+        return sorted(file for file in os.listdir(self.cache_path) if file.endswith(".npz"))
+
+    def assertSameResidues(self, result, result_reference, adj_mat_type):
+        residues, residue_labels, res_list = result
+        residues_reference, residue_labels_reference, res_list_reference = result_reference
+        np.testing.assert_array_equal(residue_labels, residue_labels_reference)
+        self.assertEqual(res_list, res_list_reference)
+        if adj_mat_type == "heavy":
+            for cords, cords_reference in zip(residues[:, 1], residues_reference[:, 1]):
+                np.testing.assert_array_equal(cords, cords_reference)
+        else:
+            np.testing.assert_array_equal(residues, residues_reference)
+
+    def test_hit(self):
+        for adj_mat_type in ("CA", "centroid", "heavy"):
+            with self.subTest(adj_mat_type = adj_mat_type):
+                result_reference = pcn_miner.readResidueCoordinates(self.pdb_path, adj_mat_type)
+                self.assertSameResidues(pcn_miner.cachedResidueCoordinates(self.pdb_path, adj_mat_type, self.cache_path), result_reference, adj_mat_type)
+                #the second read comes from the cache, the file is not parsed again
+                with mock.patch.object(pcn_miner, "readStructureColumns", side_effect = AssertionError("cache miss")):
+                    self.assertSameResidues(pcn_miner.cachedResidueCoordinates(self.pdb_path, adj_mat_type, self.cache_path), result_reference, adj_mat_type)
+        #one entry for the parsed columns and one for each adj_mat_type
+        self.assertEqual(len(self.cacheEntries()), 4)
+
+        _, residue_labels_reference, _ = pcn_miner.readResidueCoordinates(self.pdb_path, "CA")
+        with mock.patch.object(pcn_miner, "readStructureColumns", side_effect = AssertionError("cache miss")):
+            structure = pcn_miner.ProteinStructure(self.pdb_path, cache_path = self.cache_path)
+            np.testing.assert_array_equal(structure.residueCoordinates("CA")[1], residue_labels_reference)
+
+    def test_miss_after_file_change(self):
+        pcn_miner.cachedResidueCoordinates(self.pdb_path, "CA", self.cache_path)
+        entries = self.cacheEntries()
+
+        #same name and size, different coordinates
+        write_pdb(self.pdb_path, seed = 1)
+        result = pcn_miner.cachedResidueCoordinates(self.pdb_path, "CA", self.cache_path)
+        self.assertSameResidues(result, pcn_miner.readResidueCoordinates(self.pdb_path, "CA"), "CA")
+        self.assertEqual(len(self.cacheEntries()), 2 * len(entries))
+        self.assertTrue(set(entries) < set(self.cacheEntries()))
+
+    def test_corrupt_entry(self):
+        pcn_miner.cachedResidueCoordinates(self.pdb_path, "CA", self.cache_path)
+        for entry in self.cacheEntries():
+            with open(os.path.join(self.cache_path, entry), "wb") as f:
+                f.write(b"not a numpy file")
+
+        result = pcn_miner.cachedResidueCoordinates(self.pdb_path, "CA", self.cache_path)
+        self.assertSameResidues(result, pcn_miner.readResidueCoordinates(self.pdb_path, "CA"), "CA")
+        with mock.patch.object(pcn_miner, "readStructureColumns", side_effect = AssertionError("cache miss")):
+            self.assertSameResidues(pcn_miner.cachedResidueCoordinates(self.pdb_path, "CA", self.cache_path), result, "CA")
+
+    def test_lru_eviction(self):
+        pcn_miner.cachedResidueCoordinates(self.pdb_path, "CA", self.cache_path)
+        pcn_miner.cachedResidueCoordinates(self.pdb_path, "CB", self.cache_path)
+        entries = {entry: os.path.getsize(os.path.join(self.cache_path, entry)) for entry in self.cacheEntries()}
+        self.assertEqual(len(entries), 3)
+
+        #the CA entry is the least recently used
+        entry_ca = [entry for entry in entries if entry.endswith("-CA.npz")][0]
+        for age, entry in enumerate([entry_ca] + [entry for entry in entries if entry != entry_ca]):
+            os.utime(os.path.join(self.cache_path, entry), (1000000000 + age, 1000000000 + age))
+        pcn_miner.evictCache(self.cache_path, max_size = sum(entries.values()) - 1)
+        self.assertEqual(self.cacheEntries(), sorted(entry for entry in entries if entry != entry_ca))
+
+
+class StructureManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.proteins_path = os.path.join(self.tmp_dir, "input") + os.sep
+        self.output_path = os.path.join(self.tmp_dir, "output") + os.sep
+        os.makedirs(self.proteins_path)
+        write_pdb(os.path.join(self.proteins_path, "good.pdb"))
+        with open(os.path.join(self.proteins_path, "bad.pdb"), "w") as f:
+            f.write("HEADER    NO ATOMS\nEND\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_failures(self):
+        manifest = pcn_miner.index_structures_parallel(self.proteins_path, self.output_path, processes = 1)
+        self.assertEqual(list(manifest["proteins"]), ["good"])
+        failure = manifest["failures"]["bad.pdb"]
+        stat = os.stat(os.path.join(self.proteins_path, "bad.pdb"))
+        self.assertEqual((failure["size"], failure["mtime"]), (stat.st_size, stat.st_mtime_ns))
+        self.assertIn("ATOM", failure["error"])
+        self.assertEqual(pcn_miner.readStructureManifest(self.proteins_path, self.output_path), manifest)
+
+        #nothing changed: neither the indexed file nor the failed one is parsed again
+        with mock.patch.object(pcn_miner, "Pool", side_effect = AssertionError("files parsed again")):
+            self.assertEqual(pcn_miner.index_structures_parallel(self.proteins_path, self.output_path, processes = 1), manifest)
+
+        #the failed file is parsed again once it changes
+        write_pdb(os.path.join(self.proteins_path, "bad.pdb"), seed = 1)
+        manifest = pcn_miner.index_structures_parallel(self.proteins_path, self.output_path, processes = 1)
+        self.assertEqual(sorted(manifest["proteins"]), ["bad", "good"])
+        self.assertEqual(manifest["failures"], dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+"""
+Columnar structure parsers (readPDBColumns, readCIFColumns) against the reference text parser (readPDBFile) and against each other.
+pcn_miner is imported from its folder, the lib package imports PyMOL.
+"""
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "program_main", "program_scripts", "pcn", "pcn_miner"))
+import pcn_miner
+
+
+def make_atoms(n_residues = 30, chains = "AB", models = 1, seed = 0):
+    ## Atoms of a structure: (model, chain, resnum, residue name, atom name, coordinates), the residues follow a random walk
+    rng = np.random.default_rng(seed)
+    residue_names = ["ALA", "GLY", "LEU", "SER", "LYS"]
+    atoms = []
+    for model in range(1, models + 1):
+        for chain in chains:
+            position = rng.uniform(0, 30, 3)
+            for resnum in range(1, n_residues + 1):
+                position = position + rng.normal(0, 2.2, 3)
+                residue_name = residue_names[resnum % len(residue_names)]
+                for atom_name in ["N", "CA", "C", "O"] + (["CB"] if residue_name != "GLY" else []):
+                    atoms.append((model, chain, resnum, residue_name, atom_name, position + rng.normal(0, 1.0, 3)))
+    return atoms
+
+
+def write_pdb(path, atoms):
+    models = sorted(set(atom[0] for atom in atoms))
+    lines = []
+    for model in models:
+        if len(models) > 1:
+            lines.append("MODEL     {:4d}\n".format(model))
+        for serial, (_, chain, resnum, residue_name, atom_name, (x, y, z)) in enumerate([atom for atom in atoms if atom[0] == model], 1):
+            lines.append("ATOM  {:5d}  {:<3s} {:3s} {:1s}{:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}           {:1s}\n".format(
+                serial, atom_name, residue_name, chain, resnum, x, y, z, 1.0, 50.0, atom_name[0]))
+        if len(models) > 1:
+            lines.append("ENDMDL\n")
+    lines.append("END\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+def write_cif(path, atoms, missing_auth_seq_id = (), chain_names = None):
+    ## mmCIF _atom_site loop, the residues in missing_auth_seq_id have auth_seq_id '?' (their number is only in label_seq_id)
+    chain_names = chain_names or dict()
+    fields = ["group_PDB", "id", "type_symbol", "label_atom_id", "label_alt_id", "label_comp_id", "label_asym_id", "label_seq_id",
+              "pdbx_PDB_ins_code", "Cartn_x", "Cartn_y", "Cartn_z", "occupancy", "B_iso_or_equiv", "auth_seq_id", "auth_comp_id",
+              "auth_asym_id", "auth_atom_id", "pdbx_PDB_model_num"]
+    lines = ["data_test\n", "#\n", "loop_\n"] + ["_atom_site.{}\n".format(field) for field in fields]
+    for serial, (model, chain, resnum, residue_name, atom_name, (x, y, z)) in enumerate(atoms, 1):
+        auth_seq_id = "?" if resnum in missing_auth_seq_id else str(resnum)
+        auth_chain = chain_names.get(chain, chain)
+        lines.append("ATOM {} {} {} . {} {} {} ? {:.3f} {:.3f} {:.3f} 1.00 50.00 {} {} {} {} {}\n".format(
+            serial, atom_name[0], atom_name, residue_name, chain, resnum, x, y, z, auth_seq_id, residue_name, auth_chain, atom_name, model))
+    lines.append("#\n")
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as f:
+        f.writelines(lines)
+
+
+def hybrid36(value, width):
+    ## Hybrid-36 encoding of the pdb format for the numbers that do not fit in width decimal digits (upper case range only)
+    if value < 10**width:
+        return str(value)
+    value = value - 10**width + 10 * 36**(width - 1)
+    digits = ""
+    while value > 0:
+        value, digit = divmod(value, 36)
+        digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[digit] + digits
+    return digits
+
+
+def write_pdb_records(path, models):
+    ## Write a pdb file from records (record, atom name, altloc, residue name, chain, residue number, insertion code), one list for each model.
+    ## The atoms get hybrid-36 serials from 99995, the residue numbers are written as given (e.g. "A000")
+    rng = np.random.default_rng(8)
+    lines = ["HEADER    TEST\n"]
+    for model, records in enumerate(models, 1):
+        lines.append("MODEL     {:4d}\n".format(model))
+        serial = 99995
+        for record, atom_name, altloc, residue_name, chain, resnum, icode in records:
+            if record == "TER":
+                lines.append("TER\n")
+                continue
+            x, y, z = rng.uniform(-50, 50, 3)
+            lines.append("{:6s}{:>5s} {:4s}{:1s}{:3s} {:1s}{:>4s}{:1s}   {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}          {:>2s}\n".format(
+                record, hybrid36(serial, 5), atom_name, altloc, residue_name, chain, resnum, icode, x, y, z, 0.5 if altloc else 1.0, 20.0, atom_name.strip()[0]))
+            serial += 1
+        lines.append("ENDMDL\n")
+    lines.append("END\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+class StructureParsersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assertSameColumns(self, columns, columns_reference, keys = ("name", "resname", "chain", "resnum", "coords")):
+        for key in keys:
+            np.testing.assert_array_equal(columns[key], columns_reference[key], err_msg = key)
+
+    def test_cif_same_as_pdb(self):
+        atoms = make_atoms()
+        write_pdb(os.path.join(self.tmp_dir, "test.pdb"), atoms)
+        columns_reference, res_list_reference = pcn_miner.readPDBColumns(os.path.join(self.tmp_dir, "test.pdb"))
+        for file_name in ("test.cif", "test.cif.gz"):
+            with self.subTest(file_name = file_name):
+                write_cif(os.path.join(self.tmp_dir, file_name), atoms)
+                columns, res_list = pcn_miner.readStructureColumns(os.path.join(self.tmp_dir, file_name))
+                self.assertSameColumns(columns, columns_reference)
+                self.assertEqual(res_list, res_list_reference)
+
+    def test_cif_missing_auth_seq_id(self):
+        #'?' author residue numbers fall back to the label residue numbers instead of failing
+        atoms = make_atoms()
+        write_pdb(os.path.join(self.tmp_dir, "test.pdb"), atoms)
+        write_cif(os.path.join(self.tmp_dir, "test.cif.gz"), atoms, missing_auth_seq_id = (1, 7, 8))
+        columns, _ = pcn_miner.readStructureColumns(os.path.join(self.tmp_dir, "test.cif.gz"))
+        self.assertSameColumns(columns, pcn_miner.readPDBColumns(os.path.join(self.tmp_dir, "test.pdb"))[0])
+
+    def test_multi_model(self):
+        #only the first model is read, as in readPDBColumns
+        atoms = make_atoms(models = 3)
+        write_pdb(os.path.join(self.tmp_dir, "first.pdb"), [atom for atom in atoms if atom[0] == 1])
+        columns_reference, _ = pcn_miner.readPDBColumns(os.path.join(self.tmp_dir, "first.pdb"))
+        write_pdb(os.path.join(self.tmp_dir, "models.pdb"), atoms)
+        write_cif(os.path.join(self.tmp_dir, "models.cif"), atoms)
+        for file_name in ("models.pdb", "models.cif"):
+            with self.subTest(file_name = file_name):
+                self.assertSameColumns(pcn_miner.readStructureColumns(os.path.join(self.tmp_dir, file_name))[0], columns_reference)
+
+    def test_cif_long_chains(self):
+        #the chains of the large assemblies are longer than 4 characters and must not be truncated
+        atoms = make_atoms(chains = "AB")
+        write_cif(os.path.join(self.tmp_dir, "test.cif"), atoms, chain_names = {"A": "A-2", "B": "BBBBBB1"})
+        columns, _ = pcn_miner.readStructureColumns(os.path.join(self.tmp_dir, "test.cif"))
+        self.assertEqual(set(columns["chain"].tolist()), {b"A-2", b"BBBBBB1"})
+        _, residue_labels = pcn_miner.reduceResidueCoordinates(columns, "CA")
+        self.assertEqual(len(residue_labels), 60)
+        self.assertIn("ALA5 BBBBBB1", list(residue_labels))
+
+
+    def test_pdb_columns_same_as_text_parser(self):
+        #alternate locations, insertion codes, hybrid-36 serials and residue numbers, HETATM, TER and MODEL records
+        records = []
+        for resnum, icode in (("9998", ""), ("9999", ""), ("9999", "A"), ("A000", ""), ("A001", "")):
+            for atom_name in (" N  ", " CA ", " C  ", " O  ", " CB "):
+                altlocs = ("A", "B") if (resnum == "9999") and (icode == "") and (atom_name == " CB ") else ("",)
+                for altloc in altlocs:
+                    records.append(("ATOM", atom_name, altloc, "SER", "A", resnum, icode))
+        records += [("TER", None, None, None, None, None, None), ("HETATM", " O  ", "", "HOH", "A", "A002", "")]
+        records += [("ATOM", atom_name, "", "LYS", "B", "-3", "") for atom_name in (" N  ", " CA ")]
+        records += [("HETATM", " C1 ", "", "LIG", "B", "1", ""), ("ATOM", " CA ", "", "GLY", "B", "1", "")]
+        pdb_path = os.path.join(self.tmp_dir, "test.pdb")
+        write_pdb_records(pdb_path, [records, records])
+
+        columns, res_list = pcn_miner.readPDBColumns(pdb_path)
+        atoms_reference, res_list_reference = pcn_miner.readPDBFile(pdb_path)
+        #readPDBFile reads all the models, readPDBColumns only the first one
+        atom_records = [record for record in records if record[0] == "ATOM"]
+        m = len(atom_records)
+        self.assertEqual(columns["name"].shape[0], m)
+        self.assertEqual(atoms_reference.shape[0], 2 * m)
+        atoms_reference = atoms_reference[:m]
+        self.assertEqual(res_list, res_list_reference[:len(res_list)])
+        self.assertEqual(len(res_list), 6) #the insertion code does not start a new residue, as in readPDBFile
+
+        np.testing.assert_array_equal(np.char.strip(columns["serial"].astype(str)), np.char.strip(atoms_reference[:, 1]))
+        np.testing.assert_array_equal(columns["name"].astype(str), np.char.strip(atoms_reference[:, 2]))
+        np.testing.assert_array_equal(columns["resname"].astype(str), atoms_reference[:, 3])
+        np.testing.assert_array_equal(columns["chain"].astype(str), atoms_reference[:, 4])
+        np.testing.assert_array_equal(columns["coords"], atoms_reference[:, 6:9].astype(float))
+        resnum_reference = [int(field) if field.strip().lstrip("-").isdigit() else pcn_miner.hybrid36Value(field.strip(), 4) for field in atoms_reference[:, 5]]
+        np.testing.assert_array_equal(columns["resnum"], resnum_reference)
+        np.testing.assert_array_equal(columns["altloc"].astype(str), [record[2] or " " for record in atom_records])
+        np.testing.assert_array_equal(columns["icode"].astype(str), [record[6] or " " for record in atom_records])
+        #the last record is an ATOM, its serial follows the HETATM serials
+        self.assertEqual(columns["serial"][-1].decode(), hybrid36(99995 + sum(record[0] != "TER" for record in records) - 1, 5))
+
+    def test_residue_numbers_from_zero(self):
+        #residues numbered 0 or negative, and a chain starting with the last residue number of the previous one
+        residues = [("A", str(resnum)) for resnum in range(-2, 4)] + [("B", str(resnum)) for resnum in range(3, 7)]
+        records = [("ATOM", atom_name, "", "ALA", chain, resnum, "") for chain, resnum in residues for atom_name in (" N  ", " CA ", " C  ", " O  ", " CB ")]
+        pdb_path = os.path.join(self.tmp_dir, "test.pdb")
+        write_pdb_records(pdb_path, [records])
+        atoms, _ = pcn_miner.readPDBFile(pdb_path)
+        columns, _ = pcn_miner.readPDBColumns(pdb_path)
+        labels_expected = ["ALA{} {}".format(resnum, chain) for chain, resnum in residues]
+
+        for adj_mat_type in ("CA", "CB", "centroid", "heavy"):
+            with self.subTest(adj_mat_type = adj_mat_type):
+                coordinates_reference = pcn_miner.getResidueCoordinates(atoms, adj_mat_type)
+                self.assertEqual(coordinates_reference[:, 0].astype(str).tolist(), labels_expected)
+                if adj_mat_type != "heavy":
+                    cords, labels = pcn_miner.reduceResidueCoordinates(columns, adj_mat_type)
+                    self.assertEqual(list(labels), labels_expected)
+                    np.testing.assert_allclose(cords, pcn_miner.getCoordinatesArray(coordinates_reference))
+
+    def test_hybrid36(self):
+        self.assertEqual(pcn_miner.hybrid36Value("A0000", 5), 100000)
+        self.assertEqual(pcn_miner.hybrid36Value("ZZZZZ", 5), 100000 + 26 * 36**4 - 1)
+        self.assertEqual(pcn_miner.hybrid36Value("a0000", 5), 100000 + 26 * 36**4)
+        self.assertEqual(pcn_miner.hybrid36Value("A000", 4), 10000)
+        self.assertEqual(pcn_miner.hybrid36Value("a000", 4), 10000 + 26 * 36**3)
+        for text in ("*****", "A00", "Ab000", "12345"):
+            with self.subTest(text = text):
+                self.assertIsNone(pcn_miner.hybrid36Value(text, 5))
+        self.assertEqual(hybrid36(100019, 5), "A000J")
+
+        resnum = pcn_miner.decodeResidueNumbers(np.array([b"   1", b"  -1", b"9999", b"A000", b"A000", b"****", b"****", b"   2", b"****"]))
+        np.testing.assert_array_equal(resnum[:5], [1, -1, 9999, 10000, 10000])
+        #the unreadable fields are below the range of the field, equal inside a run and distinct between runs
+        self.assertTrue(np.all(resnum[[5, 6, 8]] < -10**4))
+        self.assertEqual(resnum[5], resnum[6])
+        self.assertNotEqual(resnum[6], resnum[8])
+        self.assertEqual(resnum[7], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()